@@ -1,101 +1,329 @@
+import asyncio
+import contextlib
 import json
 import os
+import sys
 import time
+import importlib
+import importlib.metadata
+import importlib.util
+import random
+import threading
+import shutil
+import tempfile
+import subprocess
 import concurrent.futures
-from typing import List, Dict
+import difflib
+import hashlib
+import sqlite3
+from typing import List, Dict, Tuple
 import re
+from email.utils import parsedate_to_datetime
 
-# Use AWS SDK that's already built into Lambda
-import boto3
-from botocore.exceptions import ClientError
-print("[SUCCESS] Using built-in AWS SDK")
+from lambda_tracing import JobTracer, new_job_id
+from lambda_persistence import queue_video_status, flush_on_exit, flush_writes
+from lambda_queue import process_queue_batch, concurrency_share, requeue_message_fields
 
-# Import other dependencies
-try:
-    from pydub import AudioSegment
-    print("[SUCCESS] pydub imported successfully")
-except ImportError as e:
-    print(f"[ERROR] Failed to import pydub: {e}")
-    raise
-
-try:
-    import openai
-    print("[SUCCESS] OpenAI imported successfully")
-except ImportError as e:
-    print(f"[ERROR] Failed to import OpenAI: {e}")
-    raise
-
-try:
-    from supabase import create_client, Client
-    print("[SUCCESS] Supabase imported successfully")
-except ImportError as e:
-    print(f"[WARNING] Failed to import Supabase: {e}")
-    # Continue without Supabase for testing
-    create_client = None
-    Client = None
+_module_import_start = time.perf_counter()
 
 # Configure FFmpeg and FFprobe paths for Lambda
-FFMPEG_PATH = "/var/task/ffmpeg"
-FFPROBE_PATH = "/var/task/ffprobe"
-
-ffmpeg_available = os.path.exists(FFMPEG_PATH)
-ffprobe_available = os.path.exists(FFPROBE_PATH)
-
-if ffmpeg_available and ffprobe_available:
-    AudioSegment.converter = FFMPEG_PATH
-    AudioSegment.ffmpeg = FFMPEG_PATH
-    AudioSegment.ffprobe = FFPROBE_PATH
-    print(f"[SUCCESS] FFmpeg configured at: {FFMPEG_PATH}")
-    print(f"[SUCCESS] FFprobe configured at: {FFPROBE_PATH}")
-elif ffmpeg_available:
-    print(f"[WARNING] FFmpeg found but FFprobe missing - audio processing may be limited")
-    AudioSegment.converter = FFMPEG_PATH
-    AudioSegment.ffmpeg = FFMPEG_PATH
-elif ffprobe_available:
-    print(f"[WARNING] FFprobe found but FFmpeg missing - audio processing may be limited")
-    AudioSegment.ffprobe = FFPROBE_PATH
-else:
-    print("[WARNING] Neither FFmpeg nor FFprobe found - audio processing will be severely limited")
-
-# Initialize clients
-s3_client = boto3.client('s3')
-lambda_client = boto3.client('lambda')
-
-# Initialize Supabase client
-supabase_url: str = os.environ.get("SUPABASE_URL")
-supabase_key: str = os.environ.get("SUPABASE_KEY")
-if create_client and supabase_url and supabase_key:
+FFMPEG_PATH = os.environ.get("FFMPEG_PATH", "/var/task/ffmpeg")
+FFPROBE_PATH = os.environ.get("FFPROBE_PATH", "/var/task/ffprobe")
+
+# The AWS SDK, OpenAI, Supabase and pydub are imported and their clients built on first use, so
+# the cold-start INIT phase and health checks do not pay for them. INIT_TIMINGS records how long
+# each one took the first time it was needed.
+HEAVY_IMPORTS = ['boto3', 'openai', 'supabase', 'pydub']
+INIT_TIMINGS = {}
+_clients = {}
+_clients_lock = threading.RLock()
+
+def get_cached_client(name: str, factory):
+    """Build a client once per container, on first use, and reuse it in later invocations."""
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                init_start = time.perf_counter()
+                _clients[name] = factory()
+                INIT_TIMINGS[name] = round((time.perf_counter() - init_start) * 1000, 1)
+                print(f"[INIT] {name} ready in {INIT_TIMINGS[name]} ms")
+    return _clients[name]
+
+def create_s3_client():
+    # Use AWS SDK that's already built into Lambda
+    import boto3
+    return boto3.client('s3')
+
+def create_lambda_client():
+    import boto3
+    return boto3.client('lambda')
+
+def create_sqs_client():
+    import boto3
+    return boto3.client('sqs')
+
+def create_supabase_client():
+    try:
+        from supabase import create_client
+    except ImportError as e:
+        print(f"[WARNING] Failed to import Supabase: {e}")
+        # Continue without Supabase for testing
+        return None
+    
+    supabase_url = os.environ.get("SUPABASE_URL")
+    supabase_key = os.environ.get("SUPABASE_KEY")
+    if not (supabase_url and supabase_key):
+        print("[WARNING] Supabase not configured")
+        return None
+    
     try:
-        supabase: Client = create_client(supabase_url, supabase_key)
+        client = create_client(supabase_url, supabase_key)
         print("[SUCCESS] Supabase client initialized")
+        return client
     except Exception as e:
         print(f"[WARNING] Failed to initialize Supabase: {e}")
-        supabase = None
-else:
-    supabase = None
-    print("[WARNING] Supabase not configured")
+        return None
+
+def create_openai_client():
+    import openai
+    # Retries are handled by transcribe_single_chunk so backoff is shared across chunks
+    return openai.OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        max_retries=0,
+        timeout=WHISPER_REQUEST_TIMEOUT_SECONDS
+    )
+
+def create_async_openai_client():
+    import httpx
+    import openai
+    # HTTP/2 multiplexes requests over a few connections when the h2 package is installed
+    http2 = importlib.util.find_spec('h2') is not None
+    http_client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(max_connections=WHISPER_MAX_CONNECTIONS, max_keepalive_connections=WHISPER_MAX_CONNECTIONS),
+        timeout=httpx.Timeout(WHISPER_REQUEST_TIMEOUT_SECONDS, connect=10.0)
+    )
+    print(f"Async OpenAI client: {'HTTP/2' if http2 else 'HTTP/1.1'}, up to {WHISPER_MAX_CONNECTIONS} connections")
+    return openai.AsyncOpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        max_retries=0,
+        timeout=WHISPER_REQUEST_TIMEOUT_SECONDS,
+        http_client=http_client
+    )
+
+def create_local_whisper_model():
+    from faster_whisper import WhisperModel
+    # num_workers replicas let that many transcribe() calls from different threads run in parallel
+    return WhisperModel(
+        LOCAL_WHISPER_MODEL,
+        device="cpu",
+        compute_type=LOCAL_WHISPER_COMPUTE_TYPE,
+        cpu_threads=LOCAL_WHISPER_CPU_THREADS,
+        num_workers=LOCAL_WHISPER_WORKERS,
+        download_root=LOCAL_WHISPER_MODEL_DIR
+    )
+
+def start_event_loop():
+    """
+    Event loop on a daemon thread. It lives as long as the container, like the cached clients,
+    because the async client's pooled connections belong to the loop they were opened on.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="transcription-event-loop", daemon=True).start()
+    return loop
+
+def load_audio_segment():
+    """Import pydub and point it at the bundled ffmpeg/ffprobe binaries."""
+    from pydub import AudioSegment
+    
+    if os.path.exists(FFMPEG_PATH):
+        AudioSegment.converter = FFMPEG_PATH
+        AudioSegment.ffmpeg = FFMPEG_PATH
+        print(f"[SUCCESS] FFmpeg configured at: {FFMPEG_PATH}")
+    else:
+        print("[WARNING] FFmpeg missing - audio processing may be limited")
+    if os.path.exists(FFPROBE_PATH):
+        AudioSegment.ffprobe = FFPROBE_PATH
+        print(f"[SUCCESS] FFprobe configured at: {FFPROBE_PATH}")
+    else:
+        print("[WARNING] FFprobe missing - audio processing may be limited")
+    return AudioSegment
+
+def get_s3_client():
+    return get_cached_client('s3_client', create_s3_client)
+
+def get_lambda_client():
+    return get_cached_client('lambda_client', create_lambda_client)
+
+def get_sqs_client():
+    return get_cached_client('sqs_client', create_sqs_client)
+
+def get_supabase():
+    """Supabase client, or None when it is not installed or configured."""
+    return get_cached_client('supabase', create_supabase_client)
+
+def get_openai_client():
+    return get_cached_client('openai_client', create_openai_client)
+
+def get_async_openai_client():
+    return get_cached_client('async_openai_client', create_async_openai_client)
+
+_local_whisper_model_failure = None  # (time.time(), error) of the last failed load
+
+def get_local_whisper_model():
+    """The container's local model. A failed load is not retried for LOCAL_WHISPER_RETRY_SECONDS, so warm
+    invocations do not each repeat a slow download that is likely to fail again."""
+    global _local_whisper_model_failure
+    if _local_whisper_model_failure and time.time() - _local_whisper_model_failure[0] < LOCAL_WHISPER_RETRY_SECONDS:
+        failed_at, error = _local_whisper_model_failure
+        raise RuntimeError(f"loading failed {time.time() - failed_at:.0f}s ago ({error}); retrying after {LOCAL_WHISPER_RETRY_SECONDS}s")
+    try:
+        model = get_cached_client('local_whisper_model', create_local_whisper_model)
+    except Exception as e:
+        _local_whisper_model_failure = (time.time(), e)
+        raise
+    _local_whisper_model_failure = None
+    return model
+
+def get_event_loop():
+    return get_cached_client('event_loop', start_event_loop)
+
+def run_async(coroutine) -> concurrent.futures.Future:
+    """Schedule a coroutine on the container's event loop; callable from any thread."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop())
+
+def get_audio_segment():
+    return get_cached_client('pydub', load_audio_segment)
+
+def profile_heavy_imports() -> Dict:
+    """Time importing each heavy dependency; modules already loaded by this container report 0."""
+    profile = {}
+    for module_name in HEAVY_IMPORTS:
+        already_loaded = module_name in sys.modules
+        import_start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+            import_ms = 0.0 if already_loaded else round((time.perf_counter() - import_start) * 1000, 1)
+            profile[module_name] = {'import_ms': import_ms, 'already_loaded': already_loaded}
+        except ImportError as e:
+            profile[module_name] = {'error': str(e)}
+    return profile
+
+def get_package_version(package: str):
+    try:
+        return importlib.metadata.version(package)
+    except Exception:
+        return None
 
 # Configuration
 OPENAI_MAX_FILE_SIZE = 25 * 1024 * 1024
 CHUNK_DURATION_MINUTES = 8
-MAX_PARALLEL_WORKERS = 5
+MAX_PARALLEL_WORKERS = int(os.environ.get("MAX_PARALLEL_WORKERS", "5"))  # Initial Whisper concurrency
+# 'threads' sends each Whisper request from its own thread; 'asyncio' runs them as coroutines on one
+# event loop per container, over a pooled HTTP client that stays open between invocations
+TRANSCRIPTION_ENGINE = os.environ.get("TRANSCRIPTION_ENGINE", "threads")
+# Fleet-wide Whisper budget shared by every container of this function, and how many there can be
+WHISPER_CONCURRENCY_BUDGET = int(os.environ.get("WHISPER_CONCURRENCY_BUDGET", "0"))
+TRANSCRIPTION_MAX_CONTAINERS = int(os.environ.get("TRANSCRIPTION_MAX_CONTAINERS", "10"))
+# Ceiling the adaptive limit can grow to; with a budget, this container's share of it. A request
+# in flight costs a coroutine rather than a thread on the asyncio engine, so its default is higher.
+WHISPER_MAX_CONCURRENCY = concurrency_share(
+    WHISPER_CONCURRENCY_BUDGET, TRANSCRIPTION_MAX_CONTAINERS,
+    int(os.environ.get("WHISPER_MAX_CONCURRENCY", "48" if TRANSCRIPTION_ENGINE == 'asyncio' else "16"))
+)
+WHISPER_MAX_CONNECTIONS = int(os.environ.get("WHISPER_MAX_CONNECTIONS", str(WHISPER_MAX_CONCURRENCY)))  # asyncio engine's pool
+WHISPER_MAX_ATTEMPTS = int(os.environ.get("WHISPER_MAX_ATTEMPTS", "4"))
+WHISPER_REQUEST_TIMEOUT_SECONDS = 120
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 30.0
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+THROTTLE_STATUS_CODES = {429, 503}
 CHUNK_OVERLAP_SECONDS = 30
+MIN_CHUNK_SECONDS = 10
+MAX_CHUNKS = int(os.environ.get("MAX_CHUNKS", "50"))  # Per single-invocation job; distributed jobs use MAX_DISTRIBUTED_CHUNKS
+# 'ffmpeg' cuts each window straight from the source with input seeking; 'pydub' decodes the whole file into memory
+CHUNKING_MODE = os.environ.get("CHUNKING_MODE", "ffmpeg")
+# 'silence' places cuts in pauses near the target length; 'fixed' cuts every CHUNK_DURATION_MINUTES with CHUNK_OVERLAP_SECONDS of overlap
+CHUNK_BOUNDARY_MODE = os.environ.get("CHUNK_BOUNDARY_MODE", "silence")
+SILENCE_SEARCH_SECONDS = 60  # How far before the target cut to look for a pause
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_SECONDS = 0.5
+SILENCE_FALLBACK_OVERLAP_SECONDS = 5  # Overlap kept when no pause is found near the target cut
+# Codec for anything re-encoded for Whisper: 'opus' (Ogg container, accepted by Whisper) or 'mp3'
+WHISPER_AUDIO_CODEC = os.environ.get("WHISPER_AUDIO_CODEC", "opus")
+AUDIO_CODECS = {
+    'opus': {'encoder': 'libopus', 'format': 'ogg', 'extension': 'ogg', 'extra_args': ['-application', 'voip', '-vbr', 'constrained'], 'min_kbps': 8, 'max_kbps': 48, 'speech_kbps': 32},
+    'mp3': {'encoder': 'libmp3lame', 'format': 'mp3', 'extension': 'mp3', 'extra_args': [], 'min_kbps': 8, 'max_kbps': 96, 'speech_kbps': 64}
+}
+OPENAI_TARGET_SIZE_MB = 24.0
+# Bitrates MPEG-2 Layer III allows at 16kHz; libmp3lame would otherwise round up past the budget
+MP3_16KHZ_BITRATES_KBPS = [8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+BITRATE_HEADROOM_RATIO = 0.95  # Leaves room for container overhead and VBR drift
+# 'url' hands ffmpeg a presigned S3 URL so decoding starts while bytes arrive; 'download' copies the object to /tmp first
+S3_INPUT_MODE = os.environ.get("S3_INPUT_MODE", "url")
+PRESIGNED_URL_EXPIRY_SECONDS = 3600
+MAX_DOWNLOAD_SIZE_MB = 400  # Bounded by Lambda ephemeral storage
+MAX_STREAMED_SIZE_MB = 4096
+# Every invocation works in its own directory under TMP_ROOT, capped at WORKSPACE_DISK_BUDGET_MB
+TMP_ROOT = os.environ.get("TMP_ROOT", "/tmp")
+WORKSPACE_PREFIX = "transcription_"
+WORKSPACE_DISK_BUDGET_MB = int(os.environ.get("WORKSPACE_DISK_BUDGET_MB", "1024"))
+WORKSPACE_RESERVE_TIMEOUT_SECONDS = 600
+STALE_WORKSPACE_SECONDS = 16 * 60  # Longer than the Lambda timeout, so only workspaces of dead invocations match
+# 'none', 's3' (JSON objects under TRANSCRIPT_CACHE_PREFIX in the upload bucket) or 'sqlite' (local file, for tests)
+TRANSCRIPT_CACHE_BACKEND = os.environ.get("TRANSCRIPT_CACHE_BACKEND", "none")
+TRANSCRIPT_CACHE_PREFIX = os.environ.get("TRANSCRIPT_CACHE_PREFIX", "transcript-cache/")
+TRANSCRIPT_CACHE_SQLITE_PATH = os.environ.get("TRANSCRIPT_CACHE_SQLITE_PATH", "/tmp/transcript_cache.sqlite3")
+# 'etag' keys media by S3 ETag plus size (free from head_object); 'sha256' streams the object through SHA-256
+TRANSCRIPT_CACHE_HASH_MODE = os.environ.get("TRANSCRIPT_CACHE_HASH_MODE", "etag")
+TRANSCRIPT_CACHE_VERSION = "v1-whisper-1"
+# Statuses a new invocation may claim; in_progress and completed mean another invocation has the job
+CLAIMABLE_STATUSES = ['pending', 'failed', 'note_generation_failed']
+
+# Per-chunk progress, so a retried or taken-over job only transcribes what is missing
+JOB_CHECKPOINT_BACKEND = os.environ.get("JOB_CHECKPOINT_BACKEND", "none")  # 'none', 's3' or 'sqlite'
+JOB_CHECKPOINT_PREFIX = os.environ.get("JOB_CHECKPOINT_PREFIX", "transcription-checkpoints/")
+JOB_CHECKPOINT_SQLITE_PATH = os.environ.get("JOB_CHECKPOINT_SQLITE_PATH", "/tmp/job_checkpoints.sqlite3")
+JOB_CHECKPOINT_VERSION = "v1"
+JOB_CHECKPOINT_READ_WORKERS = 8
+JOB_LEASE_SECONDS = STALE_WORKSPACE_SECONDS  # A lease not renewed for longer than the Lambda timeout belongs to a dead invocation
+
+# Distributed mode: a coordinator plans the chunks and fans ranges of them out to worker invocations
+TRANSCRIPTION_MODE = os.environ.get("TRANSCRIPTION_MODE", "single")  # 'single', 'distributed' or 'auto'
+DISTRIBUTED_MIN_DURATION_MINUTES = float(os.environ.get("DISTRIBUTED_MIN_DURATION_MINUTES", "90"))  # 'auto' fans out recordings this long
+DISTRIBUTED_CHUNKS_PER_WORKER = int(os.environ.get("DISTRIBUTED_CHUNKS_PER_WORKER", "4"))
+MAX_DISTRIBUTED_CHUNKS = int(os.environ.get("MAX_DISTRIBUTED_CHUNKS", "2000"))
+DISTRIBUTED_EXECUTOR = os.environ.get("DISTRIBUTED_EXECUTOR", "lambda")  # 'lambda', or 'local' to run workers in-process
+TRANSCRIPTION_WORKER_LAMBDA_ARN = os.environ.get("TRANSCRIPTION_WORKER_LAMBDA_ARN")  # Defaults to this function
+# Minimum run of matching words before two overlapping chunk texts are aligned without timestamps
+MIN_ALIGNMENT_WORDS = 3
+ALIGNMENT_WINDOW_WORDS = 200
+# Also write per-segment timestamps to transcripts.segments
+STORE_TRANSCRIPT_SEGMENTS = os.environ.get("STORE_TRANSCRIPT_SEGMENTS", "false").lower() == "true"
+# Each encode worker drives its own ffmpeg process, so encodes run on separate cores
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", str(os.cpu_count() or 2)))
+
+# Speech-to-text backend: 'openai' (hosted whisper-1), 'local' (faster-whisper on this container's
+# CPUs) or 'auto', which runs a recording locally when that is expected to meet the latency target
+TRANSCRIPTION_BACKEND = os.environ.get("TRANSCRIPTION_BACKEND", "openai")
+TRANSCRIPTION_LATENCY_TARGET_SECONDS = float(os.environ.get("TRANSCRIPTION_LATENCY_TARGET_SECONDS", "300"))
+LOCAL_WHISPER_MODEL = os.environ.get("LOCAL_WHISPER_MODEL", "small")  # Model name, or path to a converted CTranslate2 model
+LOCAL_WHISPER_MODEL_DIR = os.environ.get("LOCAL_WHISPER_MODEL_DIR", "/tmp/whisper-models")  # Download location for named models
+LOCAL_WHISPER_COMPUTE_TYPE = os.environ.get("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_WHISPER_WORKERS = int(os.environ.get("LOCAL_WHISPER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))  # Chunks transcribed at once
+LOCAL_WHISPER_CPU_THREADS = int(os.environ.get("LOCAL_WHISPER_CPU_THREADS", str(max(1, (os.cpu_count() or 2) // LOCAL_WHISPER_WORKERS))))
+LOCAL_WHISPER_BEAM_SIZE = int(os.environ.get("LOCAL_WHISPER_BEAM_SIZE", "1"))  # Greedy decoding; beams cost a multiple of the CPU time
+LOCAL_WHISPER_LANGUAGE = os.environ.get("LOCAL_WHISPER_LANGUAGE") or None  # Detected per chunk when unset
+LOCAL_WHISPER_SPEED = float(os.environ.get("LOCAL_WHISPER_SPEED", "3.0"))  # Audio seconds one worker transcribes per second, for 'auto'
+LOCAL_WHISPER_RETRY_SECONDS = int(os.environ.get("LOCAL_WHISPER_RETRY_SECONDS", "600"))  # Uses the API this long after a failed model load
+LOCAL_DECODED_CHUNKS_PER_WORKER = 2  # Decoded PCM held in memory ahead of the model
+PCM_SAMPLE_RATE = 16000  # Whisper models take 16 kHz mono
+
+QUEUE_ASSUMED_BITRATE_KBPS = 128  # For estimating a queued job's length from its object size
 
 def update_video_status(video_id: str, status: str, error_message: str = None):
-    """Update video status in Supabase."""
-    if not supabase:
-        print(f"Supabase not configured. Status: {video_id} -> {status}")
-        return
-    
-    try:
-        update_data = {'transcription_status': status}
-        if error_message:
-            update_data['error_message'] = error_message
-        
-        response = supabase.table('videos').update(update_data).eq('id', video_id).execute()
-        print(f"Video {video_id} status updated to {status}")
-    except Exception as e:
-        print(f"Error updating video status: {e}")
+    """Queue a video status update; it is written in the background and flushed before the handler returns."""
+    queue_video_status(get_supabase, video_id, status, error_message)
 
 def compress_audio_for_whisper(input_path: str, target_size_mb: float = 24.0) -> str:
     """Compress audio file for Whisper."""
@@ -114,7 +342,7 @@ def compress_audio_for_whisper(input_path: str, target_size_mb: float = 24.0) ->
         
         # Try to load audio with error handling for missing ffprobe
         try:
-            audio = AudioSegment.from_file(input_path)
+            audio = get_audio_segment().from_file(input_path)
         except Exception as audio_error:
             print(f"Failed to load audio with pydub (likely missing ffprobe): {audio_error}")
             print("Skipping compression - will attempt direct processing")
@@ -155,11 +383,140 @@ def compress_audio_for_whisper(input_path: str, target_size_mb: float = 24.0) ->
         print("Returning original file")
         return input_path
 
+class TempWorkspace:
+    """Per-invocation temp directory with a disk budget and guaranteed cleanup.
+    
+    Writers reserve space before creating a file and block while the budget is used up, until
+    another file is released. cleanup() removes the whole directory, including anything that was
+    never tracked, and opening a workspace sweeps directories left behind by dead invocations.
+    """
+    
+    def __init__(self, job_id: str, budget_mb: float = 1024, root: str = "/tmp"):
+        self.job_id = job_id
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.root = root
+        self.path = None
+        self.peak_bytes = 0
+        self._files = {}
+        self._reserved_bytes = 0
+        self._condition = threading.Condition()
+    
+    def open(self) -> 'TempWorkspace':
+        sweep_stale_workspaces(self.root)
+        safe_job_id = re.sub(r'[^A-Za-z0-9_-]', '_', str(self.job_id))[:64]
+        self.path = tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{safe_job_id}_", dir=self.root)
+        print(f"Workspace {self.path} opened with a {self.budget_bytes / (1024 * 1024):.0f} MB budget")
+        return self
+    
+    def __enter__(self):
+        return self.open()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+        return False
+    
+    def file_path(self, name: str) -> str:
+        return os.path.join(self.path, os.path.basename(name))
+    
+    def used_bytes(self) -> int:
+        with self._condition:
+            return sum(self._files.values()) + self._reserved_bytes
+    
+    def fits(self, nbytes: int) -> bool:
+        """Whether a file of this size could ever fit in the budget."""
+        return nbytes <= self.budget_bytes
+    
+    def reserve(self, nbytes: int, timeout: float = WORKSPACE_RESERVE_TIMEOUT_SECONDS):
+        """Block until nbytes fit within the budget, then hold them for a file about to be written."""
+        if not self.fits(nbytes):
+            raise RuntimeError(f"{nbytes / (1024 * 1024):.1f} MB exceeds the {self.budget_bytes / (1024 * 1024):.0f} MB workspace budget")
+        
+        deadline = time.time() + timeout
+        with self._condition:
+            while sum(self._files.values()) + self._reserved_bytes + nbytes > self.budget_bytes:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise RuntimeError("Timed out waiting for workspace disk space")
+                self._condition.wait(remaining)
+            self._reserved_bytes += nbytes
+    
+    def track(self, file_path: str, reserved_bytes: int = 0):
+        """Swap a reservation for the actual size of the file that was written."""
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        with self._condition:
+            self._reserved_bytes = max(0, self._reserved_bytes - reserved_bytes)
+            self._files[file_path] = size
+            self.peak_bytes = max(self.peak_bytes, sum(self._files.values()) + self._reserved_bytes)
+            self._condition.notify_all()
+    
+    def unreserve(self, reserved_bytes: int):
+        with self._condition:
+            self._reserved_bytes = max(0, self._reserved_bytes - reserved_bytes)
+            self._condition.notify_all()
+    
+    def release(self, file_path: str):
+        """Delete a tracked file as soon as it is no longer needed and wake any waiting writer."""
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            print(f"Warning: Could not remove {file_path}: {e}")
+        with self._condition:
+            self._files.pop(file_path, None)
+            self._condition.notify_all()
+    
+    def cleanup(self):
+        if self.path and os.path.isdir(self.path):
+            shutil.rmtree(self.path, ignore_errors=True)
+            print(f"Workspace {self.path} removed (peak usage {self.peak_bytes / (1024 * 1024):.2f} MB)")
+        with self._condition:
+            self._files.clear()
+            self._reserved_bytes = 0
+            self._condition.notify_all()
+
+def sweep_stale_workspaces(root: str = "/tmp"):
+    """Remove workspaces older than any live invocation could be, left by crashed or timed-out runs."""
+    try:
+        for entry in os.scandir(root):
+            if entry.is_dir() and entry.name.startswith(WORKSPACE_PREFIX) \
+                    and time.time() - entry.stat().st_mtime > STALE_WORKSPACE_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                print(f"Removed stale workspace: {entry.path}")
+    except Exception as e:
+        print(f"Warning: Could not sweep stale workspaces: {e}")
+
+def compute_target_bitrate_kbps(duration_seconds: float, target_size_mb: float, codec: str = "opus") -> int:
+    """Largest bitrate that fits the whole duration into the size budget, clamped to the codec's speech range."""
+    codec_settings = AUDIO_CODECS[codec]
+    budget_bits = target_size_mb * 1024 * 1024 * 8 * BITRATE_HEADROOM_RATIO
+    bitrate_kbps = int(budget_bits / max(duration_seconds, 1.0) / 1000)
+    bitrate_kbps = max(codec_settings['min_kbps'], min(codec_settings['max_kbps'], bitrate_kbps))
+    
+    if codec == 'mp3':
+        bitrate_kbps = max([b for b in MP3_16KHZ_BITRATES_KBPS if b <= bitrate_kbps] or [MP3_16KHZ_BITRATES_KBPS[0]])
+    
+    return bitrate_kbps
+
+def build_audio_encode_args(bitrate_kbps: int, codec: str = "opus") -> List[str]:
+    """ffmpeg output arguments for 16kHz mono speech in the given codec."""
+    codec_settings = AUDIO_CODECS[codec]
+    return [
+        '-vn',  # Drop any video stream
+        '-ac', '1',  # Convert to mono
+        '-ar', '16000',  # 16kHz sample rate (optimal for Whisper)
+        '-c:a', codec_settings['encoder'],
+        '-b:a', f"{bitrate_kbps}k",
+        *codec_settings['extra_args'],
+        '-f', codec_settings['format']
+    ]
+
 def compress_with_ffmpeg_direct(input_path: str, target_size_mb: float = 24.0) -> str:
-    """Compress audio using ffmpeg directly when pydub fails."""
+    """Compress audio to fit target_size_mb in a single ffmpeg encode.
+    
+    The bitrate is computed from the ffprobe duration and the size budget rather than guessed,
+    so the output fits on the first pass. Falls back to MP3 only if the Opus encode fails.
+    """
     try:
-        import subprocess
-        
         original_size = os.path.getsize(input_path)
         original_size_mb = original_size / (1024 * 1024)
         
@@ -174,67 +531,58 @@ def compress_with_ffmpeg_direct(input_path: str, target_size_mb: float = 24.0) -
             print("FFmpeg not available for direct compression")
             return input_path
         
-        # Calculate target bitrate based on compression ratio needed
-        compression_ratio = target_size_mb / original_size_mb
-        if compression_ratio < 0.3:
-            bitrate = "32k"
-        elif compression_ratio < 0.5:
-            bitrate = "48k"
-        elif compression_ratio < 0.7:
-            bitrate = "64k"
-        else:
-            bitrate = "96k"
-        
-        compressed_path = input_path.replace('.', '_ffmpeg_compressed.') + '.mp3'
-        
-        # FFmpeg command for aggressive compression optimized for speech
-        ffmpeg_cmd = [
-            FFMPEG_PATH,
-            '-i', input_path,
-            '-ac', '1',  # Convert to mono
-            '-ar', '16000',  # 16kHz sample rate (optimal for Whisper)
-            '-ab', bitrate,  # Audio bitrate
-            '-f', 'mp3',  # Output format
-            '-y',  # Overwrite output file
-            compressed_path
-        ]
-        
-        print(f"Running ffmpeg compression with bitrate {bitrate}...")
-        print(f"Command: {' '.join(ffmpeg_cmd)}")
-        
-        # Run ffmpeg with timeout
-        result = subprocess.run(
-            ffmpeg_cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
+        try:
+            duration_seconds = get_audio_duration_seconds(input_path)
+        except Exception as probe_error:
+            print(f"Failed to probe duration, using minimum bitrate: {probe_error}")
+            duration_seconds = None
         
-        if result.returncode == 0:
-            if os.path.exists(compressed_path):
+        codecs_to_try = [WHISPER_AUDIO_CODEC] + (['mp3'] if WHISPER_AUDIO_CODEC != 'mp3' else [])
+        for codec in codecs_to_try:
+            if duration_seconds:
+                bitrate_kbps = compute_target_bitrate_kbps(duration_seconds, target_size_mb, codec)
+                expected_size_mb = bitrate_kbps * 1000 * duration_seconds / 8 / (1024 * 1024)
+                if expected_size_mb > target_size_mb:
+                    print(f"Warning: {duration_seconds/60:.1f} min at the minimum {bitrate_kbps}k is about {expected_size_mb:.2f} MB, over the {target_size_mb} MB target")
+            else:
+                bitrate_kbps = AUDIO_CODECS[codec]['min_kbps']
+            
+            compressed_path = f"{os.path.splitext(input_path)[0]}_compressed.{AUDIO_CODECS[codec]['extension']}"
+            ffmpeg_cmd = [
+                FFMPEG_PATH,
+                '-nostdin',
+                '-hide_banner',
+                '-loglevel', 'error',
+                *build_input_args(input_path),
+                *build_audio_encode_args(bitrate_kbps, codec),
+                '-y',  # Overwrite output file
+                compressed_path
+            ]
+            
+            print(f"Running single-pass {codec} compression at {bitrate_kbps}k...")
+            print(f"Command: {' '.join(ffmpeg_cmd)}")
+            
+            result = subprocess.run(
+                ffmpeg_cmd,
+                capture_output=True,
+                text=True,
+                timeout=300  # 5 minute timeout
+            )
+            
+            if result.returncode == 0 and os.path.exists(compressed_path):
                 compressed_size = os.path.getsize(compressed_path) / (1024 * 1024)
                 reduction = ((original_size_mb - compressed_size) / original_size_mb) * 100
                 print(f"FFmpeg compression successful: {compressed_size:.2f} MB ({reduction:.1f}% reduction)")
-                
-                if compressed_size <= target_size_mb:
-                    return compressed_path
-                else:
+                if compressed_size > target_size_mb:
                     print(f"Compressed file still too large: {compressed_size:.2f} MB > {target_size_mb} MB")
-                    # Try more aggressive compression
-                    if bitrate != "32k":
-                        print("Attempting more aggressive compression...")
-                        os.remove(compressed_path)
-                        return compress_with_ffmpeg_direct(input_path, target_size_mb * 0.8)  # Try for smaller target
-                    else:
-                        print("Already at minimum bitrate, returning compressed file anyway")
-                        return compressed_path
-            else:
-                print("FFmpeg compression failed - output file not created")
-                return input_path
-        else:
-            print(f"FFmpeg failed with return code {result.returncode}")
+                return compressed_path
+            
+            print(f"FFmpeg {codec} encode failed with return code {result.returncode}")
             print(f"Error output: {result.stderr}")
-            return input_path
+            if os.path.exists(compressed_path):
+                os.remove(compressed_path)
+        
+        return input_path
             
     except subprocess.TimeoutExpired:
         print("FFmpeg compression timed out")
@@ -243,23 +591,357 @@ def compress_with_ffmpeg_direct(input_path: str, target_size_mb: float = 24.0) -
         print(f"Direct ffmpeg compression failed: {e}")
         return input_path
 
-def create_audio_chunks_with_overlap(input_path: str, chunk_duration_minutes: int = 8, overlap_seconds: int = 30) -> List[Dict]:
-    """Create overlapping audio chunks."""
+def is_remote_input(input_path: str) -> bool:
+    return input_path.startswith(('http://', 'https://'))
+
+def build_input_args(input_path: str) -> List[str]:
+    """ffmpeg input arguments; streamed inputs reconnect on dropped connections."""
+    if is_remote_input(input_path):
+        return ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5', '-i', input_path]
+    return ['-i', input_path]
+
+def get_audio_duration_seconds(input_path: str) -> float:
+    """Read the media duration from the container with ffprobe, without decoding any audio."""
+    ffprobe_cmd = [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        input_path
+    ]
+    result = subprocess.run(ffprobe_cmd, capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed with return code {result.returncode}: {result.stderr.strip()}")
+    
     try:
-        print(f"Creating chunks from: {input_path}")
+        return float(result.stdout.strip())
+    except ValueError:
+        raise RuntimeError(f"ffprobe returned no usable duration: {result.stdout.strip()!r}")
+
+class ChunkLimitError(RuntimeError):
+    """The recording needs more chunk windows than the job may use.
+    
+    Raised instead of returning the windows planned so far, which would leave the end of the
+    recording out of a transcript that still looks complete.
+    """
+    
+    def __init__(self, max_chunks: int, covered_seconds: float, total_duration_seconds: float):
+        super().__init__(
+            f"Recording is {total_duration_seconds/60:.1f} min but {max_chunks} chunks only cover "
+            f"{covered_seconds/60:.1f} min; transcribe it in distributed mode or raise the chunk limit"
+        )
+        self.max_chunks = max_chunks
+        self.covered_seconds = covered_seconds
+        self.total_duration_seconds = total_duration_seconds
+
+class ChunkCreationError(RuntimeError):
+    """A chunk after the first could not be cut, so the chunks made so far would not cover the recording."""
+    
+    def __init__(self, chunk_index: int, error: Exception):
+        super().__init__(f"Failed to create chunk {chunk_index}: {error}")
+        self.chunk_index = chunk_index
+
+def plan_chunk_windows(total_duration_seconds: float, chunk_duration_seconds: float, overlap_seconds: float,
+                       max_chunks: int = MAX_CHUNKS) -> List[Dict]:
+    """Plan overlapping chunk windows covering the whole recording."""
+    windows = []
+    start_seconds = 0.0
+    
+    while start_seconds < total_duration_seconds:
+        end_seconds = min(start_seconds + chunk_duration_seconds, total_duration_seconds)
         
-        # Check if we have the necessary tools for chunking
-        ffmpeg_available = os.path.exists(FFMPEG_PATH)
-        ffprobe_available = os.path.exists(FFPROBE_PATH)
+        if end_seconds - start_seconds < MIN_CHUNK_SECONDS:  # Skip very short chunks
+            break
         
-        if not (ffmpeg_available and ffprobe_available):
-            print(f"Missing required tools - FFmpeg: {ffmpeg_available}, FFprobe: {ffprobe_available}")
-            print("Falling back to single file processing")
-            return create_single_chunk_fallback(input_path)
+        windows.append({
+            'index': len(windows),
+            'start_seconds': start_seconds,
+            'end_seconds': end_seconds,
+            'duration_seconds': end_seconds - start_seconds,
+            'overlap_seconds': overlap_seconds if windows else 0.0
+        })
+        
+        # The last window reaches the end of the file; stepping back by the overlap would only repeat its tail
+        if end_seconds >= total_duration_seconds:
+            break
+        
+        if len(windows) >= max_chunks:
+            raise ChunkLimitError(max_chunks, end_seconds, total_duration_seconds)
+        
+        start_seconds = end_seconds - overlap_seconds
+    
+    return windows
+
+def detect_silences(input_path: str, start_seconds: float, duration_seconds: float) -> List[Tuple[float, float]]:
+    """Find pauses in one range of the source with ffmpeg silencedetect.
+    
+    Only the requested range is decoded, at a low sample rate. Returns (start, end) pairs in
+    absolute seconds; a pause still open at the end of the range is closed at the range end.
+    """
+    ffmpeg_cmd = [
+        FFMPEG_PATH,
+        '-nostdin',
+        '-hide_banner',
+        '-ss', f"{start_seconds:.3f}",
+        '-t', f"{duration_seconds:.3f}",
+        *build_input_args(input_path),
+        '-vn',
+        '-ac', '1',
+        '-ar', '8000',
+        '-af', f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={SILENCE_MIN_SECONDS}",
+        '-f', 'null',
+        '-'
+    ]
+    
+    result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg silencedetect failed with return code {result.returncode}: {result.stderr.strip()[-500:]}")
+    
+    # Timestamps restart at zero after input seeking, so shift them back to absolute time
+    silences = []
+    silence_start = None
+    for line in result.stderr.splitlines():
+        start_match = re.search(r'silence_start: (-?[\d.]+)', line)
+        if start_match:
+            silence_start = max(0.0, float(start_match.group(1))) + start_seconds
+            continue
+        end_match = re.search(r'silence_end: (-?[\d.]+)', line)
+        if end_match and silence_start is not None:
+            silences.append((silence_start, float(end_match.group(1)) + start_seconds))
+            silence_start = None
+    
+    if silence_start is not None:
+        silences.append((silence_start, start_seconds + duration_seconds))
+    
+    return silences
+
+def plan_silence_aware_windows(input_path: str, total_duration_seconds: float, chunk_duration_seconds: float,
+                               search_seconds: float = 60, fallback_overlap_seconds: float = 5,
+                               max_chunks: int = MAX_CHUNKS) -> List[Dict]:
+    """Plan chunk windows whose cuts fall in pauses close to the target chunk length.
+    
+    Only the search range before each target cut is scanned for silence. Cuts placed in a pause
+    need no overlap; when no pause is found the cut falls at the target with a small overlap.
+    """
+    windows = []
+    start_seconds = 0.0
+    overlap_with_previous = 0.0
+    
+    while start_seconds < total_duration_seconds:
+        target_seconds = start_seconds + chunk_duration_seconds
+        boundary = 'end'
+        next_overlap = 0.0
+        
+        if target_seconds >= total_duration_seconds - MIN_CHUNK_SECONDS:
+            end_seconds = total_duration_seconds
+        else:
+            search_start = max(start_seconds + MIN_CHUNK_SECONDS, target_seconds - search_seconds)
+            try:
+                silences = detect_silences(input_path, search_start, target_seconds - search_start)
+            except Exception as silence_error:
+                print(f"Silence detection failed near {target_seconds/60:.1f} min: {silence_error}")
+                silences = []
+            
+            # Prefer the pause closest to the target so chunks stay near the intended length
+            cut_seconds = None
+            for silence_start, silence_end in silences:
+                midpoint = min((silence_start + silence_end) / 2, target_seconds)
+                if midpoint > start_seconds + MIN_CHUNK_SECONDS and (cut_seconds is None or midpoint > cut_seconds):
+                    cut_seconds = midpoint
+            
+            if cut_seconds is not None:
+                end_seconds = cut_seconds
+                boundary = 'silence'
+            else:
+                end_seconds = target_seconds
+                boundary = 'fixed'
+                next_overlap = fallback_overlap_seconds
+        
+        windows.append({
+            'index': len(windows),
+            'start_seconds': start_seconds,
+            'end_seconds': end_seconds,
+            'duration_seconds': end_seconds - start_seconds,
+            'overlap_seconds': overlap_with_previous,
+            'boundary': boundary
+        })
+        
+        if end_seconds >= total_duration_seconds:
+            break
+        
+        if len(windows) >= max_chunks:
+            raise ChunkLimitError(max_chunks, end_seconds, total_duration_seconds)
+        
+        start_seconds = end_seconds - next_overlap
+        overlap_with_previous = next_overlap
+    
+    silence_cuts = sum(1 for w in windows if w['boundary'] == 'silence')
+    print(f"Planned {len(windows)} chunks, {silence_cuts} cut in pauses")
+    return windows
+
+def plan_chunk_boundaries(input_path: str, total_duration_seconds: float, chunk_duration_seconds: float, overlap_seconds: float,
+                          max_chunks: int = MAX_CHUNKS) -> List[Dict]:
+    """Plan chunk windows using the configured boundary mode."""
+    if CHUNK_BOUNDARY_MODE == 'silence':
+        return plan_silence_aware_windows(
+            input_path, total_duration_seconds, chunk_duration_seconds,
+            SILENCE_SEARCH_SECONDS, SILENCE_FALLBACK_OVERLAP_SECONDS, max_chunks
+        )
+    
+    return plan_chunk_windows(total_duration_seconds, chunk_duration_seconds, overlap_seconds, max_chunks)
+
+def extract_audio_segment(input_path: str, start_seconds: float, duration_seconds: float, output_path: str,
+                          bitrate_kbps: int = 32, codec: str = "opus") -> str:
+    """Cut one window out of the source with ffmpeg input seeking and encode it for Whisper.
+    
+    Seeking before -i means ffmpeg only demuxes and decodes the requested range, so memory use
+    does not depend on the length of the source file.
+    """
+    ffmpeg_cmd = [
+        FFMPEG_PATH,
+        '-nostdin',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-ss', f"{start_seconds:.3f}",
+        '-t', f"{duration_seconds:.3f}",
+        *build_input_args(input_path),
+        *build_audio_encode_args(bitrate_kbps, codec),
+        '-y',
+        output_path
+    ]
+    
+    result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, timeout=300)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        raise RuntimeError(f"ffmpeg segment extraction failed with return code {result.returncode}: {result.stderr.strip()}")
+    
+    return output_path
+
+def plan_whisper_chunks(input_path: str, chunk_duration_minutes: int = 8, overlap_seconds: int = 30,
+                        total_duration_seconds: float = None) -> List[Dict]:
+    """Plan how the source reaches Whisper, straight from the original file.
+    
+    Short recordings become one window that is passed through untouched when it already fits the
+    upload limit, and encoded once otherwise. Longer recordings are split into planned windows, each
+    cut and encoded from the original, so nothing is transcoded twice.
+    """
+    if total_duration_seconds is None:
+        total_duration_seconds = get_audio_duration_seconds(input_path)
+    print(f"Total duration: {total_duration_seconds/60:.2f} minutes")
+    
+    if total_duration_seconds < chunk_duration_minutes * 60 * 1.5:  # 1.5x the chunk size
+        print("File is short enough to process without chunking")
+        window = {
+            'index': 0,
+            'start_seconds': 0.0,
+            'end_seconds': total_duration_seconds,
+            'duration_seconds': total_duration_seconds,
+            'overlap_seconds': 0.0
+        }
+        if can_pass_through(input_path):
+            window['passthrough'] = True
+        return [window]
+    
+    return plan_chunk_boundaries(input_path, total_duration_seconds, chunk_duration_minutes * 60, overlap_seconds)
+
+def can_pass_through(input_path: str) -> bool:
+    # A streamed source has to be encoded anyway, since Whisper needs the bytes uploaded
+    return not is_remote_input(input_path) and os.path.getsize(input_path) <= OPENAI_MAX_FILE_SIZE
+
+def encode_chunk(input_path: str, window: Dict, workspace: TempWorkspace = None) -> Dict:
+    """Encode one planned window to its own speech-optimised chunk file.
+    
+    The bitrate is the codec's speech default unless the window is long enough that it would
+    not fit the upload limit, in which case it is sized down to fit.
+    """
+    if window.get('passthrough'):
+        chunk_size_mb = os.path.getsize(input_path) / (1024 * 1024)
+        print(f"Chunk {window['index'] + 1}: sending original file ({chunk_size_mb:.2f} MB)")
+        return {**window, 'path': input_path, 'size_mb': chunk_size_mb}
+    
+    encode_start = time.time()
+    codecs_to_try = [WHISPER_AUDIO_CODEC] + (['mp3'] if WHISPER_AUDIO_CODEC != 'mp3' else [])
+    for codec in codecs_to_try:
+        bitrate_kbps = min(
+            AUDIO_CODECS[codec]['speech_kbps'],
+            compute_target_bitrate_kbps(window['duration_seconds'], OPENAI_TARGET_SIZE_MB, codec)
+        )
+        chunk_name = f"chunk_{window['index']:03d}.{AUDIO_CODECS[codec]['extension']}"
+        chunk_path = workspace.file_path(chunk_name) if workspace else os.path.join(TMP_ROOT, chunk_name)
         
+        # Hold room for the encoded chunk (plus margin for VBR) until its real size is known
+        reserved_bytes = int(bitrate_kbps * 1000 * window['duration_seconds'] / 8 * 1.1)
+        if workspace:
+            workspace.reserve(reserved_bytes)
+        try:
+            extract_audio_segment(input_path, window['start_seconds'], window['duration_seconds'], chunk_path, bitrate_kbps, codec)
+            if workspace:
+                workspace.track(chunk_path, reserved_bytes)
+            break
+        except Exception as encode_error:
+            if workspace:
+                workspace.unreserve(reserved_bytes)
+            if codec == codecs_to_try[-1]:
+                raise
+            print(f"Chunk {window['index'] + 1}: {codec} encode failed, retrying as mp3: {encode_error}")
+    
+    chunk_size_mb = os.path.getsize(chunk_path) / (1024 * 1024)
+    
+    encode_seconds = time.time() - encode_start
+    
+    print(f"Chunk {window['index'] + 1}: {window['start_seconds']/60:.1f}-{window['end_seconds']/60:.1f} min at {bitrate_kbps}k ({chunk_size_mb:.2f} MB, {encode_seconds:.2f}s)")
+    
+    return {**window, 'path': chunk_path, 'size_mb': chunk_size_mb, 'encode_seconds': encode_seconds}
+
+def decode_pcm_chunk(input_path: str, window: Dict, sample_rate: int = PCM_SAMPLE_RATE) -> Dict:
+    """Decode one planned window straight to mono float32 PCM in memory, for a local model."""
+    import numpy as np
+    
+    decode_start = time.time()
+    ffmpeg_cmd = [
+        FFMPEG_PATH,
+        '-nostdin',
+        '-hide_banner',
+        '-loglevel', 'error',
+        '-ss', f"{window['start_seconds']:.3f}",
+        '-t', f"{window['duration_seconds']:.3f}",
+        *build_input_args(input_path),
+        '-vn', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 's16le',
+        'pipe:1'
+    ]
+    result = subprocess.run(ffmpeg_cmd, capture_output=True, timeout=300)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg PCM decode failed with return code {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+    
+    pcm = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+    decode_seconds = time.time() - decode_start
+    print(f"Chunk {window['index'] + 1}: {window['start_seconds']/60:.1f}-{window['end_seconds']/60:.1f} min decoded to PCM ({pcm.nbytes / (1024 * 1024):.1f} MB, {decode_seconds:.2f}s)")
+    
+    return {**window, 'pcm': pcm, 'size_mb': pcm.nbytes / (1024 * 1024), 'encode_seconds': decode_seconds}
+
+def create_audio_chunks_with_overlap(input_path: str, chunk_duration_minutes: int = 8, overlap_seconds: int = 30,
+                                     workspace: TempWorkspace = None) -> List[Dict]:
+    """Create overlapping audio chunks with pydub, or one chunk of the whole file when ffmpeg is missing."""
+    print(f"Creating chunks from: {input_path}")
+    
+    # Check if we have the necessary tools for chunking
+    ffmpeg_available = os.path.exists(FFMPEG_PATH)
+    ffprobe_available = os.path.exists(FFPROBE_PATH)
+    
+    if not (ffmpeg_available and ffprobe_available):
+        print(f"Missing required tools - FFmpeg: {ffmpeg_available}, FFprobe: {ffprobe_available}")
+        print("Falling back to single file processing")
+        return create_single_chunk_fallback(input_path)
+    
+    return create_audio_chunks_pydub(input_path, chunk_duration_minutes, overlap_seconds, workspace)
+
+def create_audio_chunks_pydub(input_path: str, chunk_duration_minutes: int = 8, overlap_seconds: int = 30,
+                              workspace: TempWorkspace = None) -> List[Dict]:
+    """Create overlapping audio chunks by decoding the whole file with pydub."""
+    try:
         # Try to load the audio file
         try:
-            audio = AudioSegment.from_file(input_path)
+            audio = get_audio_segment().from_file(input_path)
         except Exception as audio_error:
             print(f"Failed to load audio file: {audio_error}")
             print("This is likely due to missing ffprobe or unsupported format")
@@ -275,24 +957,22 @@ def create_audio_chunks_with_overlap(input_path: str, chunk_duration_minutes: in
             print("File is short enough to process without chunking")
             return create_single_chunk_fallback(input_path)
         
-        chunk_duration_ms = chunk_duration_minutes * 60 * 1000
-        overlap_ms = overlap_seconds * 1000
-        
+        windows = plan_chunk_windows(total_duration_seconds, chunk_duration_minutes * 60, overlap_seconds)
         chunks = []
-        chunk_index = 0
-        start_ms = 0
         
-        while start_ms < total_duration_ms:
-            end_ms = min(start_ms + chunk_duration_ms, total_duration_ms)
+        for window in windows:
+            chunk_index = window['index']
+            start_ms = int(window['start_seconds'] * 1000)
+            end_ms = int(window['end_seconds'] * 1000)
             
             try:
                 chunk_audio = audio[start_ms:end_ms]
                 
-                if len(chunk_audio) < 10000:  # Skip very short chunks
-                    break
-                
-                chunk_path = f"/tmp/chunk_{chunk_index:03d}.mp3"
+                chunk_name = f"chunk_{chunk_index:03d}.mp3"
+                chunk_path = workspace.file_path(chunk_name) if workspace else os.path.join(TMP_ROOT, chunk_name)
                 chunk_audio.export(chunk_path, format="mp3", bitrate="64k")
+                if workspace:
+                    workspace.track(chunk_path)
                 
                 chunks.append({
                     'index': chunk_index,
@@ -311,16 +991,8 @@ def create_audio_chunks_with_overlap(input_path: str, chunk_duration_minutes: in
                 if chunk_index == 0:  # If first chunk fails, give up on chunking
                     print("First chunk creation failed, falling back to single file processing")
                     return create_single_chunk_fallback(input_path)
-                else:
-                    print("Stopping chunk creation due to error")
-                    break
-            
-            start_ms = end_ms - overlap_ms
-            chunk_index += 1
-            
-            if chunk_index > 50:
-                print("Maximum chunk limit reached")
-                break
+                # Stopping here would return a transcript that silently ends early
+                raise ChunkCreationError(chunk_index, chunk_error) from chunk_error
         
         if len(chunks) == 0:
             print("No chunks were created, falling back to single file processing")
@@ -329,6 +1001,8 @@ def create_audio_chunks_with_overlap(input_path: str, chunk_duration_minutes: in
         print(f"Created {len(chunks)} chunks successfully")
         return chunks
         
+    except (ChunkLimitError, ChunkCreationError):
+        raise
     except Exception as e:
         print(f"Error creating chunks with pydub: {e}")
         print("Attempting fallback: single file processing")
@@ -336,6 +1010,9 @@ def create_audio_chunks_with_overlap(input_path: str, chunk_duration_minutes: in
 
 def create_single_chunk_fallback(input_path: str) -> List[Dict]:
     """Fallback method that processes the entire file as a single chunk."""
+    if is_remote_input(input_path):
+        raise Exception("Single file fallback needs a downloaded file, not a streamed source")
+    
     try:
         file_size = os.path.getsize(input_path)
         file_size_mb = file_size / (1024 * 1024)
@@ -381,47 +1058,728 @@ def create_single_chunk_fallback(input_path: str) -> List[Dict]:
         print(f"Fallback method also failed: {e}")
         raise
 
-def transcribe_single_chunk(chunk_info: Dict, openai_client, chunk_number: int, total_chunks: int) -> Dict:
-    """Transcribe a single chunk."""
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limit for Whisper requests.
+    
+    The limit grows by one request per limit's worth of successes and halves on a throttle
+    (at most once per cooldown, so one burst of 429s counts as one event). A Retry-After pause
+    holds back every new request, not just the one that was throttled.
+    """
+    
+    def __init__(self, initial_limit: int = 5, max_limit: int = 16, min_limit: int = 1,
+                 decrease_factor: float = 0.5, decrease_cooldown_seconds: float = 2.0):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, initial_limit)
+        self.limit = float(max(min_limit, initial_limit))
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown_seconds = decrease_cooldown_seconds
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._started = time.time()
+        self.metrics = {
+            'requests': 0,
+            'successes': 0,
+            'failures': 0,
+            'throttle_events': 0,
+            'limit_decreases': 0,
+            'retries': 0,
+            'peak_in_flight': 0,
+            'audio_seconds': 0.0,
+            'request_seconds': 0.0
+        }
+    
+    def acquire(self):
+        """Block until a request slot is free and no Retry-After pause is active."""
+        with self._condition:
+            while True:
+                pause_remaining = self._paused_until - time.time()
+                if pause_remaining > 0:
+                    self._condition.wait(pause_remaining)
+                elif self.in_flight >= int(self.limit):
+                    self._condition.wait()
+                else:
+                    break
+            self._take_slot()
+    
+    def _take_slot(self):
+        self.in_flight += 1
+        self.metrics['requests'] += 1
+        self.metrics['peak_in_flight'] = max(self.metrics['peak_in_flight'], self.in_flight)
+    
+    def release(self, outcome: str, request_seconds: float = 0.0, audio_seconds: float = 0.0):
+        """Return a slot and adjust the limit. outcome is 'success', 'throttled' or 'error'."""
+        with self._condition:
+            self.in_flight -= 1
+            self.metrics['request_seconds'] += request_seconds
+            
+            if outcome == 'success':
+                self.metrics['successes'] += 1
+                self.metrics['audio_seconds'] += audio_seconds
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            else:
+                self.metrics['failures'] += 1
+                if outcome == 'throttled':
+                    self.metrics['throttle_events'] += 1
+                    now = time.time()
+                    if now - self._last_decrease >= self.decrease_cooldown_seconds:
+                        self.limit = max(float(self.min_limit), self.limit * self.decrease_factor)
+                        self._last_decrease = now
+                        self.metrics['limit_decreases'] += 1
+                        print(f"Whisper throttled, concurrency limit reduced to {int(self.limit)}")
+            
+            self._condition.notify_all()
+    
+    def pause(self, seconds: float):
+        """Hold back all new requests for the given number of seconds."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+    
+    def record_retry(self):
+        with self._condition:
+            self.metrics['retries'] += 1
+    
+    def snapshot(self) -> Dict:
+        """Current limit plus throughput and throttle metrics."""
+        with self._condition:
+            elapsed = max(time.time() - self._started, 1e-6)
+            metrics = dict(self.metrics)
+            metrics['current_limit'] = int(self.limit)
+            metrics['elapsed_seconds'] = round(elapsed, 2)
+            metrics['chunks_per_minute'] = round(metrics['successes'] * 60 / elapsed, 2)
+            metrics['audio_seconds_per_second'] = round(metrics['audio_seconds'] / elapsed, 2)
+            metrics['audio_seconds'] = round(metrics['audio_seconds'], 2)
+            metrics['request_seconds'] = round(metrics['request_seconds'], 2)
+            return metrics
+
+class AsyncConcurrencyLimiter(AdaptiveConcurrencyLimiter):
+    """The same AIMD limit, also awaitable, for requests sent as coroutines on one event loop.
+    
+    acquire_async() waits without holding a thread. release() wakes waiting coroutines as well
+    as waiting threads, so one limiter can be shared by jobs on either engine.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wakeup = None
+        self._loop = None
+    
+    async def acquire_async(self):
+        """Wait until a request slot is free and no Retry-After pause is active."""
+        while True:
+            with self._condition:
+                pause_remaining = self._paused_until - time.time()
+                if pause_remaining <= 0 and self.in_flight < int(self.limit):
+                    self._take_slot()
+                    return
+                if self._wakeup is None:
+                    self._loop = asyncio.get_running_loop()
+                    self._wakeup = asyncio.Event()
+                wakeup = self._wakeup
+            try:
+                await asyncio.wait_for(wakeup.wait(), pause_remaining if pause_remaining > 0 else None)
+            except asyncio.TimeoutError:
+                pass
+    
+    def release(self, outcome: str, request_seconds: float = 0.0, audio_seconds: float = 0.0):
+        super().release(outcome, request_seconds, audio_seconds)
+        with self._condition:
+            wakeup, self._wakeup = self._wakeup, None
+        if wakeup is not None:
+            self._loop.call_soon_threadsafe(wakeup.set)
+
+def create_whisper_limiter(initial_limit: int, max_limit: int) -> AdaptiveConcurrencyLimiter:
+    limiter_class = AsyncConcurrencyLimiter if TRANSCRIPTION_ENGINE == 'asyncio' else AdaptiveConcurrencyLimiter
+    return limiter_class(initial_limit, max_limit)
+
+_shared_whisper_limiter = None
+_shared_whisper_limiter_lock = threading.Lock()
+
+def get_whisper_limiter() -> AdaptiveConcurrencyLimiter:
+    """
+    A limiter per job, or with a fleet-wide Whisper budget one limiter shared by every job this
+    container runs, so queued jobs running side by side stay within the container's share.
+    Its metrics are then cumulative for the container.
+    """
+    global _shared_whisper_limiter
+    if WHISPER_CONCURRENCY_BUDGET <= 0:
+        return create_whisper_limiter(MAX_PARALLEL_WORKERS, WHISPER_MAX_CONCURRENCY)
+    with _shared_whisper_limiter_lock:
+        if _shared_whisper_limiter is None:
+            _shared_whisper_limiter = create_whisper_limiter(min(MAX_PARALLEL_WORKERS, WHISPER_MAX_CONCURRENCY), WHISPER_MAX_CONCURRENCY)
+        return _shared_whisper_limiter
+
+def get_error_status_code(error: Exception):
+    """HTTP status code of an API error, if it carries one."""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code
+
+def get_retry_after_seconds(error: Exception):
+    """Parse Retry-After (seconds or HTTP date) or retry-after-ms from an API error response."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    
     try:
-        print(f"Transcribing chunk {chunk_number}/{total_chunks}")
+        retry_after_ms = headers.get('retry-after-ms')
+        if retry_after_ms:
+            return float(retry_after_ms) / 1000.0
         
-        with open(chunk_info['path'], "rb") as audio_file:
-            transcription = openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
+        retry_after = headers.get('retry-after')
+        if not retry_after:
+            return None
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except Exception:
+        return None
+
+def is_timeout_error(error: Exception) -> bool:
+    return isinstance(error, TimeoutError) or 'Timeout' in type(error).__name__
+
+def is_retryable_error(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and dropped connections are worth retrying."""
+    if get_error_status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    if isinstance(error, ConnectionError) or type(error).__name__ == 'APIConnectionError':
+        return True
+    return is_timeout_error(error)
+
+def compute_backoff_seconds(attempt: int, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    if retry_after is not None:
+        return retry_after + random.uniform(0, RETRY_BASE_DELAY_SECONDS)
+    return random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1))))
+
+class TranscriptCache:
+    """Transcripts keyed by content hash, with hit/miss counters per kind ('media' or 'chunk')."""
+    
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.stats = {'media_hits': 0, 'media_misses': 0, 'chunk_hits': 0, 'chunk_misses': 0, 'errors': 0}
+    
+    def get(self, key: str, kind: str) -> Dict:
+        try:
+            value = self._read(f"{TRANSCRIPT_CACHE_VERSION}/{kind}/{key}")
+        except Exception as e:
+            print(f"Warning: transcript cache read failed for {kind} {key}: {e}")
+            value = None
+            self._count('errors')
+        self._count(f"{kind}_hits" if value is not None else f"{kind}_misses")
+        return value
+    
+    def put(self, key: str, kind: str, value: Dict):
+        try:
+            self._write(f"{TRANSCRIPT_CACHE_VERSION}/{kind}/{key}", value)
+        except Exception as e:
+            print(f"Warning: transcript cache write failed for {kind} {key}: {e}")
+            self._count('errors')
+    
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+    
+    def _read(self, key: str):
+        raise NotImplementedError
+    
+    def _write(self, key: str, value: Dict):
+        raise NotImplementedError
+
+class SQLiteTranscriptCache(TranscriptCache):
+    """Transcript cache in a local SQLite file, for tests and local runs."""
+    
+    def __init__(self, db_path: str):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS transcript_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)')
+            self._connection.commit()
+    
+    def _read(self, key: str):
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM transcript_cache WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def _write(self, key: str, value: Dict):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO transcript_cache (key, value, created_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time())
             )
+            self._connection.commit()
+
+class S3TranscriptCache(TranscriptCache):
+    """Transcript cache stored as JSON objects under a prefix of the upload bucket."""
+    
+    def __init__(self, bucket: str, prefix: str):
+        super().__init__()
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def _read(self, key: str):
+        from botocore.exceptions import ClientError
         
-        text = transcription.text if hasattr(transcription, 'text') else str(transcription)
-        print(f"Chunk {chunk_number} completed: {len(text)} characters")
+        try:
+            response = get_s3_client().get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return None
+            raise
+        return json.loads(response['Body'].read())
+    
+    def _write(self, key: str, value: Dict):
+        get_s3_client().put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}.json",
+            Body=json.dumps(value).encode('utf-8'),
+            ContentType='application/json'
+        )
+
+_sqlite_transcript_cache = None
+
+def get_transcript_cache(s3_bucket: str) -> TranscriptCache:
+    """Transcript cache for the configured backend, or None when caching is off."""
+    global _sqlite_transcript_cache
+    
+    if TRANSCRIPT_CACHE_BACKEND == 's3':
+        return S3TranscriptCache(s3_bucket, TRANSCRIPT_CACHE_PREFIX)
+    if TRANSCRIPT_CACHE_BACKEND == 'sqlite':
+        # The connection is reused by warm invocations; counters are per invocation
+        if _sqlite_transcript_cache is None:
+            _sqlite_transcript_cache = SQLiteTranscriptCache(TRANSCRIPT_CACHE_SQLITE_PATH)
+        _sqlite_transcript_cache.stats = {stat: 0 for stat in _sqlite_transcript_cache.stats}
+        return _sqlite_transcript_cache
+    return None
+
+def compute_file_sha256(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def build_media_cache_key(s3_bucket: str, s3_key: str, file_info: Dict) -> str:
+    """Content key for a source object: its ETag and size, or a streamed SHA-256 of its bytes."""
+    if TRANSCRIPT_CACHE_HASH_MODE == 'sha256':
+        sha256 = hashlib.sha256()
+        response = get_s3_client().get_object(Bucket=s3_bucket, Key=s3_key)
+        for block in response['Body'].iter_chunks(1024 * 1024):
+            sha256.update(block)
+        return f"sha256-{sha256.hexdigest()}"
+    
+    etag = file_info['ETag'].strip('"')
+    return f"etag-{etag}-{file_info['ContentLength']}"
+
+def cache_media_transcript(cache: TranscriptCache, media_cache_key: str, results: List[Dict],
+                           merged_transcript: Dict, backend_name: str = 'openai') -> bool:
+    """
+    Store a merged transcript for reuse by identical media. Only a complete whisper-1 transcript is
+    stored: one with a failed chunk holds a placeholder, and a local model's output is not whisper-1's.
+    """
+    if not (cache and media_cache_key and backend_name == 'openai' and results and all(r['success'] for r in results)):
+        return False
+    cache.put(media_cache_key, 'media', merged_transcript)
+    return True
+
+def is_missing_object_error(error: Exception) -> bool:
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code') in ('NoSuchKey', '404')
+    return get_error_status_code(error) == 404
+
+class JobCheckpointStore:
+    """
+    Durable transcription progress per video: the chunk plan, one record per finished chunk and the
+    lease of the invocation working on it. Failures are logged and treated as missing records, so a
+    broken store costs re-transcription, never a failed job.
+    """
+    
+    def read(self, video_id: str, name: str) -> Dict:
+        try:
+            return self._read(f"{video_id}/{name}")
+        except Exception as e:
+            if not is_missing_object_error(e):
+                print(f"Warning: job checkpoint read failed for {video_id}/{name}: {e}")
+            return None
+    
+    def write(self, video_id: str, name: str, value: Dict):
+        try:
+            self._write(f"{video_id}/{name}", value)
+        except Exception as e:
+            print(f"Warning: job checkpoint write failed for {video_id}/{name}: {e}")
+    
+    def delete(self, video_id: str, names: List[str]):
+        try:
+            self._delete([f"{video_id}/{name}" for name in names])
+        except Exception as e:
+            print(f"Warning: could not delete job checkpoint for {video_id}: {e}")
+    
+    def create(self, video_id: str, name: str, value: Dict) -> bool:
+        """Write a record only if it does not exist yet; True for exactly one of several concurrent callers."""
+        try:
+            return self._create(f"{video_id}/{name}", value)
+        except Exception as e:
+            print(f"Warning: job checkpoint create failed for {video_id}/{name}: {e}")
+            return False
+    
+    def _read(self, key: str):
+        raise NotImplementedError
+    
+    def _write(self, key: str, value: Dict):
+        raise NotImplementedError
+    
+    def _delete(self, keys: List[str]):
+        raise NotImplementedError
+    
+    def _create(self, key: str, value: Dict) -> bool:
+        raise NotImplementedError
+
+class SQLiteJobCheckpointStore(JobCheckpointStore):
+    """Job checkpoints in a local SQLite file, for tests and local runs."""
+    
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute('CREATE TABLE IF NOT EXISTS job_checkpoints (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated_at REAL NOT NULL)')
+            self._connection.commit()
+    
+    def _read(self, key: str):
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM job_checkpoints WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def _write(self, key: str, value: Dict):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO job_checkpoints (key, value, updated_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time())
+            )
+            self._connection.commit()
+    
+    def _delete(self, keys: List[str]):
+        with self._lock:
+            self._connection.executemany('DELETE FROM job_checkpoints WHERE key = ?', [(key,) for key in keys])
+            self._connection.commit()
+    
+    def _create(self, key: str, value: Dict) -> bool:
+        with self._lock:
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO job_checkpoints (key, value, updated_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), time.time())
+            )
+            self._connection.commit()
+            return cursor.rowcount == 1
+
+class S3JobCheckpointStore(JobCheckpointStore):
+    """Job checkpoints as small JSON objects under a prefix of the upload bucket."""
+    
+    def __init__(self, bucket: str, prefix: str):
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def _read(self, key: str):
+        response = get_s3_client().get_object(Bucket=self.bucket, Key=f"{self.prefix}{key}.json")
+        return json.loads(response['Body'].read())
+    
+    def _write(self, key: str, value: Dict):
+        get_s3_client().put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}{key}.json",
+            Body=json.dumps(value).encode('utf-8'),
+            ContentType='application/json'
+        )
+    
+    def _create(self, key: str, value: Dict) -> bool:
+        # Conditional write: S3 rejects it with 412 when the object already exists
+        try:
+            get_s3_client().put_object(
+                Bucket=self.bucket,
+                Key=f"{self.prefix}{key}.json",
+                Body=json.dumps(value).encode('utf-8'),
+                ContentType='application/json',
+                IfNoneMatch='*'
+            )
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            code = response.get('Error', {}).get('Code') if isinstance(response, dict) else None
+            if code in ('PreconditionFailed', 'ConditionalRequestConflict') or get_error_status_code(e) == 412:
+                return False
+            raise
+        return True
+    
+    def _delete(self, keys: List[str]):
+        # delete_objects takes at most 1000 keys per request
+        for start in range(0, len(keys), 1000):
+            get_s3_client().delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': [{'Key': f"{self.prefix}{key}.json"} for key in keys[start:start + 1000]], 'Quiet': True}
+            )
+
+_sqlite_job_checkpoint_store = None
+
+def get_job_checkpoint_store(s3_bucket: str) -> JobCheckpointStore:
+    """Checkpoint store for the configured backend, or None when checkpointing is off."""
+    global _sqlite_job_checkpoint_store
+    
+    if JOB_CHECKPOINT_BACKEND == 's3':
+        return S3JobCheckpointStore(s3_bucket, JOB_CHECKPOINT_PREFIX)
+    if JOB_CHECKPOINT_BACKEND == 'sqlite':
+        if _sqlite_job_checkpoint_store is None:
+            _sqlite_job_checkpoint_store = SQLiteJobCheckpointStore(JOB_CHECKPOINT_SQLITE_PATH)
+        return _sqlite_job_checkpoint_store
+    return None
+
+def renew_job_lease(store: JobCheckpointStore, video_id: str, owner: str):
+    store.write(video_id, 'lease', {'owner': owner, 'renewed_at': time.time()})
+
+def can_take_over_job(store: JobCheckpointStore, video_id: str, owner: str) -> bool:
+    """
+    Whether an invocation may resume a video that is already in_progress: it is a retry of the
+    invocation holding the lease (async retries keep the request id), or that lease has gone stale.
+    """
+    lease = store.read(video_id, 'lease')
+    if not lease:
+        return False
+    if lease.get('owner') == owner:
+        return True
+    return time.time() - lease.get('renewed_at', 0.0) > JOB_LEASE_SECONDS
+
+def transcription_model_id(backend_name: str) -> str:
+    """The model a backend name transcribes with, so results from different models are never mixed."""
+    if backend_name == 'local':
+        return f"faster-whisper-{LOCAL_WHISPER_MODEL}-{LOCAL_WHISPER_COMPUTE_TYPE}"
+    return "whisper-1"
+
+def build_job_fingerprint(file_info: Dict, backend_name: str) -> str:
+    """Identifies the source object, the chunking settings and the model; a checkpoint is only resumed when it matches."""
+    etag = file_info['ETag'].strip('"')
+    return '-'.join(str(part) for part in (
+        JOB_CHECKPOINT_VERSION, TRANSCRIPT_CACHE_VERSION, etag, file_info['ContentLength'],
+        CHUNK_DURATION_MINUTES, CHUNK_OVERLAP_SECONDS, CHUNK_BOUNDARY_MODE, transcription_model_id(backend_name)
+    ))
+
+class JobCheckpoint:
+    """
+    One job's progress in a checkpoint store. The chunk plan is saved before any chunk is sent,
+    so a resumed run cuts the same windows and every saved chunk result still lines up.
+    """
+    
+    def __init__(self, store: JobCheckpointStore, video_id: str, fingerprint: str, owner: str):
+        self.store = store
+        self.video_id = video_id
+        self.fingerprint = fingerprint
+        self.owner = owner
+        self.windows = None
+        self.shards = None
+        self.results = {}
+    
+    def load(self, shard: int = None):
+        """Read the saved plan and finished chunk results (all, or one shard's), if they belong to the same source."""
+        manifest = self.store.read(self.video_id, 'manifest')
+        if not manifest:
+            return
+        if manifest.get('fingerprint') != self.fingerprint:
+            print(f"Ignoring job checkpoint for {self.video_id}: source, chunking settings or model changed")
+            return
         
-        return {
-            'index': chunk_info['index'],
-            'success': True,
-            'text': text,
-            'start_seconds': chunk_info['start_seconds'],
-            'end_seconds': chunk_info['end_seconds']
-        }
-    except Exception as e:
-        print(f"Error transcribing chunk {chunk_number}: {e}")
-        return {
-            'index': chunk_info['index'],
-            'success': False,
-            'text': f"[Error transcribing chunk {chunk_number}: {str(e)}]",
-            'start_seconds': chunk_info['start_seconds'],
-            'end_seconds': chunk_info['end_seconds'],
-            'error': str(e)
-        }
+        self.windows = manifest['windows']
+        self.shards = manifest.get('shards')
+        wanted = self.windows if shard is None else self.shard_windows(shard)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=JOB_CHECKPOINT_READ_WORKERS) as executor:
+            saved = executor.map(lambda window: self.store.read(self.video_id, self.chunk_name(window['index'])), wanted)
+            for result in saved:
+                # A chunk left behind by an earlier plan or another model is transcribed again
+                if result and result.get('success') and result.get('fingerprint') == self.fingerprint:
+                    self.results[result['index']] = {**result, 'resumed': True}
+        print(f"Job checkpoint: {len(self.results)}/{len(wanted)} chunks already transcribed")
+    
+    def shard_windows(self, shard: int) -> List[Dict]:
+        indexes = set(self.shards[shard])
+        return [window for window in self.windows if window['index'] in indexes]
+    
+    def is_complete(self) -> bool:
+        return bool(self.windows) and len(self.results) == len(self.windows)
+    
+    def start(self, windows: List[Dict], shards: List[List[int]] = None):
+        self.windows = [{k: v for k, v in window.items() if k != 'passthrough'} for window in windows]
+        self.shards = shards
+        self.store.write(self.video_id, 'manifest', {'fingerprint': self.fingerprint, 'windows': self.windows, 'shards': shards})
+    
+    def resumed_chunks_and_results(self) -> Tuple[List[Dict], List[Dict]]:
+        chunks = [{**window, 'resumed': True} for window in self.windows if window['index'] in self.results]
+        return chunks, [self.results[index] for index in sorted(self.results)]
+    
+    def save_result(self, result: Dict):
+        """Persist one finished chunk; each write also renews the lease."""
+        if not result.get('success'):
+            return
+        record = {key: result.get(key) for key in ('index', 'success', 'text', 'segments', 'start_seconds', 'end_seconds', 'overlap_seconds')}
+        record['fingerprint'] = self.fingerprint
+        self.store.write(self.video_id, self.chunk_name(result['index']), record)
+        renew_job_lease(self.store, self.video_id, self.owner)
+    
+    def for_backend(self, file_info: Dict, backend_name: str) -> 'JobCheckpoint':
+        """This job's checkpoint for chunks transcribed by backend_name; itself when that is the one loaded."""
+        fingerprint = build_job_fingerprint(file_info, backend_name)
+        if fingerprint == self.fingerprint:
+            return self
+        checkpoint = JobCheckpoint(self.store, self.video_id, fingerprint, self.owner)
+        checkpoint.load()
+        return checkpoint
+    
+    def clear(self):
+        names = ['manifest', 'lease', 'merge-lock'] + [self.chunk_name(window['index']) for window in self.windows or []]
+        names += [self.shard_name(shard) for shard in range(len(self.shards or []))]
+        self.store.delete(self.video_id, names)
+    
+    @staticmethod
+    def chunk_name(index: int) -> str:
+        return f"chunk-{index:04d}"
+    
+    @staticmethod
+    def shard_name(shard: int) -> str:
+        return f"shard-{shard:04d}"
+
+def transcribe_chunk_cached(chunk_info: Dict, openai_client, chunk_number: int, total_chunks: int,
+                            limiter: AdaptiveConcurrencyLimiter = None, cache: TranscriptCache = None) -> Dict:
+    """Transcribe a chunk unless identical chunk audio has been transcribed before."""
+    if cache is None:
+        return transcribe_single_chunk(chunk_info, openai_client, chunk_number, total_chunks, limiter)
+    
+    chunk_hash, cached_result = lookup_cached_chunk(chunk_info, chunk_number, total_chunks, cache)
+    if cached_result is not None:
+        return cached_result
+    
+    result = transcribe_single_chunk(chunk_info, openai_client, chunk_number, total_chunks, limiter)
+    if result['success']:
+        cache.put(chunk_hash, 'chunk', {'text': result['text'], 'segments': result['segments']})
+    return result
+
+def lookup_cached_chunk(chunk_info: Dict, chunk_number: int, total_chunks: int, cache: TranscriptCache) -> Tuple[str, Dict]:
+    """The chunk's content hash, and its result if the cache has a transcript for it."""
+    chunk_hash = compute_file_sha256(chunk_info['path'])
+    cached = cache.get(chunk_hash, 'chunk')
+    if cached is None:
+        return chunk_hash, None
+    print(f"Chunk {chunk_number}/{total_chunks} served from transcript cache")
+    result = build_chunk_result(chunk_info, cached['text'], cached.get('segments', []))
+    result['cached'] = True
+    return chunk_hash, result
+
+def get_response_field(response, name: str, default=None):
+    """Read a field from an OpenAI response object or a plain dict."""
+    if isinstance(response, dict):
+        return response.get(name, default)
+    return getattr(response, name, default)
+
+def request_chunk_transcription(chunk_info: Dict, openai_client) -> Dict:
+    """Send one chunk to Whisper and return its text and chunk-relative segments. Raises on API errors."""
+    with open(chunk_info['path'], "rb") as audio_file:
+        transcription = openai_client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            response_format="verbose_json",
+            timestamp_granularities=["segment"]
+        )
+    return parse_transcription(transcription)
+
+def parse_transcription(transcription) -> Dict:
+    """Text and chunk-relative segments of a Whisper verbose_json response."""
+    if isinstance(transcription, str):
+        text = transcription
+    else:
+        text = get_response_field(transcription, 'text', '') or ''
+    
+    # Segment times are relative to the chunk; merge_transcription_segments shifts them to absolute time
+    segments = []
+    for segment in get_response_field(transcription, 'segments', None) or []:
+        segments.append({
+            'start': float(get_response_field(segment, 'start', 0.0)),
+            'end': float(get_response_field(segment, 'end', 0.0)),
+            'text': (get_response_field(segment, 'text', '') or '').strip()
+        })
+    
+    return {'text': text, 'segments': segments}
+
+def transcribe_single_chunk(chunk_info: Dict, openai_client, chunk_number: int, total_chunks: int,
+                            limiter: AdaptiveConcurrencyLimiter = None) -> Dict:
+    """Transcribe a single chunk, retrying rate limits and transient errors with backoff."""
+    limiter = limiter or AdaptiveConcurrencyLimiter(WHISPER_MAX_CONCURRENCY, WHISPER_MAX_CONCURRENCY)
+    last_error = None
+    
+    for attempt in range(1, WHISPER_MAX_ATTEMPTS + 1):
+        limiter.acquire()
+        request_start = time.time()
+        try:
+            print(f"Transcribing chunk {chunk_number}/{total_chunks} (attempt {attempt})")
+            transcription = request_chunk_transcription(chunk_info, openai_client)
+        except Exception as e:
+            last_error = e
+            status_code = get_error_status_code(e)
+            throttled = status_code in THROTTLE_STATUS_CODES or is_timeout_error(e)
+            limiter.release('throttled' if throttled else 'error', time.time() - request_start)
+            
+            if not is_retryable_error(e) or attempt == WHISPER_MAX_ATTEMPTS:
+                break
+            
+            retry_after = get_retry_after_seconds(e)
+            if retry_after is not None:
+                limiter.pause(retry_after)
+            delay = compute_backoff_seconds(attempt, retry_after)
+            print(f"Chunk {chunk_number} failed with {status_code or type(e).__name__}, retrying in {delay:.1f}s: {e}")
+            limiter.record_retry()
+            time.sleep(delay)
+            continue
+        
+        limiter.release('success', time.time() - request_start, chunk_info.get('duration_seconds', 0.0))
+        print(f"Chunk {chunk_number} completed: {len(transcription['text'])} characters, {len(transcription['segments'])} segments")
+        
+        result = build_chunk_result(chunk_info, transcription['text'], transcription['segments'])
+        result['attempts'] = attempt
+        return result
+    
+    return build_chunk_error(chunk_info, chunk_number, last_error, attempt)
+
+def build_chunk_result(chunk_info: Dict, text: str, segments: List[Dict]) -> Dict:
+    return {
+        'index': chunk_info['index'],
+        'success': True,
+        'text': text,
+        'segments': segments,
+        'start_seconds': chunk_info['start_seconds'],
+        'end_seconds': chunk_info['end_seconds'],
+        'overlap_seconds': chunk_info.get('overlap_seconds', 0.0)
+    }
 
-def transcribe_chunks_parallel(chunks: List[Dict], openai_client, max_workers: int = 5) -> List[Dict]:
-    """Transcribe chunks in parallel."""
-    print(f"Starting parallel transcription with {max_workers} workers")
+def build_chunk_error(chunk_info: Dict, chunk_number: int, error: Exception, attempts: int) -> Dict:
+    print(f"Error transcribing chunk {chunk_number}: {error}")
+    return {
+        'index': chunk_info['index'],
+        'success': False,
+        'text': f"[Error transcribing chunk {chunk_number}: {str(error)}]",
+        'start_seconds': chunk_info['start_seconds'],
+        'end_seconds': chunk_info['end_seconds'],
+        'error': str(error),
+        'attempts': attempts
+    }
+
+def transcribe_chunks_parallel(chunks: List[Dict], openai_client, max_workers: int = 5,
+                               limiter: AdaptiveConcurrencyLimiter = None, cache: TranscriptCache = None) -> List[Dict]:
+    """Transcribe chunks in parallel under an adaptive concurrency limit."""
+    limiter = limiter or AdaptiveConcurrencyLimiter(max_workers, WHISPER_MAX_CONCURRENCY)
+    print(f"Starting parallel transcription with {int(limiter.limit)} workers (up to {limiter.max_limit})")
     results = []
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+    # Threads beyond the current limit wait in limiter.acquire until the limit grows
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(limiter.max_limit, len(chunks)) or 1) as executor:
         future_to_chunk = {
-            executor.submit(transcribe_single_chunk, chunk, openai_client, i + 1, len(chunks)): chunk
+            executor.submit(transcribe_chunk_cached, chunk, openai_client, i + 1, len(chunks), limiter, cache): chunk
             for i, chunk in enumerate(chunks)
         }
         
@@ -447,63 +1805,877 @@ def transcribe_chunks_parallel(chunks: List[Dict], openai_client, max_workers: i
     
     return results
 
-def merge_transcriptions(transcription_results: List[Dict]) -> str:
-    """Merge transcription results with basic overlap handling."""
+class TranscriptionBackend:
+    """
+    Speech-to-text for the chunk pipeline. prepare_chunk() turns a planned window into what
+    transcribe_chunk() takes, on an encode thread; transcribe_chunk() returns a chunk result
+    (success False rather than raising); release_chunk() frees what prepare_chunk() held.
+    """
+    name = None
+    
+    def create_limiter(self) -> AdaptiveConcurrencyLimiter:
+        raise NotImplementedError
+    
+    def prepare_chunk(self, input_path: str, window: Dict, workspace: TempWorkspace = None) -> Dict:
+        raise NotImplementedError
+    
+    def transcribe_chunk(self, chunk_info: Dict, chunk_number: int, total_chunks: int,
+                         limiter: AdaptiveConcurrencyLimiter = None, cache: TranscriptCache = None) -> Dict:
+        raise NotImplementedError
+    
+    def release_chunk(self, chunk_info: Dict, workspace: TempWorkspace = None):
+        pass
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """Hosted whisper-1: chunks are encoded to small speech files and uploaded, with retries and the adaptive limit."""
+    name = 'openai'
+    
+    def __init__(self, openai_client):
+        self.openai_client = openai_client
+    
+    def create_limiter(self) -> AdaptiveConcurrencyLimiter:
+        return get_whisper_limiter()
+    
+    def prepare_chunk(self, input_path: str, window: Dict, workspace: TempWorkspace = None) -> Dict:
+        return encode_chunk(input_path, window, workspace)
+    
+    def transcribe_chunk(self, chunk_info: Dict, chunk_number: int, total_chunks: int,
+                         limiter: AdaptiveConcurrencyLimiter = None, cache: TranscriptCache = None) -> Dict:
+        return transcribe_chunk_cached(chunk_info, self.openai_client, chunk_number, total_chunks, limiter, cache)
+    
+    def release_chunk(self, chunk_info: Dict, workspace: TempWorkspace = None):
+        # Free the chunk file so the next encode can use the space
+        if workspace and not chunk_info.get('passthrough'):
+            workspace.release(chunk_info['path'])
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    A quantised Whisper model on this container's CPUs, via faster-whisper (CTranslate2). Chunks
+    are decoded straight to 16 kHz PCM in memory, so nothing is re-encoded, written or uploaded,
+    and the 25 MB limit does not apply. The model has one replica per worker, each on its own
+    share of the cores, and that many chunks are transcribed at once. The chunk transcript cache
+    holds whisper-1 output, so it is not used here.
+    """
+    name = 'local'
+    
+    def __init__(self, model, workers: int = LOCAL_WHISPER_WORKERS):
+        self.model = model
+        self.workers = workers
+        # Decoding runs ahead of the model; this bounds how much PCM waits in memory
+        self._decoded_slots = threading.BoundedSemaphore(workers * LOCAL_DECODED_CHUNKS_PER_WORKER)
+    
+    def create_limiter(self) -> AdaptiveConcurrencyLimiter:
+        # Fixed at the worker count; used for its metrics and to keep the replicas busy
+        return AdaptiveConcurrencyLimiter(self.workers, self.workers)
+    
+    def prepare_chunk(self, input_path: str, window: Dict, workspace: TempWorkspace = None) -> Dict:
+        self._decoded_slots.acquire()
+        try:
+            return decode_pcm_chunk(input_path, window)
+        except Exception:
+            self._decoded_slots.release()
+            raise
+    
+    def transcribe_chunk(self, chunk_info: Dict, chunk_number: int, total_chunks: int,
+                         limiter: AdaptiveConcurrencyLimiter = None, cache: TranscriptCache = None) -> Dict:
+        limiter = limiter or self.create_limiter()
+        limiter.acquire()
+        request_start = time.time()
+        try:
+            print(f"Transcribing chunk {chunk_number}/{total_chunks} locally")
+            segments, _ = self.model.transcribe(
+                chunk_info['pcm'],
+                beam_size=LOCAL_WHISPER_BEAM_SIZE,
+                language=LOCAL_WHISPER_LANGUAGE,
+                condition_on_previous_text=False
+            )
+            # segments is lazy; decoding happens while it is consumed
+            segments = [
+                {'start': float(segment.start), 'end': float(segment.end), 'text': (segment.text or '').strip()}
+                for segment in segments
+            ]
+        except Exception as e:
+            limiter.release('error', time.time() - request_start)
+            return build_chunk_error(chunk_info, chunk_number, e, 1)
+        
+        limiter.release('success', time.time() - request_start, chunk_info.get('duration_seconds', 0.0))
+        text = ' '.join(segment['text'] for segment in segments if segment['text'])
+        print(f"Chunk {chunk_number} completed locally in {time.time() - request_start:.1f}s: {len(text)} characters, {len(segments)} segments")
+        result = build_chunk_result(chunk_info, text, segments)
+        result['attempts'] = 1
+        return result
+    
+    def release_chunk(self, chunk_info: Dict, workspace: TempWorkspace = None):
+        if chunk_info.pop('pcm', None) is not None:
+            self._decoded_slots.release()
+
+def choose_transcription_backend(duration_seconds: float) -> str:
+    """
+    'local' or 'openai'. 'auto' runs a recording locally when its workers are expected to finish it
+    within TRANSCRIPTION_LATENCY_TARGET_SECONDS; longer or unprobed recordings go to the API.
+    """
+    if TRANSCRIPTION_BACKEND not in ('local', 'auto') or CHUNKING_MODE == 'pydub' or not os.path.exists(FFMPEG_PATH):
+        return 'openai'
+    if TRANSCRIPTION_BACKEND == 'local':
+        return 'local'
+    if not duration_seconds:
+        return 'openai'
+    estimated_seconds = duration_seconds / (LOCAL_WHISPER_SPEED * LOCAL_WHISPER_WORKERS)
+    print(f"Local transcription estimate: {estimated_seconds:.0f}s (target {TRANSCRIPTION_LATENCY_TARGET_SECONDS:.0f}s)")
+    return 'local' if estimated_seconds <= TRANSCRIPTION_LATENCY_TARGET_SECONDS else 'openai'
+
+def get_transcription_backend(name: str, openai_client) -> TranscriptionBackend:
+    """The named backend; the API when the local model cannot be loaded."""
+    if name == 'local':
+        try:
+            return LocalWhisperBackend(get_local_whisper_model())
+        except Exception as e:
+            print(f"[WARNING] Local transcription model unavailable, using the OpenAI API: {e}")
+    return OpenAIWhisperBackend(openai_client)
+
+def transcribe_and_release_chunk(chunk_info: Dict, openai_client, chunk_number: int, total_chunks: int,
+                                 limiter: AdaptiveConcurrencyLimiter = None, cache: TranscriptCache = None,
+                                 workspace: TempWorkspace = None, checkpoint: JobCheckpoint = None,
+                                 backend: TranscriptionBackend = None) -> Dict:
+    """Transcribe a chunk and checkpoint its result, then free what the chunk holds so the next one can be prepared."""
+    backend = backend or OpenAIWhisperBackend(openai_client)
+    try:
+        result = backend.transcribe_chunk(chunk_info, chunk_number, total_chunks, limiter, cache)
+        if checkpoint:
+            checkpoint.save_result(result)
+        return result
+    finally:
+        backend.release_chunk(chunk_info, workspace)
+
+def read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def request_chunk_transcription_async(chunk_info: Dict, audio_bytes: bytes, async_client) -> Dict:
+    """Send one chunk to Whisper from memory and return its text and chunk-relative segments. Raises on API errors."""
+    transcription = await async_client.audio.transcriptions.create(
+        model="whisper-1",
+        file=(os.path.basename(chunk_info['path']), audio_bytes),
+        response_format="verbose_json",
+        timestamp_granularities=["segment"]
+    )
+    return parse_transcription(transcription)
+
+async def transcribe_single_chunk_async(chunk_info: Dict, async_client, chunk_number: int, total_chunks: int,
+                                        limiter: AsyncConcurrencyLimiter) -> Dict:
+    """transcribe_single_chunk as a coroutine: same retries and limiter, no thread held while waiting."""
+    audio_bytes = None
+    last_error = None
+    
+    for attempt in range(1, WHISPER_MAX_ATTEMPTS + 1):
+        await limiter.acquire_async()
+        request_start = time.time()
+        try:
+            # Read once a slot is free, so only in-flight chunks are held in memory, and reuse for retries
+            if audio_bytes is None:
+                audio_bytes = await asyncio.to_thread(read_file_bytes, chunk_info['path'])
+            print(f"Transcribing chunk {chunk_number}/{total_chunks} (attempt {attempt})")
+            transcription = await request_chunk_transcription_async(chunk_info, audio_bytes, async_client)
+        except Exception as e:
+            last_error = e
+            status_code = get_error_status_code(e)
+            throttled = status_code in THROTTLE_STATUS_CODES or is_timeout_error(e)
+            limiter.release('throttled' if throttled else 'error', time.time() - request_start)
+            
+            if not is_retryable_error(e) or attempt == WHISPER_MAX_ATTEMPTS:
+                break
+            
+            retry_after = get_retry_after_seconds(e)
+            if retry_after is not None:
+                limiter.pause(retry_after)
+            delay = compute_backoff_seconds(attempt, retry_after)
+            print(f"Chunk {chunk_number} failed with {status_code or type(e).__name__}, retrying in {delay:.1f}s: {e}")
+            limiter.record_retry()
+            await asyncio.sleep(delay)
+            continue
+        
+        limiter.release('success', time.time() - request_start, chunk_info.get('duration_seconds', 0.0))
+        print(f"Chunk {chunk_number} completed: {len(transcription['text'])} characters, {len(transcription['segments'])} segments")
+        
+        result = build_chunk_result(chunk_info, transcription['text'], transcription['segments'])
+        result['attempts'] = attempt
+        return result
+    
+    return build_chunk_error(chunk_info, chunk_number, last_error, attempt)
+
+async def transcribe_and_release_chunk_async(chunk_info: Dict, async_client, chunk_number: int, total_chunks: int,
+                                             limiter: AsyncConcurrencyLimiter, cache: TranscriptCache = None,
+                                             workspace: TempWorkspace = None, checkpoint: JobCheckpoint = None) -> Dict:
+    """transcribe_and_release_chunk as a coroutine. Hashing, cache and checkpoint I/O run on threads."""
+    try:
+        chunk_hash = None
+        if cache is not None:
+            chunk_hash, cached_result = await asyncio.to_thread(lookup_cached_chunk, chunk_info, chunk_number, total_chunks, cache)
+            if cached_result is not None:
+                if checkpoint:
+                    await asyncio.to_thread(checkpoint.save_result, cached_result)
+                return cached_result
+        
+        result = await transcribe_single_chunk_async(chunk_info, async_client, chunk_number, total_chunks, limiter)
+        if cache is not None and result['success']:
+            await asyncio.to_thread(cache.put, chunk_hash, 'chunk', {'text': result['text'], 'segments': result['segments']})
+        if checkpoint:
+            await asyncio.to_thread(checkpoint.save_result, result)
+        return result
+    finally:
+        if workspace and not chunk_info.get('passthrough'):
+            workspace.release(chunk_info['path'])
+
+async def transcribe_chunks_async(chunks: List[Dict], async_client, limiter: AsyncConcurrencyLimiter,
+                                  cache: TranscriptCache = None) -> List[Dict]:
+    """transcribe_chunks_parallel as a coroutine: every chunk is a task, the limiter bounds requests in flight."""
+    print(f"Starting async transcription with {int(limiter.limit)} requests in flight (up to {limiter.max_limit})")
+    outcomes = await asyncio.gather(*[
+        transcribe_and_release_chunk_async(chunk, async_client, i + 1, len(chunks), limiter, cache)
+        for i, chunk in enumerate(chunks)
+    ], return_exceptions=True)
+    
+    results = []
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"Chunk transcription failed: {outcome}")
+            outcome = build_chunk_error(chunk, chunk['index'] + 1, outcome, 0)
+        results.append(outcome)
+    
+    results.sort(key=lambda x: x['index'])
+    successful = sum(1 for r in results if r['success'])
+    print(f"Async transcription completed: {successful}/{len(chunks)} chunks successful")
+    return results
+
+def transcribe_audio_pipelined(input_path: str, openai_client, chunk_duration_minutes: int = 8, overlap_seconds: int = 30,
+                               max_workers: int = 5, encode_workers: int = 2,
+                               limiter: AdaptiveConcurrencyLimiter = None, total_duration_seconds: float = None,
+                               timings: Dict = None, cache: TranscriptCache = None,
+                               workspace: TempWorkspace = None, checkpoint: JobCheckpoint = None,
+                               backend: TranscriptionBackend = None) -> Tuple[List[Dict], List[Dict]]:
+    """Encode chunks and transcribe them as a producer/consumer pipeline.
+    
+    Encoding runs on a pool of ffmpeg processes (one per encode worker thread) and each chunk is
+    handed to Whisper as soon as its file is written, so total time is bounded by the slower stage
+    rather than the sum of both. With a workspace, each chunk file is deleted as soon as it has
+    been transcribed, and encoding waits for space whenever the disk budget is used up. With a
+    checkpoint, the plan and every finished chunk are saved as they complete, and chunks an earlier
+    attempt already transcribed are neither encoded nor sent again. backend defaults to the OpenAI
+    API; the pydub and single-file fallbacks always use the API. Returns the chunks and their
+    transcription results; stage timings are written into timings when it is given.
+    """
+    limiter = limiter or create_whisper_limiter(max_workers, WHISPER_MAX_CONCURRENCY)
+    timings = timings if timings is not None else {}
+    ffmpeg_available = os.path.exists(FFMPEG_PATH)
+    ffprobe_available = os.path.exists(FFPROBE_PATH)
+    
+    if CHUNKING_MODE == 'pydub' or not (ffmpeg_available and ffprobe_available):
+        chunks = create_audio_chunks_with_overlap(input_path, chunk_duration_minutes, overlap_seconds, workspace)
+        return chunks, transcribe_chunks_parallel(chunks, openai_client, max_workers, limiter, cache)
+    
+    pipeline_start = time.time()
+    if checkpoint and checkpoint.windows:
+        # Cut exactly the windows the saved chunk results belong to
+        windows = [dict(window) for window in checkpoint.windows]
+        if len(windows) == 1 and can_pass_through(input_path):
+            windows[0]['passthrough'] = True
+    else:
+        try:
+            windows = plan_whisper_chunks(input_path, chunk_duration_minutes, overlap_seconds, total_duration_seconds)
+        except ChunkLimitError:
+            raise
+        except Exception as probe_error:
+            print(f"Failed to probe audio duration: {probe_error}")
+            chunks = create_single_chunk_fallback(input_path)
+            return chunks, transcribe_chunks_parallel(chunks, openai_client, max_workers, limiter, cache)
+        if checkpoint:
+            checkpoint.start(windows)
+    
+    total_chunks = len(windows)
+    timings['plan_seconds'] = round(time.time() - pipeline_start, 3)
+    
+    chunks, results = checkpoint.resumed_chunks_and_results() if checkpoint else ([], [])
+    windows = [window for window in windows if window['index'] not in (checkpoint.results if checkpoint else {})]
+    if chunks:
+        timings['resumed_chunks'] = len(chunks)
+        print(f"Resuming from checkpoint: {len(chunks)} chunks already transcribed, {len(windows)} to go")
+    
+    print(f"Starting pipelined transcription: {total_chunks} chunks, {encode_workers} encode workers, "
+          f"{int(limiter.limit)}-{limiter.max_limit} concurrent requests on the {TRANSCRIPTION_ENGINE} engine")
+    new_chunks, new_results = run_chunk_pipeline(
+        input_path, windows, total_chunks, openai_client, encode_workers, limiter, timings, pipeline_start,
+        cache, workspace, checkpoint, backend
+    )
+    chunks.extend(new_chunks)
+    results.extend(new_results)
+    
+    if not chunks:
+        print("No chunks were created, falling back to single file processing")
+        chunks = create_single_chunk_fallback(input_path)
+        return chunks, transcribe_chunks_parallel(chunks, openai_client, max_workers, limiter, cache)
+    
+    chunks.sort(key=lambda x: x['index'])
+    results.sort(key=lambda x: x['index'])
+    timings['encode_seconds_total'] = round(sum(c.get('encode_seconds', 0.0) for c in chunks), 3)
+    timings['pipeline_seconds'] = round(time.time() - pipeline_start, 3)
+    successful = sum(1 for r in results if r['success'])
+    print(f"Pipelined transcription completed in {time.time() - pipeline_start:.2f}s: {successful}/{total_chunks} chunks successful")
+    
+    return chunks, results
+
+def run_chunk_pipeline(input_path: str, windows: List[Dict], total_chunks: int, openai_client, encode_workers: int,
+                       limiter: AdaptiveConcurrencyLimiter, timings: Dict, pipeline_start: float,
+                       cache: TranscriptCache = None, workspace: TempWorkspace = None,
+                       checkpoint: JobCheckpoint = None, backend: TranscriptionBackend = None) -> Tuple[List[Dict], List[Dict]]:
+    """Prepare the given windows and hand each chunk to the backend as soon as it is ready.
+    
+    Preparing always runs on threads, since each chunk waits on an ffmpeg process. With the OpenAI
+    backend on the asyncio engine, each chunk then becomes a task on the container's event loop
+    instead of a thread.
+    """
+    chunks = []
+    results = []
+    backend = backend or OpenAIWhisperBackend(openai_client)
+    use_asyncio = TRANSCRIPTION_ENGINE == 'asyncio' and backend.name == 'openai'
+    if use_asyncio and not isinstance(limiter, AsyncConcurrencyLimiter):
+        raise ValueError("The asyncio engine needs an AsyncConcurrencyLimiter; use create_whisper_limiter")
+    async_client = get_async_openai_client() if use_asyncio else None
+    timings['transcription_engine'] = TRANSCRIPTION_ENGINE if backend.name == 'openai' else 'threads'
+    timings['transcription_backend'] = backend.name
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=encode_workers) as encode_executor, \
+            (contextlib.nullcontext() if use_asyncio else concurrent.futures.ThreadPoolExecutor(max_workers=limiter.max_limit)) as transcribe_executor:
+        future_to_window = {
+            encode_executor.submit(backend.prepare_chunk, input_path, window, workspace): window
+            for window in windows
+        }
+        transcribe_futures = []
+        
+        for encode_future in concurrent.futures.as_completed(future_to_window):
+            window = future_to_window[encode_future]
+            try:
+                chunk = encode_future.result()
+            except Exception as encode_error:
+                print(f"Failed to create chunk {window['index']}: {encode_error}")
+                results.append({
+                    'index': window['index'],
+                    'success': False,
+                    'text': f"[Error encoding chunk {window['index'] + 1}: {str(encode_error)}]",
+                    'start_seconds': window['start_seconds'],
+                    'end_seconds': window['end_seconds'],
+                    'error': str(encode_error)
+                })
+                continue
+            
+            if 'first_chunk_ready_seconds' not in timings:
+                timings['first_chunk_ready_seconds'] = round(time.time() - pipeline_start, 3)
+                print(f"First chunk ready after {timings['first_chunk_ready_seconds']:.2f}s")
+            chunks.append(chunk)
+            if use_asyncio:
+                transcribe_futures.append((chunk, run_async(
+                    transcribe_and_release_chunk_async(chunk, async_client, chunk['index'] + 1, total_chunks, limiter, cache, workspace, checkpoint)
+                )))
+            else:
+                transcribe_futures.append((chunk, transcribe_executor.submit(
+                    transcribe_and_release_chunk, chunk, openai_client, chunk['index'] + 1, total_chunks, limiter, cache, workspace, checkpoint, backend
+                )))
+        
+        timings['encode_wall_seconds'] = round(time.time() - pipeline_start, 3)
+        
+        # One chunk's unexpected error fails that chunk only; the checkpoint keeps the others for a retry
+        for chunk, transcribe_future in transcribe_futures:
+            try:
+                results.append(transcribe_future.result())
+            except Exception as e:
+                results.append(build_chunk_error(chunk, chunk['index'] + 1, e, 0))
+    
+    return chunks, results
+
+def normalize_alignment_word(word: str) -> str:
+    """Lowercase a word and strip punctuation for fuzzy alignment."""
+    return re.sub(r'[^\w]', '', word.lower())
+
+def count_overlapping_words(previous_words: List[str], current_words: List[str]) -> int:
+    """Count how many leading words of the current chunk repeat the tail of the previous one.
+    
+    Both inputs are bounded to ALIGNMENT_WINDOW_WORDS, so each boundary costs constant time.
+    """
+    tail = [normalize_alignment_word(w) for w in previous_words[-ALIGNMENT_WINDOW_WORDS:]]
+    head = [normalize_alignment_word(w) for w in current_words[:ALIGNMENT_WINDOW_WORDS]]
+    
+    matcher = difflib.SequenceMatcher(None, tail, head, autojunk=False)
+    match = matcher.find_longest_match(0, len(tail), 0, len(head))
+    
+    if match.size < MIN_ALIGNMENT_WORDS:
+        return 0
+    return match.b + match.size
+
+def merge_transcription_segments(transcription_results: List[Dict]) -> Dict:
+    """Merge chunk transcriptions into one transcript with absolute segment timestamps.
+    
+    Where chunks overlap, segments are split at the middle of the overlap by absolute time: the
+    previous chunk keeps segments centred before it and the next chunk those centred after it.
+    Chunks without timestamps fall back to fuzzy word alignment. Each segment is appended and
+    removed at most once, so the merge is linear in the number of segments.
+    """
     if not transcription_results:
-        return ""
+        return {'text': "", 'segments': []}
     
     transcription_results.sort(key=lambda x: x['start_seconds'])
-    merged_text = ""
+    merged = []
+    dropped_segments = 0
     
-    for i, result in enumerate(transcription_results):
+    for result in transcription_results:
+        offset = result['start_seconds']
+        
         if not result['success']:
-            merged_text += f"\n\n{result['text']}\n\n"
+            merged.append({'start': offset, 'end': result['end_seconds'], 'text': result['text'], 'chunk_index': result['index'], 'timed': False})
+            continue
+        
+        overlap = result.get('overlap_seconds', 0.0) or 0.0
+        previous_chunk = merged[-1]['chunk_index'] if merged else None
+        segments = [
+            {'start': offset + seg['start'], 'end': offset + seg['end'], 'text': seg['text'], 'chunk_index': result['index'], 'timed': True}
+            for seg in result.get('segments') or []
+            if seg['text']
+        ]
+        
+        if overlap > 0 and merged and segments and merged[-1]['timed']:
+            cut_seconds = offset + overlap / 2
+            while merged and merged[-1]['chunk_index'] == previous_chunk and merged[-1]['timed'] \
+                    and (merged[-1]['start'] + merged[-1]['end']) / 2 >= cut_seconds:
+                merged.pop()
+                dropped_segments += 1
+            kept = [seg for seg in segments if (seg['start'] + seg['end']) / 2 >= cut_seconds]
+            dropped_segments += len(segments) - len(kept)
+            merged.extend(kept)
+            continue
+        
+        if segments:
+            merged.extend(segments)
             continue
         
+        # No timestamps for this chunk: keep its text as one untimed segment
         current_text = result['text'].strip()
-        if i == 0:
-            merged_text = current_text
-        else:
-            # Simple merge - just add space between chunks
-            merged_text += " " + current_text
+        if overlap > 0 and merged:
+            previous_words = []
+            for previous in reversed(merged):
+                previous_words = previous['text'].split() + previous_words
+                if len(previous_words) >= ALIGNMENT_WINDOW_WORDS:
+                    break
+            current_words = current_text.split()
+            repeated = count_overlapping_words(previous_words, current_words)
+            if repeated:
+                print(f"Chunk {result['index']}: dropped {repeated} repeated words by text alignment")
+                current_text = " ".join(current_words[repeated:])
+        
+        if current_text:
+            merged.append({'start': offset, 'end': result['end_seconds'], 'text': current_text, 'chunk_index': result['index'], 'timed': False})
+    
+    if dropped_segments:
+        print(f"Dropped {dropped_segments} duplicated segments from chunk overlaps")
+    
+    merged_text = " ".join(seg['text'].strip() for seg in merged)
     
     # Clean up multiple spaces
     merged_text = re.sub(r'\s+', ' ', merged_text)
     
-    return merged_text.strip()
+    return {
+        'text': merged_text.strip(),
+        'segments': [
+            {'start': round(seg['start'], 2), 'end': round(seg['end'], 2), 'text': seg['text']}
+            for seg in merged
+            if seg['timed']
+        ]
+    }
 
-def cleanup_temp_files(file_paths: List[str]):
-    """Clean up temporary files."""
-    for file_path in file_paths:
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"Removed: {file_path}")
-        except Exception as e:
-            print(f"Warning: Could not remove {file_path}: {e}")
+def merge_transcriptions(transcription_results: List[Dict]) -> str:
+    """Merge transcription results into plain transcript text."""
+    return merge_transcription_segments(transcription_results)['text']
+
+def open_streaming_source(s3_bucket: str, s3_key: str) -> Tuple[str, float]:
+    """Presign the S3 object for ffmpeg to read over HTTP and probe its duration.
+    
+    ffmpeg fetches byte ranges as it seeks, so each chunk encode only pulls the part of the object
+    it needs. Raises if the URL cannot be probed, so the caller can fall back to downloading.
+    """
+    if not (os.path.exists(FFMPEG_PATH) and os.path.exists(FFPROBE_PATH)):
+        raise RuntimeError("Streaming input needs both ffmpeg and ffprobe")
+    
+    source_url = presign_source(s3_bucket, s3_key)
+    return source_url, get_audio_duration_seconds(source_url)
 
+def presign_source(s3_bucket: str, s3_key: str) -> str:
+    return get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={'Bucket': s3_bucket, 'Key': s3_key},
+        ExpiresIn=PRESIGNED_URL_EXPIRY_SECONDS
+    )
+
+def claim_video(supabase, video_id: str) -> Tuple[bool, str]:
+    """
+    Move the video to in_progress in one conditional update, so of several concurrent invocations
+    for the same video only one proceeds. Returns (claimed, current status).
+    """
+    claimable = ','.join(CLAIMABLE_STATUSES)
+    claimed = supabase.table('videos').update({'transcription_status': 'in_progress'}).eq('id', video_id).or_(
+        f"transcription_status.is.null,transcription_status.in.({claimable})"
+    ).execute()
+    if claimed.data:
+        return True, 'in_progress'
+    
+    # Lost the claim; only now read the status, for the response
+    existing_video = supabase.table('videos').select('transcription_status').eq('id', video_id).execute()
+    if not existing_video.data:
+        print(f"Warning: video {video_id} not found, processing without a claim")
+        return True, None
+    return False, existing_video.data[0]['transcription_status']
+
+def save_transcript_and_trigger_notes(supabase, video_id: str, user_id: str, note_format: str,
+                                      merged_transcript: Dict, tracer: JobTracer) -> bool:
+    """
+    Save the merged transcript to Supabase and start note generation for it. Returns whether note
+    generation was started; it then owns the video's status and sets 'completed' when the notes are done.
+    """
+    final_transcript = merged_transcript['text']
+    
+    # Save to Supabase
+    transcript_id = None
+    if supabase:
+        print("Saving transcript to Supabase...")
+        with tracer.span('save_transcript') as span:
+            transcript_data = {'content': final_transcript}
+            if STORE_TRANSCRIPT_SEGMENTS:
+                transcript_data['segments'] = merged_transcript['segments']
+            # One statement; needs the unique index on transcripts.video_id
+            saved_transcript = supabase.table('transcripts').upsert(
+                {'video_id': video_id, **transcript_data}, on_conflict='video_id'
+            ).execute()
+            if saved_transcript.data:
+                transcript_id = saved_transcript.data[0]['id']
+            else:
+                # Some clients return no rows from an upsert; the row exists either way
+                existing = supabase.table('transcripts').select('id').eq('video_id', video_id).execute()
+                transcript_id = existing.data[0]['id'] if existing.data else None
+            span.add_bytes(bytes_out=len(json.dumps(transcript_data)))
+        print("Transcript saved successfully")
+    
+    # Trigger note generation
+    note_generator_arn = os.environ.get("NOTE_GENERATOR_LAMBDA_ARN")
+    if note_generator_arn:
+        # Written before the invoke, so it cannot land after a status set by the note generator
+        update_video_status(video_id, 'generating_notes')
+        flush_writes()
+        print("Triggering note generation...")
+        with tracer.span('invoke_notes') as span:
+            # Pass a reference, not the text: async invoke payloads are capped at 256 KB
+            handoff = {
+                'videoId': video_id,
+                'userId': user_id,
+                'noteFormat': note_format,
+                'jobId': tracer.job_id
+            }
+            # Without a row id, note generation looks the transcript up by video id
+            if transcript_id:
+                handoff['transcriptId'] = transcript_id
+            note_payload = json.dumps(handoff)
+            get_lambda_client().invoke(
+                FunctionName=note_generator_arn,
+                InvocationType='Event',
+                Payload=note_payload
+            )
+            span.add_bytes(bytes_out=len(note_payload))
+        print("Note generation triggered")
+        return True
+    return False
+
+def estimate_job_seconds(payload: Dict) -> float:
+    """Media length of a queued job, from the message if the producer sent it, else from the object size."""
+    if payload.get('durationSeconds'):
+        return float(payload['durationSeconds'])
+    file_info = get_s3_client().head_object(Bucket=payload['bucketName'], Key=payload['s3Key'])
+    return file_info['ContentLength'] * 8 / (QUEUE_ASSUMED_BITRATE_KBPS * 1000)
+
+def requeue_message(record: Dict, delay_seconds: int):
+    """Send an SQS message's job to its queue again, to be received after delay_seconds."""
+    # arn:aws:sqs:<region>:<account>:<name> -> https://sqs.<region>.amazonaws.com/<account>/<name>
+    _, _, _, region, account, name = record['eventSourceARN'].split(':', 5)
+    get_sqs_client().send_message(
+        QueueUrl=f"https://sqs.{region}.amazonaws.com/{account}/{name}",
+        DelaySeconds=delay_seconds,
+        **requeue_message_fields(record)
+    )
+
+def single_job_limit_seconds() -> float:
+    """Longest recording MAX_CHUNKS windows always cover; overlaps and pause-aligned cuts make windows step back."""
+    step_back_seconds = SILENCE_SEARCH_SECONDS if CHUNK_BOUNDARY_MODE == 'silence' else CHUNK_OVERLAP_SECONDS
+    return MAX_CHUNKS * (CHUNK_DURATION_MINUTES * 60 - step_back_seconds) + step_back_seconds
+
+def choose_transcription_mode(duration_seconds: float) -> str:
+    """'distributed' when configured; 'auto' fans out long recordings and ones over the single-job chunk cap."""
+    if TRANSCRIPTION_MODE == 'distributed':
+        return 'distributed'
+    if TRANSCRIPTION_MODE == 'auto' and duration_seconds:
+        if duration_seconds >= DISTRIBUTED_MIN_DURATION_MINUTES * 60 or duration_seconds > single_job_limit_seconds():
+            return 'distributed'
+    return 'single'
+
+def build_shards(windows: List[Dict], chunks_per_worker: int) -> List[List[int]]:
+    """Contiguous runs of chunk indexes, one per worker, so each worker reads one range of the source."""
+    indexes = [window['index'] for window in windows]
+    return [indexes[i:i + chunks_per_worker] for i in range(0, len(indexes), chunks_per_worker)]
+
+def invoke_transcription_workers(payloads: List[Dict], context) -> List[Dict]:
+    """Start one worker per payload: async Lambda invocations, or threads in this process with the local executor."""
+    if DISTRIBUTED_EXECUTOR == 'local':
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(payloads), 32) or 1) as executor:
+            return list(executor.map(lambda payload: lambda_handler(payload, context), payloads))
+    
+    function_name = TRANSCRIPTION_WORKER_LAMBDA_ARN or getattr(context, 'invoked_function_arn', None)
+    if not function_name:
+        raise RuntimeError("No worker function configured; set TRANSCRIPTION_WORKER_LAMBDA_ARN")
+    for payload in payloads:
+        get_lambda_client().invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps(payload)
+        )
+    return []
+
+def start_distributed_transcription(payload: Dict, source_url: str, duration_seconds: float, checkpoint: JobCheckpoint,
+                                    media_cache_key: str, tracer: JobTracer, context) -> Dict:
+    """
+    Coordinator: plan the chunks, save the plan and give each worker a contiguous range of them.
+    Workers report through the checkpoint store and the last one to finish merges. A retried
+    coordinator reuses the saved plan and only dispatches shards that have not reported cleanly.
+    """
+    video_id = payload['videoId']
+    store = checkpoint.store
+    
+    with tracer.span('plan') as span:
+        resumed = bool(checkpoint.windows)
+        if resumed:
+            windows = checkpoint.windows
+            shards = checkpoint.shards or build_shards(windows, DISTRIBUTED_CHUNKS_PER_WORKER)
+            if not checkpoint.shards:
+                checkpoint.start(windows, shards)
+        else:
+            windows = plan_chunk_boundaries(
+                source_url, duration_seconds, CHUNK_DURATION_MINUTES * 60, CHUNK_OVERLAP_SECONDS, MAX_DISTRIBUTED_CHUNKS
+            )
+            shards = build_shards(windows, DISTRIBUTED_CHUNKS_PER_WORKER)
+            checkpoint.start(windows, shards)
+        span.set(chunks=len(windows), shards=len(shards), resumed=resumed)
+    
+    pending_shards = list(range(len(shards)))
+    if resumed:
+        pending_shards = []
+        for shard in range(len(shards)):
+            report = store.read(video_id, JobCheckpoint.shard_name(shard))
+            if report is None or report.get('failed'):
+                pending_shards.append(shard)
+        # Reports of shards that are run again, and a lock left by a merge that died, would block the merge
+        store.delete(video_id, ['merge-lock'] + [JobCheckpoint.shard_name(shard) for shard in pending_shards])
+        if not pending_shards:
+            print("Every shard has reported, only the merge is left")
+            finish_distributed_job(payload, checkpoint, media_cache_key, tracer)
+            tracer.finish('completed', chunks=len(windows))
+            return {'statusCode': 200, 'body': json.dumps({'message': 'Distributed transcription merged', 'videoId': video_id, 'jobId': tracer.job_id})}
+    
+    worker_payloads = [{
+        'mode': 'transcribe_shard',
+        'bucketName': payload['bucketName'],
+        's3Key': payload['s3Key'],
+        'videoId': video_id,
+        'userId': payload['userId'],
+        'noteFormat': payload.get('noteFormat', 'Markdown'),
+        'jobId': tracer.job_id,
+        'fingerprint': checkpoint.fingerprint,
+        'mediaCacheKey': media_cache_key,
+        'shard': shard
+    } for shard in pending_shards]
+    
+    print(f"Dispatching {len(worker_payloads)} of {len(shards)} shards ({len(windows)} chunks, {duration_seconds/60:.1f} min) to {DISTRIBUTED_EXECUTOR} workers")
+    with tracer.span('dispatch', workers=len(worker_payloads)):
+        worker_responses = invoke_transcription_workers(worker_payloads, context)
+    tracer.finish('dispatched', chunks=len(windows), workers=len(worker_payloads))
+    
+    return {
+        'statusCode': 202,
+        'body': json.dumps({
+            'message': 'Distributed transcription started',
+            'videoId': video_id,
+            'jobId': tracer.job_id,
+            'chunks': len(windows),
+            'workers': len(worker_payloads),
+            'stages': tracer.summary(),
+            'workerStatusCodes': [response.get('statusCode') for response in worker_responses]
+        })
+    }
+
+def transcribe_shard(payload: Dict, context) -> Dict:
+    """Worker: cut and transcribe one shard's windows straight from S3, report it, and merge if it finished last."""
+    video_id = payload['videoId']
+    shard = payload['shard']
+    store = get_job_checkpoint_store(payload['bucketName'])
+    if store is None:
+        return {'statusCode': 400, 'body': json.dumps('Distributed transcription needs a job checkpoint store')}
+    
+    owner = getattr(context, 'aws_request_id', None) or payload.get('jobId')
+    tracer = JobTracer('transcription_worker', payload.get('jobId'), VideoId=video_id, Shard=shard)
+    checkpoint = JobCheckpoint(store, video_id, payload['fingerprint'], owner)
+    checkpoint.load(shard=shard)
+    if not checkpoint.shards or shard >= len(checkpoint.shards):
+        # The job was finished or re-planned since this worker was dispatched
+        print(f"No plan for shard {shard} of video {video_id}, nothing to do")
+        tracer.finish('skipped')
+        return {'statusCode': 409, 'body': json.dumps('No matching transcription plan')}
+    
+    shard_windows = checkpoint.shard_windows(shard)
+    windows = [window for window in shard_windows if window['index'] not in checkpoint.results]
+    workspace = TempWorkspace(f"{video_id}_{shard}", WORKSPACE_DISK_BUDGET_MB, TMP_ROOT)
+    timings = {}
+    results = list(checkpoint.results.values())
+    try:
+        workspace.open()
+        limiter = get_whisper_limiter()
+        with tracer.span('transcribe', chunks=len(windows), resumed_chunks=len(results)):
+            # ffmpeg seeks over HTTP, so a worker only pulls the byte range its windows cover
+            source_url = presign_source(payload['bucketName'], payload['s3Key'])
+            _, shard_results = run_chunk_pipeline(
+                source_url, windows, len(checkpoint.windows), get_openai_client(), ENCODE_WORKERS, limiter,
+                timings, time.time(), get_transcript_cache(payload['bucketName']), workspace, checkpoint
+            )
+            results.extend(shard_results)
+        print(f"[METRICS] Whisper: {json.dumps(limiter.snapshot())}")
+    except Exception as e:
+        print(f"Shard {shard} of video {video_id} failed: {e}")
+    finally:
+        workspace.cleanup()
+    
+    # Chunks without a successful result are reported as failed, so the merge is never left waiting
+    succeeded = {result['index'] for result in results if result['success']}
+    failed = [window['index'] for window in shard_windows if window['index'] not in succeeded]
+    store.write(video_id, JobCheckpoint.shard_name(shard), {'failed': failed, 'finished_at': time.time()})
+    print(f"Shard {shard}: {len(succeeded)}/{len(shard_windows)} chunks transcribed")
+    
+    try:
+        merged = finish_distributed_job(payload, checkpoint, payload.get('mediaCacheKey'), tracer)
+    except Exception as e:
+        error_msg = f"Error merging distributed transcription: {e}"
+        print(error_msg)
+        update_video_status(video_id, 'failed', error_msg)
+        tracer.finish('failed', error=error_msg[:200])
+        return {'statusCode': 500, 'body': json.dumps(error_msg)}
+    
+    tracer.finish('completed', chunks=len(shard_windows), failed=len(failed), merged=merged)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'videoId': video_id, 'shard': shard, 'failedChunks': failed, 'merged': merged, 'timings': timings})
+    }
+
+def finish_distributed_job(payload: Dict, checkpoint: JobCheckpoint, media_cache_key: str, tracer: JobTracer) -> bool:
+    """
+    Merge, save and hand off the transcript once every shard has reported. Several workers can
+    see that at the same moment; the conditional merge lock lets exactly one of them through.
+    If any chunk failed the video is marked failed instead, and the checkpoint is kept so a retried
+    job only runs the shards that reported failures.
+    """
+    store = checkpoint.store
+    video_id = payload['videoId']
+    
+    # Later shards are dispatched last, so checking from the end usually stops at the first read
+    failed_chunks = []
+    for shard in reversed(range(len(checkpoint.shards))):
+        report = store.read(video_id, JobCheckpoint.shard_name(shard))
+        if report is None:
+            return False
+        failed_chunks.extend(report.get('failed') or [])
+    if not store.create(video_id, 'merge-lock', {'owner': checkpoint.owner, 'created_at': time.time()}):
+        return False
+    
+    if failed_chunks:
+        error_msg = f"{len(failed_chunks)} of {len(checkpoint.windows)} chunks could not be transcribed"
+        print(f"All {len(checkpoint.shards)} shards reported, not merging video {video_id}: {error_msg}")
+        update_video_status(video_id, 'failed', error_msg)
+        return False
+    
+    print(f"All {len(checkpoint.shards)} shards reported, merging video {video_id}")
+    checkpoint.load()
+    results = [checkpoint.results[index] for index in sorted(checkpoint.results)]
+    for window in checkpoint.windows:
+        if window['index'] not in checkpoint.results:
+            results.append({
+                'index': window['index'],
+                'success': False,
+                'text': f"[Error transcribing chunk {window['index'] + 1}]",
+                'start_seconds': window['start_seconds'],
+                'end_seconds': window['end_seconds'],
+                'error': 'No result reported'
+            })
+    
+    with tracer.span('merge') as span:
+        merged_transcript = merge_transcription_segments(results)
+        span.set(segments=len(merged_transcript['segments']), chunks=len(results))
+    print(f"Final transcript length: {len(merged_transcript['text'])} characters, {len(merged_transcript['segments'])} segments")
+    
+    # Workers always use the API
+    cache_media_transcript(get_transcript_cache(payload['bucketName']), media_cache_key, results, merged_transcript)
+    
+    notes_triggered = save_transcript_and_trigger_notes(
+        get_supabase(), video_id, payload['userId'], payload.get('noteFormat', 'Markdown'),
+        merged_transcript, tracer
+    )
+    checkpoint.clear()
+    if not notes_triggered:
+        update_video_status(video_id, 'completed')
+    return True
+
+@flush_on_exit
 def lambda_handler(event, context):
     """Main Lambda handler."""
     print("Received event:", json.dumps(event))
     
     try:
+        # SQS batch from the transcription queue: run its jobs in priority order
+        records = event.get('Records') or []
+        if records and records[0].get('eventSource') == 'aws:sqs':
+            return process_queue_batch(
+                event, context, lambda job_payload: lambda_handler(job_payload, context),
+                estimate_job_seconds, requeue_message
+            )
+        
         # Test basic functionality
         if event.get('test') == 'basic_functionality':
+            # Answered from configuration and package metadata only, without importing the SDKs
             ffmpeg_available = os.path.exists(FFMPEG_PATH)
             ffprobe_available = os.path.exists(FFPROBE_PATH)
             return {
                 'statusCode': 200,
                 'body': json.dumps({
                     'message': 'Lambda function is working correctly',
-                    'supabase_configured': supabase is not None,
-                    'openai_available': True,
-                    'pydub_available': True,
+                    'supabase_configured': bool(os.environ.get("SUPABASE_URL") and os.environ.get("SUPABASE_KEY")),
+                    'openai_available': importlib.util.find_spec('openai') is not None,
+                    'pydub_available': importlib.util.find_spec('pydub') is not None,
                     'ffmpeg_available': ffmpeg_available,
                     'ffprobe_available': ffprobe_available,
                     'ffmpeg_path': FFMPEG_PATH if ffmpeg_available else 'Not found',
                     'ffprobe_path': FFPROBE_PATH if ffprobe_available else 'Not found',
-                    'boto3_version': boto3.__version__,
-                    'using_builtin_aws_sdk': True
+                    'boto3_version': get_package_version('boto3'),
+                    'using_builtin_aws_sdk': True,
+                    'module_import_ms': MODULE_IMPORT_MS,
+                    'init_timings_ms': INIT_TIMINGS
+                })
+            }
+        
+        # Report what a cold start would pay for each heavy dependency
+        if event.get('test') == 'import_profile':
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'module_import_ms': MODULE_IMPORT_MS,
+                    'init_timings_ms': INIT_TIMINGS,
+                    'heavy_imports': profile_heavy_imports()
                 })
             }
         
@@ -519,113 +2691,239 @@ def lambda_handler(event, context):
             video_id = payload['videoId']
             user_id = payload['userId']
             note_format = payload.get('noteFormat', 'Markdown')
+            job_id = payload.get('jobId') or new_job_id()
         except (KeyError, json.JSONDecodeError) as e:
             error_msg = f"Missing required parameters: {e}"
             return {'statusCode': 400, 'body': json.dumps(error_msg)}
         
-        # Check for duplicate processing
+        # Workers of a distributed job run under the coordinator's claim
+        if payload.get('mode') == 'transcribe_shard':
+            return transcribe_shard(payload, context)
+        
+        supabase = get_supabase()
+        checkpoint_store = get_job_checkpoint_store(s3_bucket)
+        lease_owner = getattr(context, 'aws_request_id', None) or job_id
+        
+        # Claim the job; duplicate invocations for the same video stop here, unless they are a
+        # retry of the invocation that holds it or that invocation died mid-job
+        claimed = False
         if supabase:
             try:
-                existing_video = supabase.table('videos').select('transcription_status').eq('id', video_id).execute()
-                if existing_video.data and len(existing_video.data) > 0:
-                    current_status = existing_video.data[0]['transcription_status']
-                    if current_status in ['in_progress', 'completed']:
-                        return {
-                            'statusCode': 200,
-                            'body': json.dumps(f'Video already {current_status}')
-                        }
+                claimed, current_status = claim_video(supabase, video_id)
+                if not claimed and current_status == 'in_progress' and checkpoint_store \
+                        and can_take_over_job(checkpoint_store, video_id, lease_owner):
+                    print(f"Taking over in-progress job for video {video_id}")
+                    claimed = True
+                if not claimed:
+                    # 409 while another invocation holds the job, so a queued copy is retried later
+                    return {
+                        'statusCode': 409 if current_status == 'in_progress' else 200,
+                        'body': json.dumps(f'Video already {current_status}')
+                    }
             except Exception as e:
-                print(f"Warning: Could not check existing video status: {e}")
+                print(f"Warning: Could not claim video: {e}")
+        
+        if not claimed:
+            update_video_status(video_id, 'in_progress')
+        if checkpoint_store:
+            renew_job_lease(checkpoint_store, video_id, lease_owner)
         
-        update_video_status(video_id, 'in_progress')
+        # Per-stage spans are printed as EMF records tagged with the job id
+        tracer = JobTracer('transcription', job_id, VideoId=video_id)
         
         # Download and process file
-        local_audio_path = f"/tmp/{os.path.basename(s3_key)}"
-        temp_files = [local_audio_path]
+        workspace = TempWorkspace(video_id, WORKSPACE_DISK_BUDGET_MB, TMP_ROOT)
+        
+        timings = {}
+        job_start = time.time()
         
         try:
+            workspace.open()
+            local_audio_path = workspace.file_path(s3_key)
+            
             # Check file size
-            file_info = s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+            with tracer.span('s3_head'):
+                file_info = get_s3_client().head_object(Bucket=s3_bucket, Key=s3_key)
             file_size = file_info['ContentLength']
             file_size_mb = file_size / (1024 * 1024)
+            timings['head_seconds'] = round(time.time() - job_start, 3)
             
             print(f"File size: {file_size_mb:.2f} MB")
             
-            if file_size_mb > 400:
+            if file_size_mb > MAX_STREAMED_SIZE_MB:
                 error_msg = f"File too large ({file_size_mb:.2f} MB)"
                 update_video_status(video_id, 'failed', error_msg)
+                tracer.finish('rejected', error=error_msg)
                 return {'statusCode': 413, 'body': json.dumps(error_msg)}
             
-            # Download file
-            print("Downloading file from S3...")
-            s3_client.download_file(s3_bucket, s3_key, local_audio_path)
-            print(f"Downloaded to: {local_audio_path}")
-            
-            # Initialize OpenAI
-            openai_client = openai.OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-            
-            # Compress if needed
-            processing_file = local_audio_path
-            if file_size > OPENAI_MAX_FILE_SIZE:
-                print("File exceeds OpenAI limit, compressing...")
-                compressed_path = compress_with_ffmpeg_direct(local_audio_path)
-                temp_files.append(compressed_path)
-                processing_file = compressed_path
-            
-            # Create chunks
-            print("Creating audio chunks...")
-            chunks = create_audio_chunks_with_overlap(processing_file, CHUNK_DURATION_MINUTES, CHUNK_OVERLAP_SECONDS)
-            for chunk in chunks:
-                temp_files.append(chunk['path'])
-            
-            # Parallel transcription
-            print("Starting parallel transcription...")
-            transcription_results = transcribe_chunks_parallel(chunks, openai_client, MAX_PARALLEL_WORKERS)
-            
-            # Merge results
-            print("Merging transcription results...")
-            final_transcript = merge_transcriptions(transcription_results)
-            
-            print(f"Final transcript length: {len(final_transcript)} characters")
-            
-            # Save to Supabase
-            if supabase:
-                print("Saving transcript to Supabase...")
-                existing_transcript = supabase.table('transcripts').select('id').eq('video_id', video_id).execute()
-                if existing_transcript.data:
-                    supabase.table('transcripts').update({'content': final_transcript}).eq('video_id', video_id).execute()
+            # Reuse the transcript of byte-identical media uploaded before
+            transcript_cache = get_transcript_cache(s3_bucket)
+            media_cache_key = None
+            merged_transcript = None
+            chunks = []
+            transcription_results = []
+            whisper_metrics = {}
+            if transcript_cache:
+                with tracer.span('cache_lookup') as span:
+                    try:
+                        media_cache_key = build_media_cache_key(s3_bucket, s3_key, file_info)
+                        merged_transcript = transcript_cache.get(media_cache_key, 'media')
+                    except Exception as cache_error:
+                        print(f"Warning: could not check transcript cache: {cache_error}")
+                    span.set(hit=merged_transcript is not None)
+            
+            checkpoint = None
+            # Settled once the length is known; without it a recording is expected to go where it would unprobed
+            backend_name = choose_transcription_backend(None)
+            if merged_transcript is not None:
+                print(f"Reusing cached transcript for identical media ({media_cache_key})")
+            else:
+                if checkpoint_store:
+                    with tracer.span('checkpoint_load') as span:
+                        checkpoint = JobCheckpoint(checkpoint_store, video_id, build_job_fingerprint(file_info, backend_name), lease_owner)
+                        checkpoint.load()
+                        span.set(resumed_chunks=len(checkpoint.results))
+                
+                if checkpoint and checkpoint.is_complete():
+                    # An earlier attempt transcribed everything; only the steps after it are left
+                    print("All chunks were transcribed by an earlier attempt, skipping download and transcription")
+                    chunks, transcription_results = checkpoint.resumed_chunks_and_results()
+                    timings['resumed_chunks'] = len(chunks)
                 else:
-                    supabase.table('transcripts').insert({'video_id': video_id, 'content': final_transcript}).execute()
-                print("Transcript saved successfully")
+                    # Stream the object into ffmpeg when possible so decoding overlaps the transfer
+                    source_path = None
+                    source_duration_seconds = None
+                    if S3_INPUT_MODE == 'url' and CHUNKING_MODE != 'pydub':
+                        probe_start = time.time()
+                        with tracer.span('open_stream') as span:
+                            try:
+                                source_path, source_duration_seconds = open_streaming_source(s3_bucket, s3_key)
+                                timings['input_mode'] = 'url'
+                                print("Streaming input from S3 via presigned URL")
+                            except Exception as stream_error:
+                                print(f"Streaming input unavailable, downloading instead: {stream_error}")
+                            span.set(streaming=source_path is not None)
+                        timings['source_probe_seconds'] = round(time.time() - probe_start, 3)
+                    
+                    # Long recordings are split across worker invocations instead of this one
+                    if choose_transcription_mode(source_duration_seconds) == 'distributed':
+                        if source_path is not None and checkpoint is not None:
+                            # Workers always use the API
+                            return start_distributed_transcription(
+                                payload, source_path, source_duration_seconds, checkpoint.for_backend(file_info, 'openai'),
+                                media_cache_key, tracer, context
+                            )
+                        print("Distributed transcription needs streaming input and a job checkpoint store, transcribing in this invocation")
+                    
+                    if source_path is None:
+                        if file_size_mb > MAX_DOWNLOAD_SIZE_MB or not workspace.fits(file_size):
+                            error_msg = f"File too large ({file_size_mb:.2f} MB)"
+                            update_video_status(video_id, 'failed', error_msg)
+                            tracer.finish('rejected', error=error_msg)
+                            return {'statusCode': 413, 'body': json.dumps(error_msg)}
+                        
+                        # Download file
+                        print("Downloading file from S3...")
+                        download_start = time.time()
+                        workspace.reserve(file_size)
+                        with tracer.span('download') as span:
+                            get_s3_client().download_file(s3_bucket, s3_key, local_audio_path)
+                            span.add_bytes(bytes_in=file_size)
+                        workspace.track(local_audio_path, file_size)
+                        timings['input_mode'] = 'download'
+                        timings['download_seconds'] = round(time.time() - download_start, 3)
+                        print(f"Downloaded to: {local_audio_path} in {timings['download_seconds']:.2f}s")
+                        source_path = local_audio_path
+                    
+                    # Pick the speech-to-text backend; 'auto' needs the length to estimate local time
+                    if TRANSCRIPTION_BACKEND == 'auto' and source_duration_seconds is None:
+                        try:
+                            source_duration_seconds = get_audio_duration_seconds(source_path)
+                        except Exception as probe_error:
+                            print(f"Could not probe duration to choose a backend: {probe_error}")
+                    openai_client = get_openai_client()
+                    backend = get_transcription_backend(choose_transcription_backend(source_duration_seconds), openai_client)
+                    whisper_limiter = backend.create_limiter()
+                    print(f"Transcribing with the {backend.name} backend")
+                    backend_name = backend.name
+                    if checkpoint:
+                        checkpoint = checkpoint.for_backend(file_info, backend_name)
+                    
+                    # The ffmpeg path cuts and encodes chunks straight from the original; only the
+                    # pydub path still needs the whole file compressed before it is decoded
+                    processing_file = source_path
+                    if CHUNKING_MODE == 'pydub' and file_size > OPENAI_MAX_FILE_SIZE:
+                        print("File exceeds OpenAI limit, compressing...")
+                        with tracer.span('compress'):
+                            processing_file = compress_with_ffmpeg_direct(local_audio_path)
+                    
+                    # Create chunks and transcribe each one as soon as it is encoded
+                    print("Creating audio chunks and starting transcription...")
+                    with tracer.span('transcribe', chunking_mode=CHUNKING_MODE, boundary_mode=CHUNK_BOUNDARY_MODE, backend=backend.name) as span:
+                        chunks, transcription_results = transcribe_audio_pipelined(
+                            processing_file, openai_client, CHUNK_DURATION_MINUTES, CHUNK_OVERLAP_SECONDS,
+                            MAX_PARALLEL_WORKERS, ENCODE_WORKERS, whisper_limiter, source_duration_seconds, timings, transcript_cache,
+                            workspace, checkpoint, backend
+                        )
+                        # A streamed source is read by ffmpeg during this stage
+                        span.add_bytes(bytes_in=file_size if timings.get('input_mode') == 'url' else 0)
+                        span.set(chunks=len(chunks))
+                    timings['workspace_peak_mb'] = round(workspace.peak_bytes / (1024 * 1024), 2)
+                    timings['transcription_ready_seconds'] = round(time.time() - job_start, 3)
+                    print(f"[TIMINGS] {json.dumps(timings)}")
+                    whisper_metrics = whisper_limiter.snapshot()
+                    print(f"[METRICS] Whisper: {json.dumps(whisper_metrics)}")
+                    # Encoding and Whisper overlap inside the pipeline, so they are reported from its totals
+                    tracer.record(
+                        'encode', timings.get('encode_wall_seconds', 0.0),
+                        encode_seconds_total=timings.get('encode_seconds_total'),
+                        first_chunk_ready_seconds=timings.get('first_chunk_ready_seconds')
+                    )
+                    tracer.record(
+                        'whisper', whisper_metrics.get('elapsed_seconds', 0.0),
+                        request_seconds=whisper_metrics.get('request_seconds'),
+                        audio_seconds=whisper_metrics.get('audio_seconds')
+                    )
+                # Merge results
+                print("Merging transcription results...")
+                with tracer.span('merge') as span:
+                    merged_transcript = merge_transcription_segments(transcription_results)
+                    span.set(segments=len(merged_transcript['segments']))
+                
+                print(f"Final transcript length: {len(merged_transcript['text'])} characters, {len(merged_transcript['segments'])} segments")
+                
+                cache_media_transcript(transcript_cache, media_cache_key, transcription_results, merged_transcript, backend_name)
+            
+            final_transcript = merged_transcript['text']
+            if transcript_cache:
+                print(f"[METRICS] Transcript cache: {json.dumps(transcript_cache.stats)}")
             
             # Cleanup
-            cleanup_temp_files(temp_files)
-            
-            # Trigger note generation
-            note_generator_arn = os.environ.get("NOTE_GENERATOR_LAMBDA_ARN")
-            if note_generator_arn:
-                print("Triggering note generation...")
-                lambda_client.invoke(
-                    FunctionName=note_generator_arn,
-                    InvocationType='Event',
-                    Payload=json.dumps({
-                        'videoId': video_id,
-                        'userId': user_id,
-                        'rawTranscript': final_transcript,
-                        'noteFormat': note_format
-                    })
-                )
-                print("Note generation triggered")
-            
-            update_video_status(video_id, 'completed')
+            workspace.cleanup()
+            
+            notes_triggered = save_transcript_and_trigger_notes(supabase, video_id, user_id, note_format, merged_transcript, tracer)
+            
+            # The transcript is stored now, so its chunk progress is no longer needed
+            if checkpoint:
+                checkpoint.clear()
+            
+            if not notes_triggered:
+                update_video_status(video_id, 'completed')
+            tracer.finish('completed', chunks=len(chunks), file_size=file_size)
             
             return {
                 'statusCode': 200,
                 'body': json.dumps({
                     'message': 'Transcription completed successfully',
                     'videoId': video_id,
+                    'jobId': tracer.job_id,
+                    'stages': tracer.summary(),
                     'transcriptionLength': len(final_transcript),
                     'chunksProcessed': len(chunks),
+                    'segmentCount': len(merged_transcript['segments']),
+                    'whisperMetrics': whisper_metrics,
+                    'timings': timings,
+                    'cacheStats': transcript_cache.stats if transcript_cache else None,
                     'successfulChunks': sum(1 for r in transcription_results if r['success'])
                 })
             }
@@ -634,10 +2932,16 @@ def lambda_handler(event, context):
             error_msg = f"Error processing transcription: {e}"
             print(error_msg)
             update_video_status(video_id, 'failed', error_msg)
-            cleanup_temp_files(temp_files)
+            tracer.finish('failed', error=error_msg[:200])
             return {'statusCode': 500, 'body': json.dumps(error_msg)}
+        
+        finally:
+            workspace.cleanup()
             
     except Exception as e:
         error_msg = f"Unexpected error: {e}"
         print(error_msg)
         return {'statusCode': 500, 'body': json.dumps(error_msg)}
+
+MODULE_IMPORT_MS = round((time.perf_counter() - _module_import_start) * 1000, 1)
+print(f"[INIT] Module imported in {MODULE_IMPORT_MS} ms")
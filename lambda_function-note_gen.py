@@ -1,186 +1,107 @@
 import json
 import os
-import boto3
-from supabase import create_client, Client
-from google import genai  # Using Google Generative AI library
-
-# Initialize Supabase client
-# Ensure SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are set as environment variables in Lambda
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
-
-# Initialize Gemini client
-# Ensure GEMINI_API_KEY environment variable is set in Lambda configuration
-gemini_api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=gemini_api_key)
-
-def update_video_status(video_id: str, status: str, error_message: str = None):
-    """Helper function to update video transcription status in Supabase."""
-    print(f"Attempting to update video {video_id} status to: {status}")
-    update_data = {'transcription_status': status}
-    if error_message:
-        update_data['error_message'] = error_message # Assuming an error_message column exists
-
-    try:
-        # Use the service role key for this update
-        response = supabase.table('videos').update(update_data).eq('id', video_id).execute()
-        if response.data is None or (isinstance(response.data, list) and len(response.data) == 0):
-             print(f"Warning: Update video status for {video_id} to {status} might not have been successful. Response data is empty.")
-        else:
-            print(f"Video {video_id} status updated to {status} successfully.")
-    except Exception as e:
-        print(f"An unexpected error occurred while updating video status for {video_id} to {status}: {e}")
-
-
-def add_spaces_around_math(content: str) -> str:
-    """
-    Add spaces around inline math delimiters to ensure proper rendering.
-    """
-    import re
-    
-    # First, protect display math blocks ($$...$$) from spacing changes
-    display_math_blocks = []
-    display_math_pattern = r'\$\$[\s\S]*?\$\$'
-    
-    def preserve_display_math(match):
-        display_math_blocks.append(match.group())
-        return f"__DISPLAY_MATH_PLACEHOLDER_{len(display_math_blocks) - 1}__"
-    
-    # Replace display math with placeholders
-    processed_content = re.sub(display_math_pattern, preserve_display_math, content)
-    
-    # Add space before $ if it's preceded by a non-whitespace character that's not another $
-    # This handles cases like "text$math$" -> "text $math$"
-    processed_content = re.sub(r'(?<![\s$])\$', r' $', processed_content)
-    
-    # Add space after $ if it's followed by a non-whitespace character that's not another $
-    # This handles cases like "$math$text" -> "$math$ text"
-    processed_content = re.sub(r'\$(?![\s$])', r'$ ', processed_content)
-    
-    # Restore display math blocks
-    for i, block in enumerate(display_math_blocks):
-        placeholder = f"__DISPLAY_MATH_PLACEHOLDER_{i}__"
-        processed_content = processed_content.replace(placeholder, block)
-    
-    # Clean up any double spaces that might have been created
-    processed_content = re.sub(r'  +', ' ', processed_content)
-    
-    return processed_content
-
-
-def post_process_latex_content(content: str) -> str:
-    """
-    Post-process LaTeX content to fix common formatting issues and ensure KaTeX compatibility.
-    """
-    import re
-    
-    # First, add proper spacing around inline math delimiters
-    processed_content = add_spaces_around_math(content)
-    
-    # Fix missing backslashes before common LaTeX functions
-    common_math_functions = [
-        'frac', 'sqrt', 'sin', 'cos', 'tan', 'log', 'ln', 'exp', 'sum', 'prod', 'int',
-        'lim', 'alpha', 'beta', 'gamma', 'delta', 'pi', 'theta', 'sigma', 'omega',
-        'infty', 'partial', 'nabla', 'cdot', 'times', 'pm', 'leq', 'geq', 'neq'
-    ]
-    
-    # Fix missing backslashes in math expressions
-    for func in common_math_functions:
-        # Pattern: $ followed by function name without backslash
-        pattern = rf'(\$\$?[^$]*?)([^\\]|^)({func})([^a-zA-Z])'
-        replacement = rf'\1\2\\{func}\4'
-        processed_content = re.sub(pattern, replacement, processed_content)
-    
-    # Fix common LaTeX math delimiter issues
-    
-    # Replace \[ ... \] with $$ ... $$
-    processed_content = re.sub(r'\\?\\\[([^\\]*?)\\?\\\]', r'$$\1$$', processed_content)
-    
-    # Replace \( ... \) with $ ... $
-    processed_content = re.sub(r'\\?\\\(([^\\]*?)\\?\\\)', r'$\1$', processed_content)
-    
-    # Fix equation environments - replace with display math
-    processed_content = re.sub(r'\\begin\{equation\*?\}(.*?)\\end\{equation\*?\}', r'$$\1$$', processed_content, flags=re.DOTALL)
-    
-    # Fix align environments - replace with display math
-    processed_content = re.sub(r'\\begin\{align\*?\}(.*?)\\end\{align\*?\}', r'$$\1$$', processed_content, flags=re.DOTALL)
-    
-    # Clean up extra backslashes in math mode
-    processed_content = re.sub(r'\$\$\s*\\\s*', r'$$', processed_content)
-    processed_content = re.sub(r'\s*\\\s*\$\$', r'$$', processed_content)
-    processed_content = re.sub(r'\$\s*\\\s*', r'$', processed_content)
-    processed_content = re.sub(r'\s*\\\s*\$', r'$', processed_content)
-    
-    # Fix common spacing issues in math
-    processed_content = re.sub(r'\$\s+', r'$', processed_content)
-    processed_content = re.sub(r'\s+\$', r'$', processed_content)
-    processed_content = re.sub(r'\$\$\s+', r'$$', processed_content)
-    processed_content = re.sub(r'\s+\$\$', r'$$', processed_content)
-    
-    # Fix integration by parts notation specifically
-    # Replace \[ u \, dv = uv - v \, du \] with proper display math
-    processed_content = re.sub(r'\\?\\\[\s*([^\\]*?)\s*\\?\\\]', r'$$\1$$', processed_content)
-    
-    # Ensure proper spacing in mathematical expressions
-    processed_content = re.sub(r'(\$\$[^$]*?)\s*\\\s*([^$]*?\$\$)', r'\1 \2', processed_content)
-    
-    # Fix any remaining document-level commands that shouldn't be there
-    processed_content = re.sub(r'\\documentclass.*?\n', '', processed_content)
-    processed_content = re.sub(r'\\begin\{document\}', '', processed_content)
-    processed_content = re.sub(r'\\end\{document\}', '', processed_content)
-    processed_content = re.sub(r'\\usepackage.*?\n', '', processed_content)
-    
-    # Clean up multiple newlines
-    processed_content = re.sub(r'\n\s*\n\s*\n+', '\n\n', processed_content)
-    
-    return processed_content.strip()
-
-
-def lambda_handler(event, context):
-    print("Received note generation event:", json.dumps(event))
-
-    video_id = None # Initialize video_id to None
-    transcript_id = None # Initialize transcript_id to None
-    try:
-        # Extract data from the event payload sent by the transcription Lambda
-        payload = event # Assuming the event is the payload JSON
-        video_id = payload.get('videoId')
-        user_id = payload.get('userId')
-        note_format = payload.get('noteFormat', 'Markdown') # Get note format, default to markdown
-        # raw_transcript is no longer expected directly, we fetch it
-        on_screen_text_data = payload.get('onScreenTextData') # Expect on-screen text data
-
-        if not video_id or not user_id:
-            print("Missing videoId or userId in payload.")
-            # No video_id to update status if missing
-            return {
-                'statusCode': 400,
-                'body': json.dumps('Missing videoId or userId')
-            }
-
-        print(f"Generating notes for video ID: {video_id} for user: {user_id} in format: {note_format}")
-
-        # 1. Fetch the transcript text and transcript_id using the video_id
-        # Assuming a one-to-one relationship between videos and transcripts
-        # Use maybe_single() here as well, in case a video has no transcript (though less likely)
-        transcript_response = supabase.table('transcripts').select('id, content').eq('video_id', video_id).maybe_single().execute()
+import re
+import math
+import time
+import threading
+import importlib.util
+import concurrent.futures
+from collections import Counter
+from typing import List, Dict, Tuple
+
+from lambda_tracing import JobTracer
+from lambda_persistence import queue_video_status, flush_on_exit, get_writer
+from lambda_queue import concurrency_share
+
+# Supabase and Gemini SDKs are imported on first use so cold starts and health checks stay cheap.
+# The clients are cached at module level and reused by later invocations in the same container;
+# section threads can ask for one at the same moment, so each is built under a lock.
+INIT_TIMINGS = {}
+_clients = {}
+_clients_lock = threading.RLock()
+
+def get_cached_client(name: str, factory):
+    """Build a client once per container, on first use, and reuse it in later invocations."""
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                init_start = time.perf_counter()
+                _clients[name] = factory()
+                INIT_TIMINGS[name] = round((time.perf_counter() - init_start) * 1000, 1)
+                print(f"[INIT] {name} ready in {INIT_TIMINGS[name]} ms")
+    return _clients[name]
+
+def create_supabase_client():
+    from supabase import create_client
+    # Ensure SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are set as environment variables in Lambda
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    return create_client(url, key)
+
+def create_gemini_client():
+    from google import genai  # Using Google Generative AI library
+    # Ensure GEMINI_API_KEY environment variable is set in Lambda configuration
+    gemini_api_key = os.environ.get("GEMINI_API_KEY")
+    return genai.Client(api_key=gemini_api_key)
+
+def get_supabase():
+    return get_cached_client('supabase', create_supabase_client)
+
+def get_gemini_client():
+    return get_cached_client('gemini', create_gemini_client)
+
+# --- Note generation configuration ---
+GEMINI_MODEL = "gemini-2.5-flash-preview-05-20"
+MAX_OUTPUT_TOKENS = 8192  # Sufficient for detailed academic notes
+# 'auto' switches to map-reduce for transcripts longer than MAP_REDUCE_THRESHOLD_CHARS,
+# 'single' always sends the whole transcript in one call, 'map_reduce' always splits
+NOTE_GENERATION_MODE = os.environ.get("NOTE_GENERATION_MODE", "auto").lower()
+MAP_REDUCE_THRESHOLD_CHARS = int(os.environ.get("MAP_REDUCE_THRESHOLD_CHARS", "40000"))
+# Section sizes aim well under what one 8192-token response can cover in detailed notes
+SECTION_TARGET_CHARS = int(os.environ.get("SECTION_TARGET_CHARS", "16000"))
+SECTION_MIN_CHARS = SECTION_TARGET_CHARS // 2
+SECTION_MAX_CHARS = SECTION_TARGET_CHARS * 3 // 2
+SECTION_WORKERS = int(os.environ.get("SECTION_WORKERS", "6"))
+# Fleet-wide Gemini budget shared by every container of this function, and how many there can be
+GEMINI_CONCURRENCY_BUDGET = int(os.environ.get("GEMINI_CONCURRENCY_BUDGET", "0"))
+NOTE_GEN_MAX_CONTAINERS = int(os.environ.get("NOTE_GEN_MAX_CONTAINERS", "10"))
+GEMINI_MAX_CONCURRENCY = concurrency_share(GEMINI_CONCURRENCY_BUDGET, NOTE_GEN_MAX_CONTAINERS, SECTION_WORKERS)
+SECTION_MAX_ATTEMPTS = 2
+SECTION_CONTEXT_CHARS = 300  # Tail of the previous section shown to the model for continuity
+COHESION_BLOCK_WORDS = 120  # Words per block when scoring topic shifts
+COHESION_WINDOW_BLOCKS = 3  # Blocks compared on each side of a candidate boundary
+STITCH_MAX_OUTPUT_TOKENS = 2048
+STITCH_OUTLINE_LINES = 4  # Lines kept after each heading in the outline sent to the stitch pass
+# Stream Gemini output and checkpoint finished Markdown blocks to the notes row while generating
+STREAM_NOTES = os.environ.get("STREAM_NOTES", "true").lower() == "true"
+NOTE_CHECKPOINT_INTERVAL_SECONDS = float(os.environ.get("NOTE_CHECKPOINT_INTERVAL_SECONDS", "3"))
+
+COHESION_STOPWORDS = frozenset("""
+a about after again all also an and any are as at be because been before being between both but by can
+could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just know let like me more most my no nor not now of off on once
+only or other our out over own really right same say see she should so some something such than that
+the their them then there these they thing things this those through to too under until up us very was
+way we well were what when where which while who why will with would yeah you your okay going get got
+gonna one two want kind actually
+""".split())
+
+# --- Prompts ---
+# Prompt templates are filled with str.format, so literal braces in the LaTeX examples are doubled.
+SYSTEM_INSTRUCTIONS = """
+        You are a helpful assistant that generates structured academic notes in Markdown format with embedded LaTeX math expressions. 
+        
+        CRITICAL REQUIREMENTS: 
+        1) MUST use proper math delimiters: single $ for inline math and double $$ for display math. 
+        2) EVERY LaTeX function MUST start with a backslash (\\): use \\frac not frac, \\sin not sin, \\sum not sum, \\alpha not alpha. 
+        3) ALWAYS add spaces around inline math: write 'as $x$ approaches $c$' NOT 'as$x$approaches$c$'. 
+        4) Never use \\[...\\] or \\(...\\) or \\begin{{equation}}. 
+        5) Always use KaTeX-compatible LaTeX syntax within Markdown structure. 
 
-        if transcript_response.data:
-            transcript_id = transcript_response.data['id']
-            raw_transcript = transcript_response.data['content']
-            print(f"Fetched transcript for video {video_id}, transcript ID: {transcript_id}")
-        else:
-            print(f"No transcript found for video ID: {video_id}")
-            update_video_status(video_id, 'note_generation_failed', f'No transcript found for video ID: {video_id}')
-            return {
-                'statusCode': 404,
-                'body': json.dumps(f'No transcript found for video ID: {video_id}')
-            }
+        REMEMBER: Missing backslashes will break math rendering!
+        """
 
-        # --- Generate Notes in Unified Markdown + LaTeX Format ---
-        # Always generate Markdown content with embedded LaTeX math expressions
-        generation_prompt = f"""
+NOTE_PROMPT_INTRO = """
         AI AGENT INSTRUCTIONS: CONVERT TRANSCRIPT TO MARKDOWN CONVERTER WITH LATEX MATH
 
         You are a specialized AI agent responsible for converting the transcript found at the end of this message into well-structured Markdown notes. Your primary focus is creating clean, readable documentation with properly formatted mathematical expressions that render correctly in KaTeX.
@@ -193,7 +114,9 @@ def lambda_handler(event, context):
             3. Format mathematical expressions using proper LaTeX syntax
             4. Ensure KaTeX compatibility for all math expressions
 
-        MARKDOWN STRUCTURE GUIDELINES:
+"""
+
+NOTE_PROMPT_FORMATTING_RULES = """        MARKDOWN STRUCTURE GUIDELINES:
             - Use appropriate heading levels (`#`, `##`, `###`) to create logical document hierarchy
             - Employ bullet points and numbered lists for clarity
             - Add emphasis with **bold** and *italic* text where appropriate
@@ -225,7 +148,9 @@ def lambda_handler(event, context):
                 - `\\partial` for partial derivatives
                 - `\\nabla` for gradient operator
 
-        CONTENT ORGANIZATION:
+"""
+
+NOTE_PROMPT_ORGANIZATION = """        CONTENT ORGANIZATION:
             1. Title: Create a clear, descriptive title
             2. Overview/Summary: Brief introduction to the topic
             3. Main Sections: Organize content thematically with subheadings
@@ -272,7 +197,9 @@ def lambda_handler(event, context):
             Key takeaways and important formulas.
             ```
 
-        ERROR PREVENTION CHECKLIST
+"""
+
+NOTE_PROMPT_CHECKS = """        ERROR PREVENTION CHECKLIST
         Before finalizing output, verify:
             - All math expressions use proper LaTeX syntax
             - Display math blocks are properly separated with blank lines
@@ -290,87 +217,717 @@ def lambda_handler(event, context):
 
         Remember: Your output will be processed by KaTeX, so all LaTeX must be compatible with KaTeX's supported functions and syntax.
         
-        THE TRANSCRIPT IS:
+"""
+
+NOTE_PROMPT_TRANSCRIPT = """        THE TRANSCRIPT IS:
         
         {raw_transcript}
         """
 
-        print(f"Sending request to Gemini 2.5 Flash for unified Markdown+LaTeX content generation...")
-        
-        # Combine system message with user prompt for Gemini
-        system_instructions = """
-        You are a helpful assistant that generates structured academic notes in Markdown format with embedded LaTeX math expressions. 
-        
-        CRITICAL REQUIREMENTS: 
-        1) MUST use proper math delimiters: single $ for inline math and double $$ for display math. 
-        2) EVERY LaTeX function MUST start with a backslash (\\): use \\frac not frac, \\sin not sin, \\sum not sum, \\alpha not alpha. 
-        3) ALWAYS add spaces around inline math: write 'as $x$ approaches $c$' NOT 'as$x$approaches$c$'. 
-        4) Never use \\[...\\] or \\(...\\) or \\begin{{equation}}. 
-        5) Always use KaTeX-compatible LaTeX syntax within Markdown structure. 
+SECTION_PROMPT_INTRO = """
+        AI AGENT INSTRUCTIONS: CONVERT ONE SECTION OF A LECTURE TRANSCRIPT TO MARKDOWN NOTES WITH LATEX MATH
 
-        REMEMBER: Missing backslashes will break math rendering!
+        The lecture transcript is too long for one pass, so it has been split into sections at topic changes. You are writing the notes for section {section_number} of {section_count}. Other sections are handled separately and all parts are joined in order afterwards.
+
+        CORE RESPONSIBILITIES:
+            1. Transform the spoken content of THIS SECTION into structured, academic-style notes
+                - Be detailed and include all important information from the section. These are academic notes, not a summary.
+            2. Organize content with clear hierarchy and flow
+            3. Format mathematical expressions using proper LaTeX syntax
+            4. Ensure KaTeX compatibility for all math expressions
+
+"""
+
+SECTION_PROMPT_ORGANIZATION = """        SECTION ORGANIZATION:
+            1. Do NOT write a document title, an overview or a summary; those are written once for the whole lecture
+            2. Start with a `##` heading that names the topic of this section and use `###` for subtopics
+            3. Include key equations, worked examples and definitions exactly as for full notes
+            4. The section may start or end mid-thought; cover what is there without apologizing for missing context
+{previous_context}
+"""
+
+SECTION_PREVIOUS_CONTEXT = """            5. The previous section ended with: "{previous_tail}" (context only, do not write notes for it)
+"""
+
+STITCH_PROMPT = """
+        You are given the section headings and opening lines of notes that were written section by section for one lecture.
+        Write the parts that need a view of the whole lecture and return them as a JSON object with these keys:
+            - "title": a clear, descriptive title for the lecture (plain text, no leading #)
+            - "overview": a short Markdown paragraph introducing the topics covered
+            - "summary": Markdown bullet points with the key takeaways and the most important formulas
+        Use single $ for inline math and double $$ for display math, with KaTeX-compatible LaTeX.
+
+        THE SECTION OUTLINE IS:
+
+        {outline}
         """
+
+def is_module_available(name: str) -> bool:
+    """Whether a module can be imported, without importing it. A missing parent package counts as unavailable."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ModuleNotFoundError:
+        return False
+
+def update_video_status(video_id: str, status: str, error_message: str = None):
+    """Helper function to queue a video transcription status update; flushed before the handler returns."""
+    print(f"Queueing status update for video {video_id}: {status}")
+    queue_video_status(get_supabase, video_id, status, error_message)
+
+
+# --- LaTeX post-processing ---
+# Function names the model sometimes writes without their backslash inside math
+COMMON_MATH_FUNCTIONS = [
+    'frac', 'sqrt', 'sin', 'cos', 'tan', 'log', 'ln', 'exp', 'sum', 'prod', 'int',
+    'lim', 'alpha', 'beta', 'gamma', 'delta', 'pi', 'theta', 'sigma', 'omega',
+    'infty', 'partial', 'nabla', 'cdot', 'times', 'pm', 'leq', 'geq', 'neq'
+]
+
+# One pass over the notes splits them into code, math and text segments. Math is recognised in
+# all the forms the model produces ($...$, $$...$$, \(...\), \[...\], equation/align environments)
+# and normalised to the $ / $$ delimiters KaTeX is given. Code fences and the bodies of \[, \( and
+# environments stop at the next opener of the same kind, so unclosed delimiters cannot make the
+# scan quadratic. Inline $ follows pandoc: the opening $ has a non-space after it, the closing $ a
+# non-space before it and no digit after it, so a currency amount never opens math.
+LATEX_TOKEN_PATTERN = re.compile(r"""
+    (?P<code_block>^[ \t]*```[^\n]*\n(?:(?!^[ \t]*```)[\s\S])*^[ \t]*```[ \t]*$)
+  | (?P<inline_code>`[^`\n]+`)
+  | (?P<escaped_dollar>\\\$)
+  | \$\$(?P<display>[\s\S]+?)\$\$
+  | \\?\\\[(?P<bracket_display>(?:(?!\\\[)[\s\S])+?)\\?\\\]
+  | \\begin\{(?P<env>equation|align|gather|multline)\*?\}(?P<env_body>(?:(?!\\begin\{)[\s\S])*?)\\end\{(?P=env)\*?\}
+  | \\?\\\((?P<paren_inline>(?:(?!\\\()[^\n])+?)\\?\\\)
+  | \$(?P<inline>[^\s$](?:[^$\n]*?[^\s$])?)\$(?!\d)
+""", re.MULTILINE | re.VERBOSE)
+
+# Inside math: leave text arguments and existing commands alone, add the backslash to bare function names
+MATH_COMMAND_PATTERN = re.compile(
+    r'\\(?:text|mathrm|textbf|textit|operatorname)\{[^{}]*\}'
+    r'|\\[a-zA-Z]+|\\.'
+    r'|(?<![a-zA-Z])(?P<bare>' + '|'.join(COMMON_MATH_FUNCTIONS) + r')(?![a-zA-Z])'
+)
+STRAY_MATH_BACKSLASH_PATTERN = re.compile(r'^\\(?=\s|$)|(?<!\\)\\$')
+DOCUMENT_COMMAND_PATTERN = re.compile(r'\\documentclass[^\n]*\n?|\\usepackage[^\n]*\n?|\\(?:begin|end)\{document\}')
+EXTRA_BLANK_LINES_PATTERN = re.compile(r'\n[ \t]*\n\s*\n')
+
+# Multi-line environments keep their alignment inside display math using KaTeX's inner forms
+ENVIRONMENT_WRAPPERS = {'align': 'aligned', 'gather': 'gathered'}
+
+
+def fix_math_commands(math: str) -> str:
+    def add_backslash(match):
+        bare = match.group('bare')
+        return '\\' + bare if bare else match.group(0)
+    
+    math = MATH_COMMAND_PATTERN.sub(add_backslash, math.strip())
+    return STRAY_MATH_BACKSLASH_PATTERN.sub('', math).strip()
+
+
+def post_process_latex_content(content: str) -> str:
+    """
+    Post-process LaTeX content to fix common formatting issues and ensure KaTeX compatibility.
+    Runs in a single pass over the content, so the cost is linear in its length.
+    """
+    output = []
+    position = 0
+    
+    def append_text(text: str):
+        if text:
+            output.append(DOCUMENT_COMMAND_PATTERN.sub('', text))
+    
+    for match in LATEX_TOKEN_PATTERN.finditer(content):
+        append_text(content[position:match.start()])
+        position = match.end()
+        kind = match.lastgroup
         
-        # Configure generation parameters
-        generation_config = genai.types.GenerateContentConfig(
-            system_instruction=system_instructions,
-            candidate_count=1,
-            max_output_tokens=8192,  # Sufficient for detailed academic notes
-            temperature=0.1,  # Low temperature for consistent, factual output
-        )
+        if kind in ('code_block', 'inline_code', 'escaped_dollar'):
+            output.append(match.group(0))
+            continue
+        
+        if kind in ('display', 'bracket_display', 'env_body'):
+            math = fix_math_commands(match.group(kind))
+            inner_environment = ENVIRONMENT_WRAPPERS.get(match.group('env'))
+            if inner_environment:
+                math = f"\\begin{{{inner_environment}}}{math}\\end{{{inner_environment}}}"
+            output.append(f"$${math}$$")
+            continue
         
+        # Inline math keeps a space between it and neighbouring words
+        math = fix_math_commands(match.group(kind))
+        if not math:
+            continue
+        if output and output[-1][-1:].isalnum():
+            output.append(' ')
+        output.append(f"${math}$")
+        if content[position:position + 1].isalnum():
+            output.append(' ')
+    
+    append_text(content[position:])
+    
+    # Clean up multiple newlines
+    return EXTRA_BLANK_LINES_PATTERN.sub('\n\n', ''.join(output)).strip()
+
+
+def get_generation_config(max_output_tokens: int = MAX_OUTPUT_TOKENS, temperature: float = 0.1, response_mime_type: str = None):
+    from google import genai
+    
+    config_args = {
+        'system_instruction': SYSTEM_INSTRUCTIONS,
+        'candidate_count': 1,
+        'max_output_tokens': max_output_tokens,
+        'temperature': temperature,  # Low temperature for consistent, factual output
+    }
+    if response_mime_type:
+        config_args['response_mime_type'] = response_mime_type
+    return genai.types.GenerateContentConfig(**config_args)
+
+
+def get_finish_reason(response):
+    candidates = getattr(response, 'candidates', None)
+    if not candidates:
+        return None
+    finish_reason = getattr(candidates[0], 'finish_reason', None)
+    # The SDK returns an enum; compare by name so 'SAFETY' matches either form
+    return getattr(finish_reason, 'name', finish_reason)
+
+
+_gemini_slots = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+
+def call_gemini(client, prompt: str, generation_config, stream_to=None) -> Tuple[str, str]:
+    """One Gemini request, within this container's share of the Gemini budget; returns (text, finish_reason)."""
+    with _gemini_slots:
+        return request_gemini(client, prompt, generation_config, stream_to)
+
+def request_gemini(client, prompt: str, generation_config, stream_to=None) -> Tuple[str, str]:
+    """With stream_to, text deltas are fed to it as they arrive."""
+    if stream_to is None:
         response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-05-20",
-            contents=generation_prompt,
+            model=GEMINI_MODEL,
+            contents=prompt,
             config=generation_config
         )
+        return response.text, get_finish_reason(response)
+    
+    text_parts = []
+    finish_reason = None
+    for chunk in client.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=generation_config
+    ):
+        chunk_text = chunk.text if get_finish_reason(chunk) != 'SAFETY' else None
+        if chunk_text:
+            text_parts.append(chunk_text)
+            stream_to.feed(chunk_text)
+        finish_reason = get_finish_reason(chunk) or finish_reason
+    return ''.join(text_parts), finish_reason
+
+
+def generate_with_gemini(prompt: str, max_output_tokens: int = MAX_OUTPUT_TOKENS, response_mime_type: str = None, stream_to=None) -> str:
+    """
+    Run one Gemini call, retrying once with a higher temperature if safety filters block it.
+    With stream_to (a StreamingNoteCheckpointer), output is streamed into it as it is generated.
+    """
+    client = get_gemini_client()
+    generation_config = get_generation_config(max_output_tokens, response_mime_type=response_mime_type)
+    
+    text, finish_reason = call_gemini(client, prompt, generation_config, stream_to)
+    
+    # Check if the response was blocked
+    if finish_reason == 'SAFETY':
+        print("[WARNING] Response was blocked by safety filters, trying with higher temperature...")
+        # Retry with slightly higher temperature
+        generation_config.temperature = 0.3
+        if stream_to is not None:
+            stream_to.restart()
+        text, finish_reason = call_gemini(client, prompt, generation_config, stream_to)
+    
+    if finish_reason == 'MAX_TOKENS':
+        print(f"[WARNING] Gemini output hit the {max_output_tokens} token limit and is truncated")
+    
+    return text
+
+
+def generate_notes_single(raw_transcript: str, stream_to=None) -> str:
+    """Generate the notes for the whole transcript in one call."""
+    prompt_template = (
+        NOTE_PROMPT_INTRO + NOTE_PROMPT_FORMATTING_RULES + NOTE_PROMPT_ORGANIZATION
+        + NOTE_PROMPT_CHECKS + NOTE_PROMPT_TRANSCRIPT
+    )
+    return generate_with_gemini(prompt_template.format(raw_transcript=raw_transcript), stream_to=stream_to)
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    return [sentence for sentence in sentences if sentence]
+
+
+def build_cohesion_blocks(sentences: List[str], block_words: int = COHESION_BLOCK_WORDS) -> List[str]:
+    """Group sentences into blocks of roughly block_words words; boundaries are only placed between blocks."""
+    blocks = []
+    current = []
+    current_words = 0
+    for sentence in sentences:
+        current.append(sentence)
+        current_words += len(sentence.split())
+        if current_words >= block_words:
+            blocks.append(' '.join(current))
+            current = []
+            current_words = 0
+    if current:
+        blocks.append(' '.join(current))
+    return blocks
+
+
+def content_word_counts(text: str) -> Counter:
+    words = re.findall(r"[a-z][a-z'-]+", text.lower())
+    return Counter(word for word in words if word not in COHESION_STOPWORDS and len(word) > 2)
+
+
+def cosine_similarity(left: Counter, right: Counter) -> float:
+    if not left or not right:
+        return 0.0
+    dot = sum(count * right[word] for word, count in left.items() if word in right)
+    norm = math.sqrt(sum(c * c for c in left.values())) * math.sqrt(sum(c * c for c in right.values()))
+    return dot / norm if norm else 0.0
+
+
+def score_block_gaps(blocks: List[str], window: int = COHESION_WINDOW_BLOCKS) -> List[float]:
+    """
+    Lexical cohesion across each gap between blocks (TextTiling style): similarity of the
+    vocabulary in the window before the gap and the window after it. Low scores mark topic shifts.
+    """
+    block_counts = [content_word_counts(block) for block in blocks]
+    scores = []
+    for gap in range(1, len(blocks)):
+        before = Counter()
+        for counts in block_counts[max(0, gap - window):gap]:
+            before.update(counts)
+        after = Counter()
+        for counts in block_counts[gap:gap + window]:
+            after.update(counts)
+        scores.append(cosine_similarity(before, after))
+    return scores
+
+
+def split_at_spaces(text: str, max_chars: int) -> List[str]:
+    """Cut text into pieces of at most max_chars, at the last space before each limit where there is one."""
+    pieces = []
+    text = text.strip()
+    while len(text) > max_chars:
+        cut = text.rfind(' ', 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def split_transcript_into_sections(raw_transcript: str, target_chars: int = SECTION_TARGET_CHARS,
+                                   min_chars: int = SECTION_MIN_CHARS, max_chars: int = SECTION_MAX_CHARS) -> List[str]:
+    """
+    Split a transcript into sections of roughly target_chars, cutting at the weakest lexical
+    cohesion point within [min_chars, max_chars] of each section start so sections follow topics.
+    """
+    blocks = build_cohesion_blocks(split_sentences(raw_transcript))
+    if len(raw_transcript) <= max_chars or len(blocks) < 2:
+        return [raw_transcript.strip()]
+    
+    gap_scores = score_block_gaps(blocks)
+    block_lengths = [len(block) + 1 for block in blocks]
+    
+    sections = []
+    section_start = 0
+    while section_start < len(blocks):
+        remaining = sum(block_lengths[section_start:])
+        if remaining <= max_chars:
+            sections.append(' '.join(blocks[section_start:]))
+            break
+        
+        # Candidate cuts: gap after block i, for sections between min_chars and max_chars long
+        best_gap = None
+        best_score = None
+        size = 0
+        for i in range(section_start, len(blocks) - 1):
+            size += block_lengths[i]
+            if size > max_chars and best_gap is not None:
+                break
+            if size < min_chars:
+                continue
+            # Prefer low cohesion, and mildly prefer cuts near the target size
+            score = gap_scores[i] + 0.1 * abs(size - target_chars) / target_chars
+            if best_score is None or score < best_score:
+                best_gap = i
+                best_score = score
+        
+        if best_gap is None:
+            # No block boundary left within the limits: the rest ends in a block longer than
+            # max_chars (a long stretch without sentence punctuation), so cut it at spaces
+            sections.extend(split_at_spaces(' '.join(blocks[section_start:]), target_chars))
+            break
+        sections.append(' '.join(blocks[section_start:best_gap + 1]))
+        section_start = best_gap + 1
+    
+    return sections
+
+
+def generate_section_notes(section_text: str, section_number: int, section_count: int, previous_tail: str = None) -> str:
+    previous_context = SECTION_PREVIOUS_CONTEXT.format(previous_tail=previous_tail) if previous_tail else ''
+    prompt_template = (
+        SECTION_PROMPT_INTRO + NOTE_PROMPT_FORMATTING_RULES + SECTION_PROMPT_ORGANIZATION
+        + NOTE_PROMPT_CHECKS + NOTE_PROMPT_TRANSCRIPT
+    )
+    prompt = prompt_template.format(
+        section_number=section_number,
+        section_count=section_count,
+        previous_context=previous_context,
+        raw_transcript=section_text
+    )
+    
+    for attempt in range(1, SECTION_MAX_ATTEMPTS + 1):
+        try:
+            started = time.time()
+            notes = generate_with_gemini(prompt)
+            print(f"[SUCCESS] Section {section_number}/{section_count} notes generated in {time.time() - started:.1f}s")
+            return notes
+        except Exception as e:
+            if attempt == SECTION_MAX_ATTEMPTS:
+                raise
+            print(f"[WARNING] Section {section_number}/{section_count} failed (attempt {attempt}): {e}")
+
+
+def build_section_outline(section_notes: List[str]) -> str:
+    """Headings plus the first few lines under each, which is all the stitch pass needs."""
+    outline_lines = []
+    for notes in section_notes:
+        lines_after_heading = STITCH_OUTLINE_LINES
+        for line in notes.splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped.startswith('#'):
+                outline_lines.append(stripped)
+                lines_after_heading = 0
+            elif lines_after_heading < STITCH_OUTLINE_LINES:
+                outline_lines.append(stripped[:300])
+                lines_after_heading += 1
+    return '\n'.join(outline_lines)
+
+
+def stitch_section_notes(section_notes: List[str]) -> str:
+    """Add a title, overview and summary around the section notes with one small Gemini call."""
+    frame = {}
+    try:
+        stitch_output = generate_with_gemini(
+            STITCH_PROMPT.format(outline=build_section_outline(section_notes)),
+            max_output_tokens=STITCH_MAX_OUTPUT_TOKENS,
+            response_mime_type="application/json"
+        )
+        frame = json.loads(stitch_output)
+    except Exception as e:
+        # The section notes are the valuable part; publish them with a generic frame
+        print(f"[WARNING] Stitch pass failed, using default title and no summary: {e}")
+    
+    title = str(frame.get('title') or 'Lecture Notes').lstrip('# ').strip()
+    parts = [f"# {title}"]
+    if frame.get('overview'):
+        parts.append(f"## Overview\n\n{frame['overview'].strip()}")
+    parts.extend(notes.strip() for notes in section_notes)
+    if frame.get('summary'):
+        parts.append(f"## Summary\n\n{frame['summary'].strip()}")
+    return '\n\n'.join(parts)
+
+
+def generate_notes_map_reduce(raw_transcript: str, on_progress=None) -> str:
+    """
+    Split the transcript at topic changes, generate notes for the sections concurrently and
+    stitch them together, so wall-clock time follows section count over SECTION_WORKERS.
+    on_progress is called with the notes of the leading run of finished sections as they complete.
+    """
+    sections = split_transcript_into_sections(raw_transcript)
+    section_count = len(sections)
+    print(f"Map-reduce note generation: {section_count} sections, sizes {[len(section) for section in sections]} chars, {SECTION_WORKERS} workers")
+    
+    started = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(SECTION_WORKERS, GEMINI_MAX_CONCURRENCY, section_count))) as executor:
+        future_to_index = {}
+        for index, section in enumerate(sections):
+            previous_tail = sections[index - 1][-SECTION_CONTEXT_CHARS:] if index > 0 else None
+            future = executor.submit(generate_section_notes, section, index + 1, section_count, previous_tail)
+            future_to_index[future] = index
+        
+        finished = [None] * section_count
+        ready_prefix = 0
+        for future in concurrent.futures.as_completed(future_to_index):
+            finished[future_to_index[future]] = future.result()
+            # Only a contiguous run from the start can be shown, so the notes keep the lecture order
+            previous_prefix = ready_prefix
+            while ready_prefix < section_count and finished[ready_prefix] is not None:
+                ready_prefix += 1
+            if on_progress and ready_prefix > previous_prefix and ready_prefix < section_count:
+                on_progress(finished[:ready_prefix])
+        section_notes = finished
+    print(f"All {section_count} sections generated in {time.time() - started:.1f}s")
+    
+    started = time.time()
+    notes = stitch_section_notes(section_notes)
+    print(f"Stitch pass finished in {time.time() - started:.1f}s")
+    return notes
+
+
+def save_note(supabase, transcript_id: str, user_id: str, content: str, note_id: str = None) -> str:
+    """Insert or update the note for a transcript in one statement and return its id."""
+    if note_id:
+        # Update existing note
+        supabase.table('notes').update({
+            'content': content, # Save generated content
+            'markdown_content': None # Markdown content is not saved for LaTeX notes
+        }).eq('id', note_id).execute()
+        return note_id
+    
+    # Insert or update by transcript; needs the unique index on notes.transcript_id
+    upsert_response = supabase.table('notes').upsert({
+        'transcript_id': transcript_id,
+        'user_id': user_id, # Link note to user
+        'content': content, # Save generated content
+        'markdown_content': None # Markdown content is not saved for LaTeX notes
+    }, on_conflict='transcript_id').execute()
+    return upsert_response.data[0]['id'] if upsert_response.data else None
+
+
+class NoteCheckpointWriter:
+    """
+    Queues partial notes for the notes row at most once per interval, so the dashboard can show progress.
+    Writes go through the shared background writer and never hold up generation; a checkpoint queued
+    while the previous one is still being written replaces it.
+    """
+    
+    def __init__(self, supabase, transcript_id: str, user_id: str, min_interval_seconds: float = NOTE_CHECKPOINT_INTERVAL_SECONDS):
+        self.supabase = supabase
+        self.writer = get_writer(get_supabase)
+        self.key = ('notes', transcript_id)
+        self.transcript_id = transcript_id
+        self.user_id = user_id
+        self.min_interval_seconds = min_interval_seconds
+        self.note_id = None
+        self.started = time.time()
+        self.last_write = 0.0
+        self.last_length = 0
+        self.pending = None
+        self.writes = 0
+        self.first_content_seconds = None
+    
+    def checkpoint(self, content: str):
+        if len(content) == self.last_length:
+            return
+        self.pending = content
+        if time.time() - self.last_write >= self.min_interval_seconds:
+            self.flush()
+    
+    def flush(self):
+        """Queue the latest pending content now. Checkpoints are best effort and never fail the job."""
+        if self.pending is None:
+            return
+        content = self.pending
+        self.pending = None
+        self.writer.submit(self.key, {'content': content}, self.write)
+        self.last_write = time.time()
+        self.last_length = len(content)
+        self.writes += 1
+        if self.first_content_seconds is None:
+            self.first_content_seconds = self.last_write - self.started
+            print(f"First partial notes queued after {self.first_content_seconds:.1f}s")
+    
+    def write(self, supabase, key, values: Dict):
+        # Runs on the writer thread
+        self.note_id = save_note(supabase, self.transcript_id, self.user_id, values['content'], self.note_id)
+    
+    def close(self):
+        """Drop a checkpoint that has not been sent yet and wait for one in flight, so it cannot land after the final save."""
+        self.pending = None
+        self.writer.discard(self.key)
+        self.writer.flush()
+
+
+class MarkdownBlockBuffer:
+    """
+    Collects streamed Markdown and returns blocks that are finished: text up to a blank line
+    that is not inside a code fence or a $$ display math block.
+    """
+    
+    BLANK_LINE = re.compile(r'\n[ \t]*\n')
+    
+    def __init__(self):
+        self.pending = ''
+    
+    def feed(self, text: str) -> List[str]:
+        self.pending += text
+        blocks = []
+        search_from = 0
+        for match in self.BLANK_LINE.finditer(self.pending):
+            candidate = self.pending[search_from:match.start()]
+            if self.is_open(candidate):
+                continue
+            if candidate.strip():
+                blocks.append(candidate.strip('\n'))
+            search_from = match.end()
+        self.pending = self.pending[search_from:]
+        return blocks
+    
+    @staticmethod
+    def is_open(block: str) -> bool:
+        fences = len(re.findall(r'^\s*```', block, flags=re.MULTILINE))
+        if fences % 2 == 1:
+            return True
+        outside_code = re.sub(r'```[\s\S]*?```', '', block)
+        return outside_code.count('$$') % 2 == 1
+    
+    def flush(self) -> List[str]:
+        remainder = self.pending.strip('\n')
+        self.pending = ''
+        return [remainder] if remainder.strip() else []
+
+
+class StreamingNoteCheckpointer:
+    """Post-processes finished blocks of streamed notes and checkpoints the result."""
+    
+    def __init__(self, writer: NoteCheckpointWriter):
+        self.writer = writer
+        self.buffer = MarkdownBlockBuffer()
+        self.processed_blocks = []
+    
+    def feed(self, text: str):
+        new_blocks = self.buffer.feed(text)
+        if new_blocks:
+            self.processed_blocks.extend(post_process_latex_content(block) for block in new_blocks)
+            self.writer.checkpoint('\n\n'.join(self.processed_blocks))
+    
+    def restart(self):
+        """Drop what was streamed so far, e.g. before retrying a blocked response."""
+        self.buffer = MarkdownBlockBuffer()
+        self.processed_blocks = []
+
+
+def choose_generation_mode(raw_transcript: str) -> str:
+    if NOTE_GENERATION_MODE in ('single', 'map_reduce'):
+        return NOTE_GENERATION_MODE
+    return 'map_reduce' if len(raw_transcript) > MAP_REDUCE_THRESHOLD_CHARS else 'single'
+
+
+@flush_on_exit
+def lambda_handler(event, context):
+    print("Received note generation event:", json.dumps(event))
+
+    # Health check that answers without importing the SDKs
+    if event.get('test') == 'basic_functionality':
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Lambda function is working correctly',
+                'supabase_configured': bool(os.environ.get("SUPABASE_URL") and os.environ.get("SUPABASE_KEY")),
+                'gemini_configured': bool(os.environ.get("GEMINI_API_KEY")),
+                'genai_available': is_module_available('google.genai'),
+                'init_timings_ms': INIT_TIMINGS
+            })
+        }
+
+    video_id = None # Initialize video_id to None
+    transcript_id = None # Initialize transcript_id to None
+    tracer = None
+    try:
+        # Extract data from the event payload sent by the transcription Lambda
+        payload = event # Assuming the event is the payload JSON
+        video_id = payload.get('videoId')
+        user_id = payload.get('userId')
+        note_format = payload.get('noteFormat', 'Markdown') # Get note format, default to markdown
+        # raw_transcript is no longer expected directly, we fetch it by transcriptId
+        on_screen_text_data = payload.get('onScreenTextData') # Expect on-screen text data
+
+        if not video_id or not user_id:
+            print("Missing videoId or userId in payload.")
+            # No video_id to update status if missing
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Missing videoId or userId')
+            }
+
+        print(f"Generating notes for video ID: {video_id} for user: {user_id} in format: {note_format}")
+        # Spans share the job id the transcription Lambda passed along
+        tracer = JobTracer('note_generation', payload.get('jobId'), VideoId=video_id)
+        supabase = get_supabase()
+
+        # 1. Fetch the transcript text and transcript_id using the video_id
+        # Assuming a one-to-one relationship between videos and transcripts
+        # Use maybe_single() here as well, in case a video has no transcript (though less likely)
+        # The transcription Lambda passes the transcriptId of the row it saved when it has one
+        with tracer.span('fetch_transcript') as span:
+            if payload.get('transcriptId'):
+                transcript_response = supabase.table('transcripts').select('id, content').eq('id', payload['transcriptId']).maybe_single().execute()
+            else:
+                transcript_response = supabase.table('transcripts').select('id, content').eq('video_id', video_id).maybe_single().execute()
+            if transcript_response.data:
+                span.add_bytes(bytes_in=len(transcript_response.data['content'] or ''))
+
+        if transcript_response.data:
+            transcript_id = transcript_response.data['id']
+            raw_transcript = transcript_response.data['content']
+            print(f"Fetched transcript for video {video_id}, transcript ID: {transcript_id}")
+        else:
+            print(f"No transcript found for video ID: {video_id}")
+            update_video_status(video_id, 'note_generation_failed', f'No transcript found for video ID: {video_id}')
+            tracer.finish('failed', error='transcript not found')
+            return {
+                'statusCode': 404,
+                'body': json.dumps(f'No transcript found for video ID: {video_id}')
+            }
+
+        # --- Generate Notes in Unified Markdown + LaTeX Format ---
+        # Always generate Markdown content with embedded LaTeX math expressions
+        generation_mode = choose_generation_mode(raw_transcript)
+        print(f"Sending request to Gemini 2.5 Flash for unified Markdown+LaTeX content generation ({generation_mode}, {len(raw_transcript)} chars)...")
         
-        # Check if the response was blocked
-        if response.candidates[0].finish_reason == 'SAFETY':
-            print("[WARNING] Response was blocked by safety filters, trying with higher temperature...")
-            # Retry with slightly higher temperature
-            generation_config.temperature = 0.3
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-preview-05-20",
-                contents=generation_prompt,
-                config=generation_config
-            )
+        checkpoint_writer = NoteCheckpointWriter(supabase, transcript_id, user_id) if STREAM_NOTES else None
         
-        generated_content = response.text
+        with tracer.span('generate', mode=generation_mode) as span:
+            if generation_mode == 'map_reduce':
+                on_progress = None
+                if checkpoint_writer:
+                    on_progress = lambda finished: checkpoint_writer.checkpoint(post_process_latex_content('\n\n'.join(finished)))
+                generated_content = generate_notes_map_reduce(raw_transcript, on_progress=on_progress)
+            else:
+                stream_to = StreamingNoteCheckpointer(checkpoint_writer) if checkpoint_writer else None
+                generated_content = generate_notes_single(raw_transcript, stream_to=stream_to)
+            # The transcript is what goes to Gemini; the notes are what comes back
+            span.add_bytes(bytes_in=len(raw_transcript), bytes_out=len(generated_content or ''))
+            if checkpoint_writer:
+                span.set(checkpoints=checkpoint_writer.writes, first_content_seconds=checkpoint_writer.first_content_seconds)
+        
+        if checkpoint_writer:
+            print(f"Queued {checkpoint_writer.writes} partial note checkpoints")
         print(f"Generated unified Markdown+LaTeX content successfully.")
 
         # Post-process LaTeX content to fix common issues
-        generated_content = post_process_latex_content(generated_content)
+        with tracer.span('post_process'):
+            generated_content = post_process_latex_content(generated_content)
         print("Applied LaTeX post-processing.")
 
         # --- Save to Supabase (notes table) ---
         # Insert a new record into the 'notes' table
         try:
-            # Check if a note already exists for this transcript_id using maybe_single()
-            existing_note_response = supabase.table('notes').select('id').eq('transcript_id', transcript_id).maybe_single().execute()
-
-            if existing_note_response:
-                # Update existing note
-                note_id = existing_note_response.data['id']
-                print(f"Note already exists for transcript {transcript_id}, updating note ID: {note_id}")
-                update_response = supabase.table('notes').update({
-                    'content': generated_content, # Save generated content
-                    'markdown_content': None # Markdown content is not saved for LaTeX notes
-                }).eq('id', note_id).execute()
-
-            else:
-                # Insert new note
-                print(f"No existing note for transcript {transcript_id}, inserting new note.")
-                insert_response = supabase.table('notes').insert({
-                    'transcript_id': transcript_id,
-                    'user_id': user_id, # Link note to user
-                    'content': generated_content, # Save generated content
-                    'markdown_content': None # Markdown content is not saved for LaTeX notes
-                }).execute()
+            # The final write always runs the post-processing over the whole document
+            if checkpoint_writer:
+                checkpoint_writer.close()
+            note_id = checkpoint_writer.note_id if checkpoint_writer else None
+            with tracer.span('save_note') as span:
+                save_note(supabase, transcript_id, user_id, generated_content, note_id)
+                span.add_bytes(bytes_out=len(generated_content))
                 
             # Update video status to indicate notes are generated
             update_video_status(video_id, 'completed') # Assuming 'completed' means notes are ready
             print(f"Updated video {video_id} status to 'completed'.")
+            tracer.finish('completed', mode=generation_mode, notes_chars=len(generated_content))
 
             return {
                 'statusCode': 200,
@@ -380,6 +937,7 @@ def lambda_handler(event, context):
         except Exception as db_error:
             print(f"Error saving generated notes to Supabase: {db_error}")
             update_video_status(video_id, 'note_generation_failed', f'Error saving generated notes to Supabase: {db_error}')
+            tracer.finish('failed', error=str(db_error)[:200])
             return {
                 'statusCode': 500,
                 'body': json.dumps(f'Error saving generated notes to Supabase: {db_error}')
@@ -389,6 +947,8 @@ def lambda_handler(event, context):
         print(f"Error during Gemini API calls: {gemini_error}")
         if video_id:
              update_video_status(video_id, 'note_generation_failed', f'Error during Gemini API calls: {gemini_error}')
+        if tracer:
+            tracer.finish('failed', error=str(gemini_error)[:200])
         return {
             'statusCode': 500,
             'body': json.dumps(f'Error during Gemini API calls: {gemini_error}')
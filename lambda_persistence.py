@@ -0,0 +1,137 @@
+"""
+Shared Supabase persistence for the transcription and note-generation Lambdas.
+
+Status changes and progress writes go through one background writer per container. It reuses the
+Lambda's cached Supabase client, and so its pooled HTTP connections. Writes never block pipeline
+stages: each row keeps only its latest pending values, so a burst of updates to the same row
+becomes one request. Handlers flush before returning, because Lambda freezes background threads
+between invocations.
+
+Deploy this file next to the handler in both Lambda packages.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+FLUSH_TIMEOUT_SECONDS = 10.0
+
+
+class CoalescingWriter:
+    """
+    Background writer. submit() queues values for a row key; values queued again for the same key
+    before they are written are merged into the pending write, so only the latest state is sent.
+    Rows are written in the order they were first queued.
+    """
+
+    def __init__(self, get_client: Callable, name: str = 'persistence'):
+        self.get_client = get_client
+        self.name = name
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._thread = None
+        self.stats = {'submitted': 0, 'written': 0, 'coalesced': 0, 'failed': 0, 'write_seconds': 0.0}
+
+    def submit(self, key: Hashable, values: Dict, write: Callable):
+        """Queue write(client, key, values) for key; merges with a pending write for the same key."""
+        with self._condition:
+            self.stats['submitted'] += 1
+            if key in self._pending:
+                pending_values, _ = self._pending[key]
+                pending_values.update(values)
+                self._pending[key] = (pending_values, write)
+                self.stats['coalesced'] += 1
+            else:
+                self._pending[key] = (dict(values), write)
+            self._ensure_thread()
+            self._condition.notify_all()
+
+    def discard(self, key: Hashable):
+        """Drop a pending write, e.g. a progress checkpoint superseded by the final save."""
+        with self._condition:
+            self._pending.pop(key, None)
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+        """Wait until everything queued so far is written. Returns False on timeout."""
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._pending or self._in_flight:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    print(f"[WARNING] {self.name}: flush timed out with {len(self._pending)} pending writes")
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                key, (values, write) = self._pending.popitem(last=False)
+                self._in_flight += 1
+            started = time.time()
+            try:
+                client = self.get_client()
+                if client is None:
+                    print(f"{self.name}: Supabase not configured, dropping write for {key}: {values}")
+                else:
+                    write(client, key, values)
+                    self.stats['written'] += 1
+            except Exception as e:
+                # Same contract as the old inline status updates: log and carry on
+                self.stats['failed'] += 1
+                print(f"[WARNING] {self.name}: write for {key} failed: {e}")
+            finally:
+                self.stats['write_seconds'] = round(self.stats['write_seconds'] + time.time() - started, 3)
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer(get_client: Callable) -> CoalescingWriter:
+    """The container's writer; get_client is the Lambda's cached Supabase accessor."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = CoalescingWriter(get_client)
+    return _writer
+
+def flush_writes(timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+    return _writer.flush(timeout) if _writer is not None else True
+
+def flush_on_exit(handler):
+    """Decorator for lambda_handler: queued writes are flushed before the response is returned."""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            flush_writes()
+    return wrapper
+
+
+def write_video_update(client, key, values: Dict):
+    _, video_id = key
+    response = client.table('videos').update(values).eq('id', video_id).execute()
+    if response.data is None or (isinstance(response.data, list) and len(response.data) == 0):
+        print(f"Warning: Update of video {video_id} to {values} might not have been successful. Response data is empty.")
+    else:
+        print(f"Video {video_id} updated: {values}")
+
+def queue_video_status(get_client: Callable, video_id: str, status: str, error_message: str = None, **fields):
+    """Queue a videos row update without waiting for it; later updates to the same video coalesce."""
+    # Always written, so a later status coalesced over a failure clears its message
+    update_data = {'transcription_status': status, 'error_message': error_message if status == 'failed' else None, **fields}
+    get_writer(get_client).submit(('videos', video_id), update_data, write_video_update)
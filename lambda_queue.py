@@ -0,0 +1,199 @@
+"""
+Queue consumption and shared call budgets for the transcription and note-generation Lambdas.
+
+The transcription Lambda can sit behind an SQS queue instead of being invoked once per upload.
+Each batch of messages is ordered so that short recordings run first, users take turns, and a
+user who uploaded many files at once cannot fill a whole batch. Long jobs may use only some of
+the consumer's job slots, so a short clip never waits for every slot to free up. Messages that
+are not started, or whose video another invocation is still working on, are sent again with a
+delay and the originals deleted, so waiting never counts towards the queue's maxReceiveCount.
+Only jobs that failed are returned as batchItemFailures for SQS to redeliver.
+
+Whisper and Gemini budgets are fleet-wide numbers; each container takes an equal share of them.
+
+Deploy this file next to the handler in both Lambda packages.
+"""
+import base64
+import json
+import os
+import threading
+import time
+import concurrent.futures
+from typing import Callable, Dict, List
+
+QUEUE_JOB_CONCURRENCY = int(os.environ.get("QUEUE_JOB_CONCURRENCY", "2"))  # Jobs one consumer runs at once
+QUEUE_LONG_JOB_SLOTS = int(os.environ.get("QUEUE_LONG_JOB_SLOTS", str(max(1, QUEUE_JOB_CONCURRENCY - 1))))
+QUEUE_SHORT_JOB_MINUTES = float(os.environ.get("QUEUE_SHORT_JOB_MINUTES", "15"))
+QUEUE_MAX_JOBS_PER_USER = int(os.environ.get("QUEUE_MAX_JOBS_PER_USER", "2"))  # Per batch; the rest are redelivered later
+QUEUE_AGING_SECONDS = float(os.environ.get("QUEUE_AGING_SECONDS", "600"))  # Waiting this long halves a job's effective length
+QUEUE_START_MARGIN_SECONDS = float(os.environ.get("QUEUE_START_MARGIN_SECONDS", "120"))  # Don't start jobs this close to the timeout
+QUEUE_DEFER_SECONDS = int(os.environ.get("QUEUE_DEFER_SECONDS", "30"))  # Delay of messages sent back unstarted
+QUEUE_HELD_JOB_DELAY_SECONDS = int(os.environ.get("QUEUE_HELD_JOB_DELAY_SECONDS", "900"))  # SQS allows at most 900
+REDELIVER_STATUS_CODES = {409}  # The job is held by another invocation; try again once it may have finished
+# Set on re-sent messages so a job keeps its place in the aging order
+FIRST_SENT_ATTRIBUTE = 'FirstSentTimestamp'
+
+
+def concurrency_share(budget: int, containers: int, default: int) -> int:
+    """This container's share of a fleet-wide concurrency budget, or default when no budget is set."""
+    if budget <= 0:
+        return default
+    return max(1, budget // max(1, containers))
+
+
+class QueuedJob:
+    """One SQS message: the job payload plus what the scheduler orders by."""
+
+    def __init__(self, record: Dict, now: float = None):
+        self.record = record
+        self.message_id = record['messageId']
+        self.payload = json.loads(record['body'])
+        self.user_id = self.payload.get('userId')
+        attributes = record.get('attributes', {})
+        first_sent = record.get('messageAttributes', {}).get(FIRST_SENT_ATTRIBUTE, {}).get('stringValue')
+        sent_ms = float(first_sent or attributes.get('SentTimestamp', 0) or 0)
+        self.waited_seconds = max(0.0, (now or time.time()) - sent_ms / 1000) if sent_ms else 0.0
+        self.estimated_seconds = None
+
+    @property
+    def is_long(self) -> bool:
+        return self.estimated_seconds is not None and self.estimated_seconds > QUEUE_SHORT_JOB_MINUTES * 60
+
+    def effective_seconds(self) -> float:
+        """Estimated media length, discounted the longer the job has waited so long jobs cannot starve."""
+        estimate = self.estimated_seconds if self.estimated_seconds is not None else QUEUE_SHORT_JOB_MINUTES * 60
+        return estimate / (1 + self.waited_seconds / QUEUE_AGING_SECONDS)
+
+
+def requeue_message_fields(record: Dict) -> Dict:
+    """
+    send_message arguments that queue the job of an SQS event record again: the same body and
+    message attributes, plus when the job was first sent.
+    """
+    message_attributes = {}
+    for name, attribute in record.get('messageAttributes', {}).items():
+        if attribute.get('stringValue') is not None:
+            message_attributes[name] = {'DataType': attribute['dataType'], 'StringValue': attribute['stringValue']}
+        elif attribute.get('binaryValue') is not None:
+            message_attributes[name] = {'DataType': attribute['dataType'], 'BinaryValue': base64.b64decode(attribute['binaryValue'])}
+    if FIRST_SENT_ATTRIBUTE not in message_attributes:
+        sent_ms = record.get('attributes', {}).get('SentTimestamp') or str(int(time.time() * 1000))
+        message_attributes[FIRST_SENT_ATTRIBUTE] = {'DataType': 'Number', 'StringValue': str(sent_ms)}
+    return {'MessageBody': record['body'], 'MessageAttributes': message_attributes}
+
+
+def order_jobs(jobs: List[QueuedJob]) -> List[QueuedJob]:
+    """
+    Shortest first within each user, then round-robin across users: every user's shortest job
+    comes before anyone's second, and each round is itself ordered shortest first.
+    """
+    by_user = {}
+    for job in jobs:
+        by_user.setdefault(job.user_id, []).append(job)
+    for user_jobs in by_user.values():
+        user_jobs.sort(key=QueuedJob.effective_seconds)
+
+    ordered = []
+    for round_index in range(max((len(user_jobs) for user_jobs in by_user.values()), default=0)):
+        round_jobs = [user_jobs[round_index] for user_jobs in by_user.values() if round_index < len(user_jobs)]
+        ordered.extend(sorted(round_jobs, key=QueuedJob.effective_seconds))
+    return ordered
+
+
+def process_queue_batch(event: Dict, context, handle_job: Callable, estimate_seconds: Callable = None,
+                        requeue: Callable = None) -> Dict:
+    """
+    Run the jobs of an SQS batch in priority order and report the failed ones for redelivery.
+
+    handle_job(payload) returns a handler response; 5xx or an exception counts as failed.
+    estimate_seconds(payload) returns the job's media length in seconds, or None if unknown.
+    requeue(record, delay_seconds) sends the message's job again after delay_seconds, for jobs
+    that were deferred, not started or held by another invocation. Those are then deleted with
+    the batch, unless the requeue raised or none was given; then they are redelivered too.
+    """
+    now = time.time()
+    jobs = [QueuedJob(record, now) for record in event.get('Records', [])]
+    for job in jobs:
+        if estimate_seconds:
+            try:
+                job.estimated_seconds = estimate_seconds(job.payload)
+            except Exception as e:
+                print(f"Warning: could not estimate job {job.message_id}: {e}")
+
+    # Fairness across batches: excess jobs of one user go back to the queue
+    ordered = order_jobs(jobs)
+    per_user = {}
+    runnable, deferred = [], []
+    for job in ordered:
+        per_user[job.user_id] = per_user.get(job.user_id, 0) + 1
+        (runnable if per_user[job.user_id] <= QUEUE_MAX_JOBS_PER_USER else deferred).append(job)
+
+    failures = []
+    held = []
+    stats = {'received': len(jobs), 'deferred': len(deferred), 'started': 0, 'succeeded': 0, 'failed': 0, 'held': 0,
+             'not_started': 0, 'requeued': 0}
+    condition = threading.Condition()
+    running = {'all': 0, 'long': 0}
+    pending = list(runnable)
+
+    def next_job():
+        """Highest-priority job that may start now; long jobs wait for a long-job slot."""
+        for job in pending:
+            if not job.is_long or running['long'] < QUEUE_LONG_JOB_SLOTS:
+                pending.remove(job)
+                return job
+        return None
+
+    def run(job: QueuedJob):
+        started = time.time()
+        try:
+            status_code = (handle_job(job.payload) or {}).get('statusCode', 500)
+            outcome = 'held' if status_code in REDELIVER_STATUS_CODES else 'succeeded' if status_code < 500 else 'failed'
+        except Exception as e:
+            print(f"Queued job {job.message_id} raised: {e}")
+            outcome = 'failed'
+        print(f"[QUEUE] Job {job.message_id} ({job.estimated_seconds or 0:.0f}s media, waited {job.waited_seconds:.0f}s) "
+              f"{outcome} in {time.time() - started:.1f}s")
+        with condition:
+            running['all'] -= 1
+            running['long'] -= 1 if job.is_long else 0
+            stats[outcome] += 1
+            if outcome == 'failed':
+                failures.append(job.message_id)
+            elif outcome == 'held':
+                held.append(job)
+            condition.notify_all()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, QUEUE_JOB_CONCURRENCY)) as executor:
+        with condition:
+            while pending:
+                remaining_ms = context.get_remaining_time_in_millis() if context else None
+                if remaining_ms is not None and remaining_ms < QUEUE_START_MARGIN_SECONDS * 1000:
+                    break
+                job = next_job() if running['all'] < QUEUE_JOB_CONCURRENCY else None
+                if job is None:
+                    condition.wait(1.0)
+                    continue
+                running['all'] += 1
+                running['long'] += 1 if job.is_long else 0
+                stats['started'] += 1
+                executor.submit(run, job)
+            # Jobs never started before the deadline go back to the queue
+            stats['not_started'] = len(pending)
+            deferred.extend(pending)
+            pending.clear()
+
+    # Sent again rather than redelivered: every redelivery counts towards the dead-letter limit
+    for job, delay_seconds in [(job, QUEUE_DEFER_SECONDS) for job in deferred] + [(job, QUEUE_HELD_JOB_DELAY_SECONDS) for job in held]:
+        if requeue is None:
+            failures.append(job.message_id)
+            continue
+        try:
+            requeue(job.record, min(delay_seconds, 900))
+            stats['requeued'] += 1
+        except Exception as e:
+            print(f"Warning: could not requeue {job.message_id}, leaving it to be redelivered: {e}")
+            failures.append(job.message_id)
+
+    print(f"[QUEUE] Batch: {json.dumps(stats)}")
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
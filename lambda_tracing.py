@@ -0,0 +1,170 @@
+"""
+Lightweight per-stage tracing shared by the transcription and note-generation Lambdas.
+
+A span measures one stage of a job: wall time, bytes in/out, and the resident memory of the
+process when the stage ends and how much it grew during the stage. Spans are printed as
+CloudWatch Embedded Metric Format (EMF) records, so CloudWatch turns them into metrics straight
+from the log stream. Every record carries the job id, which the transcription Lambda passes to
+note generation, so both halves of a job can be lined up stage by stage.
+
+The Process* metrics describe the whole process, not the stage. ProcessCpuMs is the CPU the
+process and its finished ffmpeg children used while the span was open, so it includes the work of
+any other stage or job running on other threads at the time. ProcessPeakRssMb is the largest
+resident size the process has reached since the container started, so a warm container keeps
+reporting the peak of an earlier, larger job.
+
+Deploy this file next to the handler in both Lambda packages.
+"""
+import json
+import os
+import time
+import uuid
+import resource
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "EdNoteAI/Pipeline")
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+
+# (record field, CloudWatch unit) for every span
+SPAN_METRICS = [
+    ('WallMs', 'Milliseconds'),
+    ('RssMb', 'Megabytes'),
+    ('RssDeltaMb', 'Megabytes'),
+    ('BytesIn', 'Bytes'),
+    ('BytesOut', 'Bytes'),
+    ('ProcessCpuMs', 'Milliseconds'),
+    ('ProcessPeakRssMb', 'Megabytes'),
+]
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+def read_cpu_seconds() -> float:
+    """CPU time of this process plus finished child processes (ffmpeg/ffprobe)."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def read_process_peak_rss_mb() -> float:
+    """Lifetime high-water mark of resident memory for this process or any child, in MB (ru_maxrss is KB on Linux)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+def read_rss_mb() -> float:
+    """Current resident memory of this process in MB, from VmRSS in /proc/self/status; None off Linux."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Span:
+    """One timed stage; add bytes and attributes while it runs."""
+
+    def __init__(self, stage: str, attributes: Dict):
+        self.stage = stage
+        self.attributes = dict(attributes)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.status = 'ok'
+        self._wall_start = time.perf_counter()
+        self._cpu_start = read_cpu_seconds()
+        self._rss_start = read_rss_mb()
+
+    def add_bytes(self, bytes_in: int = 0, bytes_out: int = 0):
+        self.bytes_in += int(bytes_in or 0)
+        self.bytes_out += int(bytes_out or 0)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def measure(self) -> Dict:
+        rss = read_rss_mb()
+        return {
+            'WallMs': round((time.perf_counter() - self._wall_start) * 1000, 1),
+            'RssMb': rss,
+            'RssDeltaMb': round(rss - self._rss_start, 1) if rss is not None and self._rss_start is not None else None,
+            'BytesIn': self.bytes_in,
+            'BytesOut': self.bytes_out,
+            'ProcessCpuMs': round((read_cpu_seconds() - self._cpu_start) * 1000, 1),
+            'ProcessPeakRssMb': read_process_peak_rss_mb(),
+        }
+
+
+class JobTracer:
+    """Collects the spans of one job and prints each one as an EMF record when it ends."""
+
+    def __init__(self, function_name: str, job_id: str = None, **properties):
+        self.function_name = function_name
+        self.job_id = job_id or new_job_id()
+        self.properties = properties
+        self.stages = []
+        self._lock = threading.Lock()
+        self._job_span = Span('job', {})
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        span = Span(stage, attributes)
+        try:
+            yield span
+        except BaseException:
+            span.status = 'error'
+            raise
+        finally:
+            self.emit(stage, span.measure(), span.status, span.attributes)
+
+    def record(self, stage: str, wall_seconds: float = 0.0, bytes_in: int = 0, bytes_out: int = 0, **attributes):
+        """Emit a stage measured elsewhere, e.g. Whisper time summed over concurrent requests."""
+        values = {
+            'WallMs': round(wall_seconds * 1000, 1),
+            'RssMb': read_rss_mb(),
+            'BytesIn': int(bytes_in or 0),
+            'BytesOut': int(bytes_out or 0),
+            'ProcessPeakRssMb': read_process_peak_rss_mb(),
+        }
+        self.emit(stage, values, 'ok', attributes)
+
+    def finish(self, status: str = 'ok', **attributes):
+        """Emit the whole-job record."""
+        self.emit('job', self._job_span.measure(), status, attributes)
+
+    def emit(self, stage: str, values: Dict, status: str, attributes: Dict):
+        with self._lock:
+            self.stages.append({'stage': stage, 'status': status, **{k: v for k, v in values.items() if v is not None}})
+        if not TRACING_ENABLED:
+            return
+
+        metrics = [{'Name': name, 'Unit': unit} for name, unit in SPAN_METRICS if values.get(name) is not None]
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Function', 'Stage']],
+                    'Metrics': metrics
+                }]
+            },
+            'Function': self.function_name,
+            'Stage': stage,
+            'JobId': self.job_id,
+            'Status': status,
+            **self.properties,
+            **attributes,
+            **{name: values[name] for name, _ in SPAN_METRICS if values.get(name) is not None}
+        }
+        print(json.dumps(record, default=str))
+
+    def summary(self) -> Dict:
+        """Wall milliseconds per stage, for handler responses."""
+        with self._lock:
+            totals = {}
+            for entry in self.stages:
+                totals[entry['stage']] = round(totals.get(entry['stage'], 0.0) + entry.get('WallMs', 0.0), 1)
+            return totals
@@ -0,0 +1,999 @@
+"""
+Offline end-to-end load test for the transcription and note-generation Lambdas.
+
+Drives lambda_handler in both Lambda files against in-process stand-ins for OpenAI Whisper,
+Gemini, Supabase, S3 and the Lambda invoke API, using synthetic lecture audio generated with
+ffmpeg, and reports throughput and latency per media duration.
+
+    python local_load_test.py --durations 5,30,120,240 --whisper-latency 4 --rate-limit-rate 0.05
+    python local_load_test.py --engine-benchmark --benchmark-concurrency 8,32,64 --whisper-max-concurrency 100
+
+Needs ffmpeg/ffprobe on PATH and the Lambdas' Python dependencies (see README); no network
+access or API keys are used. Results are reproducible for a given --seed.
+"""
+import argparse
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from types import SimpleNamespace
+from typing import List, Dict
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+AUDIO_LAMBDA_PATH = os.path.join(REPO_ROOT, "lambda_function-audio_trans.py")
+NOTES_LAMBDA_PATH = os.path.join(REPO_ROOT, "lambda_function-note_gen.py")
+NOTE_GENERATOR_ARN = "local-note-generator"
+BUCKET = "local-uploads"
+
+
+# --- Fake services ---
+
+class FakeAPIError(Exception):
+    """Shaped like an OpenAI/Gemini API error: status_code plus a response carrying headers."""
+
+    def __init__(self, status_code: int, message: str, headers: Dict = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class FakeWhisper:
+    """
+    OpenAI client stand-in serving audio.transcriptions.create. Latency grows with chunk duration;
+    requests beyond max_concurrency, or picked at rate_limit_rate, get 429 with Retry-After, and
+    failure_rate of them get a 500. async_client is the AsyncOpenAI equivalent, sharing the stats.
+    """
+
+    def __init__(self, latency_seconds: float = 3.0, seconds_per_audio_minute: float = 0.5,
+                 jitter: float = 0.2, rate_limit_rate: float = 0.0, failure_rate: float = 0.0,
+                 max_concurrency: int = 50, retry_after_seconds: float = 1.0,
+                 time_scale: float = 1.0, seed: int = 0):
+        self.latency_seconds = latency_seconds
+        self.seconds_per_audio_minute = seconds_per_audio_minute
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.max_concurrency = max_concurrency
+        self.retry_after_seconds = retry_after_seconds
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'completed': 0, 'rate_limited': 0, 'failed': 0, 'peak_in_flight': 0}
+        self.latencies = []
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.create))
+        self.async_client = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=self.create_async)))
+
+    def create(self, model: str, file, response_format: str = "json", **kwargs):
+        audio_seconds = probe_duration_seconds(file.name)
+        over_limit, roll, jitter = self._start_request()
+        try:
+            if self._is_throttled(over_limit, roll):
+                time.sleep(0.05 * self.time_scale)
+                raise self._rate_limit_error()
+            started = time.time()
+            time.sleep(self._latency_seconds(audio_seconds, jitter))
+            return self._respond(audio_seconds, roll, started)
+        finally:
+            self._end_request()
+
+    async def create_async(self, model: str, file, response_format: str = "json", **kwargs):
+        """AsyncOpenAI takes the upload as a (filename, bytes) tuple."""
+        _, audio_bytes = file
+        audio_seconds = await probe_duration_bytes(audio_bytes)
+        over_limit, roll, jitter = self._start_request()
+        try:
+            if self._is_throttled(over_limit, roll):
+                await asyncio.sleep(0.05 * self.time_scale)
+                raise self._rate_limit_error()
+            started = time.time()
+            await asyncio.sleep(self._latency_seconds(audio_seconds, jitter))
+            return self._respond(audio_seconds, roll, started)
+        finally:
+            self._end_request()
+
+    def _start_request(self):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.in_flight += 1
+            self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+            return self.in_flight > self.max_concurrency, self.rng.random(), self.rng.uniform(-self.jitter, self.jitter)
+
+    def _end_request(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _is_throttled(self, over_limit: bool, roll: float) -> bool:
+        if over_limit or roll < self.rate_limit_rate:
+            with self.lock:
+                self.stats['rate_limited'] += 1
+            return True
+        return False
+
+    def _rate_limit_error(self) -> FakeAPIError:
+        return FakeAPIError(429, "Rate limit reached for whisper-1", {'retry-after': str(self.retry_after_seconds * self.time_scale)})
+
+    def _latency_seconds(self, audio_seconds: float, jitter: float) -> float:
+        latency = (self.latency_seconds + self.seconds_per_audio_minute * audio_seconds / 60.0) * (1 + jitter)
+        return max(0.0, latency) * self.time_scale
+
+    def _respond(self, audio_seconds: float, roll: float, started: float) -> Dict:
+        if roll < self.rate_limit_rate + self.failure_rate:
+            with self.lock:
+                self.stats['failed'] += 1
+            raise FakeAPIError(500, "The server had an error while processing your request")
+
+        with self.lock:
+            self.stats['completed'] += 1
+            self.latencies.append(time.time() - started)
+        return build_fake_transcription(audio_seconds)
+
+    def summary(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                'latency_p50_seconds': round(percentile(self.latencies, 0.5), 3),
+                'latency_p95_seconds': round(percentile(self.latencies, 0.95), 3)
+            }
+
+
+def build_fake_transcription(audio_seconds: float, segment_seconds: float = 5.0, words_per_minute: int = 150) -> Dict:
+    """verbose_json-shaped response with one segment every segment_seconds."""
+    segments = []
+    start = 0.0
+    word_number = 0
+    while start < audio_seconds:
+        end = min(audio_seconds, start + segment_seconds)
+        word_count = max(1, int((end - start) * words_per_minute / 60))
+        words = [f"word{word_number + i}" for i in range(word_count)]
+        word_number += word_count
+        segments.append({'start': start, 'end': end, 'text': ' '.join(words) + '.'})
+        start = end
+    return {'text': ' '.join(segment['text'] for segment in segments), 'segments': segments}
+
+
+class FakeLocalWhisper:
+    """
+    faster-whisper WhisperModel stand-in. transcribe() takes 16 kHz PCM and spends
+    1 / speed seconds per second of audio, with at most `workers` calls running at once.
+    """
+
+    def __init__(self, speed: float = 3.0, workers: int = 2, time_scale: float = 1.0):
+        self.speed = speed
+        self.time_scale = time_scale
+        self.replicas = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'audio_seconds': 0.0}
+
+    def transcribe(self, audio, **kwargs):
+        audio_seconds = len(audio) / 16000
+        with self.replicas:
+            time.sleep(audio_seconds / self.speed * self.time_scale)
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['audio_seconds'] = round(self.stats['audio_seconds'] + audio_seconds, 2)
+        segments = [SimpleNamespace(**segment) for segment in build_fake_transcription(audio_seconds)['segments']]
+        return iter(segments), SimpleNamespace(duration=audio_seconds, language='en')
+
+
+class FakeGemini:
+    """google-genai Client stand-in: models.generate_content and generate_content_stream."""
+
+    def __init__(self, latency_seconds: float = 2.0, output_tokens_per_second: float = 150.0,
+                 failure_rate: float = 0.0, time_scale: float = 1.0, seed: int = 0):
+        self.latency_seconds = latency_seconds
+        self.output_tokens_per_second = output_tokens_per_second
+        self.failure_rate = failure_rate
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'streamed': 0, 'failed': 0, 'output_chars': 0}
+        self.latencies = []
+        self.models = SimpleNamespace(
+            generate_content=self.generate_content,
+            generate_content_stream=self.generate_content_stream
+        )
+
+    def build_output(self, contents: str, config) -> str:
+        if getattr(config, 'response_mime_type', None) == 'application/json':
+            return json.dumps({
+                'title': 'Synthetic Lecture',
+                'overview': 'An overview of the synthetic lecture.',
+                'summary': '- Key result: $a^2 + b^2 = c^2$'
+            })
+        transcript = contents.split('THE TRANSCRIPT IS:')[-1]
+        # Roughly one note line per 40 transcript words, capped by the output token budget
+        max_chars = getattr(config, 'max_output_tokens', 8192) * 4
+        lines = ['# Synthetic Lecture', '']
+        for index in range(max(1, len(transcript.split()) // 40)):
+            if index % 10 == 0:
+                lines.extend([f'## Topic {index // 10 + 1}', ''])
+            lines.extend([f'Point {index} relates $x_{{{index}}}$ to frac{{a}}{{b}}.', ''])
+            if index % 25 == 24:
+                lines.extend(['$$', f'\\int_0^{{{index}}} x \\, dx', '$$', ''])
+        return '\n'.join(lines)[:max_chars]
+
+    def simulate(self, contents: str, config) -> str:
+        with self.lock:
+            self.stats['requests'] += 1
+            roll = self.rng.random()
+        if roll < self.failure_rate:
+            with self.lock:
+                self.stats['failed'] += 1
+            raise FakeAPIError(503, "The model is overloaded. Please try again later.")
+        return self.build_output(contents, config)
+
+    def generate_content(self, model: str, contents: str, config=None):
+        started = time.time()
+        text = self.simulate(contents, config)
+        time.sleep((self.latency_seconds + len(text) / 4 / self.output_tokens_per_second) * self.time_scale)
+        with self.lock:
+            self.stats['output_chars'] += len(text)
+            self.latencies.append(time.time() - started)
+        return SimpleNamespace(text=text, candidates=[SimpleNamespace(finish_reason='STOP')])
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        started = time.time()
+        text = self.simulate(contents, config)
+        with self.lock:
+            self.stats['streamed'] += 1
+        time.sleep(self.latency_seconds * self.time_scale)
+        piece_chars = 400
+        for offset in range(0, len(text), piece_chars):
+            piece = text[offset:offset + piece_chars]
+            time.sleep(len(piece) / 4 / self.output_tokens_per_second * self.time_scale)
+            last = offset + piece_chars >= len(text)
+            yield SimpleNamespace(text=piece, candidates=[SimpleNamespace(finish_reason='STOP' if last else None)])
+        with self.lock:
+            self.stats['output_chars'] += len(text)
+            self.latencies.append(time.time() - started)
+
+    def summary(self) -> Dict:
+        with self.lock:
+            return {
+                **self.stats,
+                'latency_p50_seconds': round(percentile(self.latencies, 0.5), 3),
+                'latency_p95_seconds': round(percentile(self.latencies, 0.95), 3)
+            }
+
+
+class InMemorySupabase:
+    """The subset of the supabase-py table API the Lambdas use, backed by lists of dicts."""
+
+    def __init__(self):
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.writes = 0
+
+    def table(self, name: str):
+        return InMemoryQuery(self, name)
+
+    def rows(self, name: str) -> List[Dict]:
+        return self.tables.setdefault(name, [])
+
+
+class InMemoryQuery:
+
+    def __init__(self, db: InMemorySupabase, table_name: str):
+        self.db = db
+        self.table_name = table_name
+        self.operation = 'select'
+        self.columns = '*'
+        self.filters = []
+        self.values = None
+        self.on_conflict = None
+        self.single_row = False
+
+    def select(self, columns: str = '*', **kwargs):
+        self.operation = 'select'
+        self.columns = columns
+        return self
+
+    def insert(self, values, **kwargs):
+        self.operation = 'insert'
+        self.values = values
+        return self
+
+    def update(self, values, **kwargs):
+        self.operation = 'update'
+        self.values = values
+        return self
+
+    def upsert(self, values, on_conflict: str = 'id', **kwargs):
+        self.operation = 'upsert'
+        self.values = values
+        self.on_conflict = on_conflict
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = 'delete'
+        return self
+
+    def eq(self, column: str, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values):
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def is_(self, column: str, value):
+        expected = None if value in (None, 'null') else value
+        self.filters.append(lambda row: row.get(column) is expected)
+        return self
+
+    def or_(self, filters: str):
+        """PostgREST or filter, e.g. "status.is.null,status.in.(pending,failed)"."""
+        conditions = []
+        depth = 0
+        current = ''
+        for character in filters:
+            if character == ',' and depth == 0:
+                conditions.append(current)
+                current = ''
+                continue
+            depth += {'(': 1, ')': -1}.get(character, 0)
+            current += character
+        conditions.append(current)
+
+        checks = []
+        for condition in conditions:
+            column, operator, operand = condition.split('.', 2)
+            if operator == 'is':
+                checks.append(lambda row, column=column: row.get(column) is None)
+            elif operator == 'in':
+                options = operand.strip('()').split(',')
+                checks.append(lambda row, column=column, options=options: row.get(column) in options)
+            elif operator == 'eq':
+                checks.append(lambda row, column=column, operand=operand: str(row.get(column)) == operand)
+            else:
+                raise ValueError(f"Unsupported or_ operator: {operator}")
+        self.filters.append(lambda row: any(check(row) for check in checks))
+        return self
+
+    def maybe_single(self):
+        self.single_row = True
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def limit(self, count: int):
+        return self
+
+    def matches(self, row: Dict) -> bool:
+        return all(check(row) for check in self.filters)
+
+    def project(self, row: Dict) -> Dict:
+        if self.columns.strip() == '*':
+            return dict(row)
+        return {column.strip(): row.get(column.strip()) for column in self.columns.split(',')}
+
+    def execute(self):
+        with self.db.lock:
+            rows = self.db.rows(self.table_name)
+            if self.operation == 'select':
+                data = [self.project(row) for row in rows if self.matches(row)]
+            elif self.operation == 'insert':
+                new_rows = self.values if isinstance(self.values, list) else [self.values]
+                data = []
+                for values in new_rows:
+                    row = {'id': str(uuid.uuid4()), **values}
+                    rows.append(row)
+                    data.append(dict(row))
+            elif self.operation == 'update':
+                data = []
+                for row in rows:
+                    if self.matches(row):
+                        row.update(self.values)
+                        data.append(dict(row))
+            elif self.operation == 'upsert':
+                keys = [key.strip() for key in self.on_conflict.split(',')]
+                new_rows = self.values if isinstance(self.values, list) else [self.values]
+                data = []
+                for values in new_rows:
+                    existing = next((row for row in rows if all(row.get(key) == values.get(key) for key in keys)), None)
+                    if existing is None:
+                        existing = {'id': str(uuid.uuid4())}
+                        rows.append(existing)
+                    existing.update(values)
+                    data.append(dict(existing))
+            else:
+                data = [dict(row) for row in rows if self.matches(row)]
+                rows[:] = [row for row in rows if not self.matches(row)]
+            if self.operation != 'select':
+                self.db.writes += 1
+
+        if self.single_row:
+            data = data[0] if data else None
+        return SimpleNamespace(data=data, count=None)
+
+
+class LocalS3:
+    """S3 client stand-in storing objects as files; presigned URLs are local paths ffmpeg reads directly."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.stats = {'head': 0, 'get': 0, 'put': 0, 'delete': 0, 'download': 0, 'presign': 0}
+
+    def object_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key)
+
+    def add_file(self, bucket: str, key: str, source_path: str):
+        path = self.object_path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            return
+        try:
+            # Hard links keep multi-hour test files from being copied for every run
+            os.link(source_path, path)
+        except OSError:
+            shutil.copy(source_path, path)
+
+    def require(self, bucket: str, key: str) -> str:
+        path = self.object_path(bucket, key)
+        if not os.path.exists(path):
+            raise FakeAPIError(404, f"NoSuchKey: {bucket}/{key}")
+        return path
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        self.stats['head'] += 1
+        path = self.require(Bucket, Key)
+        stat = os.stat(path)
+        return {'ContentLength': stat.st_size, 'ETag': f'"{stat.st_size:x}-{int(stat.st_mtime)}"', 'LastModified': stat.st_mtime}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> Dict:
+        self.stats['get'] += 1
+        path = self.require(Bucket, Key)
+        with open(path, 'rb') as f:
+            body = f.read()
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body=b'', IfNoneMatch: str = None, **kwargs) -> Dict:
+        self.stats['put'] += 1
+        path = self.object_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = Body.encode('utf-8') if isinstance(Body, str) else Body
+        if IfNoneMatch == '*':
+            # Conditional create: exclusive open gives the same one-winner guarantee as S3
+            try:
+                with open(path, 'xb') as f:
+                    f.write(data)
+            except FileExistsError:
+                raise FakeAPIError(412, f"PreconditionFailed: {Bucket}/{Key}")
+        else:
+            with open(path, 'wb') as f:
+                f.write(data)
+        return {'ETag': f'"{uuid.uuid4().hex}"'}
+
+    def delete_objects(self, Bucket: str, Delete: Dict, **kwargs) -> Dict:
+        self.stats['delete'] += 1
+        for entry in Delete['Objects']:
+            path = self.object_path(Bucket, entry['Key'])
+            if os.path.exists(path):
+                os.remove(path)
+        return {}
+
+    def download_file(self, Bucket: str, Key: str, Filename: str, **kwargs):
+        self.stats['download'] += 1
+        shutil.copy(self.require(Bucket, Key), Filename)
+
+    def generate_presigned_url(self, ClientMethod: str, Params: Dict, ExpiresIn: int = 3600, **kwargs) -> str:
+        self.stats['presign'] += 1
+        return self.require(Params['Bucket'], Params['Key'])
+
+
+class RecordingLambda:
+    """Lambda client stand-in that records async invocations so the harness can run them afterwards."""
+
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName: str, InvocationType: str = 'RequestResponse', Payload: str = '{}', **kwargs) -> Dict:
+        self.invocations.append({'function': FunctionName, 'type': InvocationType, 'payload': json.loads(Payload)})
+        return {'StatusCode': 202 if InvocationType == 'Event' else 200}
+
+
+class LocalJobQueue:
+    """
+    SQS stand-in for the transcription queue: receive() returns an SQS-shaped event, and
+    acknowledge() applies the consumer's batchItemFailures. Messages it reports as failed become
+    visible again after the visibility timeout; the rest are deleted. send_message() takes the
+    boto3 arguments the consumer uses to send deferred jobs again.
+    """
+
+    ARN = "arn:aws:sqs:local:000000000000:transcription-jobs"
+
+    def __init__(self, visibility_timeout_seconds: float = 5.0):
+        self.visibility_timeout_seconds = visibility_timeout_seconds
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.stats = {'sent': 0, 'received': 0, 'deleted': 0, 'redelivered': 0}
+
+    def submit(self, payload: Dict) -> str:
+        return self.send_message(QueueUrl=self.ARN, MessageBody=json.dumps(payload))['MessageId']
+
+    def send_message(self, QueueUrl: str, MessageBody: str, DelaySeconds: int = 0, MessageAttributes: Dict = None, **kwargs) -> Dict:
+        message_id = str(uuid.uuid4())
+        now = time.time()
+        with self.lock:
+            self.messages[message_id] = {
+                'body': MessageBody,
+                'attributes': MessageAttributes or {},
+                'sent_at': now,
+                'visible_at': now + DelaySeconds,
+                'receive_count': 0
+            }
+            self.stats['sent'] += 1
+        return {'MessageId': message_id}
+
+    def receive(self, max_messages: int = 10) -> Dict:
+        """Visible messages in send order, hidden until acknowledged or their visibility lapses."""
+        now = time.time()
+        records = []
+        with self.lock:
+            for message_id, message in sorted(self.messages.items(), key=lambda item: item[1]['sent_at']):
+                if len(records) >= max_messages:
+                    break
+                if message['visible_at'] > now:
+                    continue
+                message['visible_at'] = now + self.visibility_timeout_seconds
+                message['receive_count'] += 1
+                self.stats['received'] += 1
+                self.stats['redelivered'] += 1 if message['receive_count'] > 1 else 0
+                records.append({
+                    'messageId': message_id,
+                    'receiptHandle': message_id,
+                    'body': message['body'],
+                    'attributes': {
+                        'ApproximateReceiveCount': str(message['receive_count']),
+                        'SentTimestamp': str(int(message['sent_at'] * 1000))
+                    },
+                    'messageAttributes': {
+                        name: {'dataType': attribute['DataType'], 'stringValue': attribute.get('StringValue')}
+                        for name, attribute in message['attributes'].items()
+                    },
+                    'eventSource': 'aws:sqs',
+                    'eventSourceARN': self.ARN
+                })
+        return {'Records': records}
+
+    def acknowledge(self, event: Dict, response: Dict):
+        failed = {failure['itemIdentifier'] for failure in (response or {}).get('batchItemFailures', [])}
+        with self.lock:
+            for record in event['Records']:
+                if record['messageId'] not in failed and self.messages.pop(record['messageId'], None):
+                    self.stats['deleted'] += 1
+
+    def next_visible_in(self) -> float:
+        """Seconds until the next message is visible, or None when the queue is empty."""
+        with self.lock:
+            if not self.messages:
+                return None
+            return max(0.0, min(message['visible_at'] for message in self.messages.values()) - time.time())
+
+
+# --- Harness ---
+
+def probe_duration_seconds(path: str) -> float:
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', path],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip() or 0)
+
+
+async def probe_duration_bytes(data: bytes) -> float:
+    process = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', '-i', 'pipe:0',
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    stdout, _ = await process.communicate(data)
+    return float(stdout.decode().strip() or 0)
+
+
+def generate_lecture_audio(path: str, duration_seconds: int, bitrate: str = "64k"):
+    """Synthetic speech-like audio: modulated tones with a 1.5s pause every 20s, so silence-aware chunking has real pauses."""
+    if os.path.exists(path):
+        return
+    expression = "0.3*sin(2*PI*(180+40*sin(2*PI*0.2*t))*t)*(0.6+0.4*sin(2*PI*3*t))*gt(mod(t,20),1.5)"
+    subprocess.run([
+        'ffmpeg', '-v', 'error', '-y', '-f', 'lavfi',
+        '-i', f"aevalsrc={expression}:s=16000:d={duration_seconds}",
+        '-ac', '1', '-c:a', 'libmp3lame', '-b:a', bitrate, path
+    ], check=True)
+
+
+def load_lambda_module(path: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def configure_environment(work_dir: str, transcription_mode: str = "single", transcription_engine: str = "threads",
+                          transcription_backend: str = "openai", local_workers: int = 2):
+    """Lambda settings read at import time; must run before the Lambda modules are loaded."""
+    os.environ.setdefault("FFMPEG_PATH", shutil.which("ffmpeg") or "ffmpeg")
+    os.environ.setdefault("FFPROBE_PATH", shutil.which("ffprobe") or "ffprobe")
+    os.environ["TMP_ROOT"] = os.path.join(work_dir, "tmp")
+    os.environ["NOTE_GENERATOR_LAMBDA_ARN"] = NOTE_GENERATOR_ARN
+    os.environ.setdefault("TRANSCRIPT_CACHE_BACKEND", "none")
+    # Checkpoints go to the fake S3, so retries, takeovers and distributed mode can be exercised
+    os.environ.setdefault("JOB_CHECKPOINT_BACKEND", "s3")
+    # Distributed workers run as threads of this process instead of separate Lambda invocations
+    os.environ["TRANSCRIPTION_MODE"] = transcription_mode
+    os.environ["DISTRIBUTED_EXECUTOR"] = "local"
+    os.environ["TRANSCRIPTION_ENGINE"] = transcription_engine
+    os.environ["TRANSCRIPTION_BACKEND"] = transcription_backend
+    os.environ["LOCAL_WHISPER_WORKERS"] = str(local_workers)
+    os.environ.setdefault("QUEUE_DEFER_SECONDS", "1")
+    os.environ.setdefault("QUEUE_HELD_JOB_DELAY_SECONDS", "2")
+    os.makedirs(os.environ["TMP_ROOT"], exist_ok=True)
+
+
+def install_fakes(audio_lambda, notes_lambda, services: Dict):
+    """Put the fakes in the Lambdas' cached client slots so the handlers never build real clients."""
+    audio_lambda._clients.update({
+        's3_client': services['s3'],
+        'lambda_client': services['lambda'],
+        'sqs_client': services['queue'],
+        'supabase': services['supabase'],
+        'openai_client': services['whisper'],
+        'async_openai_client': services['whisper'].async_client,
+        'local_whisper_model': services['local_whisper']
+    })
+    notes_lambda._clients.update({
+        'supabase': services['supabase'],
+        'gemini': services['gemini']
+    })
+
+
+def build_services(args, work_dir: str) -> Dict:
+    return {
+        's3': LocalS3(os.path.join(work_dir, 's3')),
+        'lambda': RecordingLambda(),
+        'queue': LocalJobQueue(),
+        'supabase': InMemorySupabase(),
+        'whisper': FakeWhisper(
+            latency_seconds=args.whisper_latency,
+            seconds_per_audio_minute=args.whisper_seconds_per_minute,
+            rate_limit_rate=args.rate_limit_rate,
+            failure_rate=args.failure_rate,
+            max_concurrency=args.whisper_max_concurrency,
+            time_scale=args.time_scale,
+            seed=args.seed
+        ),
+        'local_whisper': FakeLocalWhisper(
+            speed=args.local_speed,
+            workers=args.local_workers,
+            time_scale=args.time_scale
+        ),
+        'gemini': FakeGemini(
+            latency_seconds=args.gemini_latency,
+            failure_rate=args.gemini_failure_rate,
+            time_scale=args.time_scale,
+            seed=args.seed
+        )
+    }
+
+
+def fake_context(function_name: str):
+    return SimpleNamespace(
+        function_name=function_name,
+        aws_request_id=str(uuid.uuid4()),
+        get_remaining_time_in_millis=lambda: 900000
+    )
+
+
+def parse_body(response: Dict):
+    try:
+        return json.loads(response.get('body', 'null'))
+    except (TypeError, ValueError):
+        return response.get('body')
+
+
+def run_scenario(audio_lambda, notes_lambda, services: Dict, audio_path: str, duration_minutes: float) -> Dict:
+    """Upload one file, run transcription, then the note generation it triggered; return the measurements."""
+    video_id = str(uuid.uuid4())
+    s3_key = f"uploads/{video_id}/{os.path.basename(audio_path)}"
+    services['s3'].add_file(BUCKET, s3_key, audio_path)
+    services['supabase'].table('videos').insert({'id': video_id, 'transcription_status': 'pending'}).execute()
+    invocations_before = len(services['lambda'].invocations)
+
+    started = time.time()
+    transcription_response = audio_lambda.lambda_handler({
+        'bucketName': BUCKET,
+        's3Key': s3_key,
+        'videoId': video_id,
+        'userId': 'load-test-user',
+        'noteFormat': 'Markdown'
+    }, fake_context('transcription'))
+    transcription_seconds = time.time() - started
+
+    notes_seconds = 0.0
+    notes_status = None
+    for invocation in services['lambda'].invocations[invocations_before:]:
+        notes_started = time.time()
+        notes_response = notes_lambda.lambda_handler(invocation['payload'], fake_context('note-generation'))
+        notes_seconds += time.time() - notes_started
+        notes_status = notes_response.get('statusCode')
+
+    video = services['supabase'].table('videos').select('transcription_status').eq('id', video_id).maybe_single().execute().data
+    body = parse_body(transcription_response)
+    media_seconds = duration_minutes * 60
+    total_seconds = transcription_seconds + notes_seconds
+    return {
+        'duration_minutes': duration_minutes,
+        'transcription_status_code': transcription_response.get('statusCode'),
+        'notes_status_code': notes_status,
+        'final_status': video.get('transcription_status') if video else None,
+        'transcription_seconds': round(transcription_seconds, 2),
+        'notes_seconds': round(notes_seconds, 2),
+        'end_to_end_seconds': round(total_seconds, 2),
+        'media_seconds_per_second': round(media_seconds / total_seconds, 1) if total_seconds else None,
+        'chunks': body.get('chunksProcessed') if isinstance(body, dict) else None,
+        'timings': body.get('timings') if isinstance(body, dict) else None,
+        'whisper_metrics': body.get('whisperMetrics') if isinstance(body, dict) else None
+    }
+
+
+def run_queue_scenario(audio_lambda, notes_lambda, services: Dict, uploads: List[Dict]) -> List[Dict]:
+    """
+    Submit every upload to the local queue at once, then drain it through the queue consumer the
+    way one SQS event source would, running note generation as it is triggered. Returns the
+    time from submission to finished notes for each upload.
+    """
+    queue = services['queue']
+    jobs = {}
+    for upload in uploads:
+        video_id = str(uuid.uuid4())
+        s3_key = f"uploads/{video_id}/{os.path.basename(upload['audio_path'])}"
+        services['s3'].add_file(BUCKET, s3_key, upload['audio_path'])
+        services['supabase'].table('videos').insert({'id': video_id, 'transcription_status': 'pending'}).execute()
+        jobs[video_id] = {'duration_minutes': upload['duration_minutes'], 'user_id': upload['user_id'], 'submitted_at': time.time()}
+        queue.submit({'bucketName': BUCKET, 's3Key': s3_key, 'videoId': video_id, 'userId': upload['user_id'], 'noteFormat': 'Markdown'})
+
+    notes_run = 0
+    while True:
+        wait_seconds = queue.next_visible_in()
+        if wait_seconds is None:
+            break
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+            continue
+        event = queue.receive()
+        response = audio_lambda.lambda_handler(event, fake_context('transcription'))
+        queue.acknowledge(event, response)
+
+        for invocation in services['lambda'].invocations[notes_run:]:
+            notes_lambda.lambda_handler(invocation['payload'], fake_context('note-generation'))
+            video_id = invocation['payload']['videoId']
+            jobs[video_id]['time_to_notes_seconds'] = round(time.time() - jobs[video_id]['submitted_at'], 2)
+        notes_run = len(services['lambda'].invocations)
+
+    results = []
+    for video_id, job in jobs.items():
+        video = services['supabase'].table('videos').select('transcription_status').eq('id', video_id).maybe_single().execute().data
+        results.append({**job, 'final_status': video.get('transcription_status') if video else None})
+    return results
+
+
+def summarize_queue_results(results: List[Dict]) -> List[Dict]:
+    summary = []
+    for duration_minutes in sorted({r['duration_minutes'] for r in results}):
+        runs = [r for r in results if r['duration_minutes'] == duration_minutes]
+        times = [r['time_to_notes_seconds'] for r in runs if 'time_to_notes_seconds' in r]
+        summary.append({
+            'duration_minutes': duration_minutes,
+            'jobs': len(runs),
+            'time_to_notes_median_seconds': round(statistics.median(times), 2) if times else None,
+            'time_to_notes_max_seconds': round(max(times), 2) if times else None,
+            'all_completed': all(r['final_status'] == 'completed' for r in runs)
+        })
+    return summary
+
+
+def run_engine_benchmark(audio_lambda, services: Dict, chunk_path: str, chunk_count: int, concurrency: int) -> List[Dict]:
+    """
+    Transcribe the same chunks on the thread pool and on the event loop at a fixed concurrency,
+    reporting wall time, threads and Python heap used by each engine.
+    """
+    duration_seconds = probe_duration_seconds(chunk_path)
+    chunks = [
+        {'index': i, 'path': chunk_path, 'start_seconds': i * duration_seconds, 'end_seconds': (i + 1) * duration_seconds,
+         'duration_seconds': duration_seconds, 'passthrough': True}
+        for i in range(chunk_count)
+    ]
+    engines = {
+        'threads': lambda: audio_lambda.transcribe_chunks_parallel(
+            chunks, services['whisper'], concurrency, audio_lambda.AdaptiveConcurrencyLimiter(concurrency, concurrency)
+        ),
+        'asyncio': lambda: audio_lambda.run_async(audio_lambda.transcribe_chunks_async(
+            chunks, services['whisper'].async_client, audio_lambda.AsyncConcurrencyLimiter(concurrency, concurrency)
+        )).result()
+    }
+
+    results = []
+    for engine, transcribe in engines.items():
+        peak_threads = [threading.active_count()]
+        done = threading.Event()
+
+        def sample_threads():
+            while not done.wait(0.02):
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+        sampler = threading.Thread(target=sample_threads, daemon=True)
+        sampler.start()
+        tracemalloc.start()
+        started = time.time()
+        chunk_results = transcribe()
+        elapsed = time.time() - started
+        _, peak_heap = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        done.set()
+        sampler.join()
+        results.append({
+            'engine': engine,
+            'concurrency': concurrency,
+            'chunks': chunk_count,
+            'succeeded': sum(1 for r in chunk_results if r['success']),
+            'wall_seconds': round(elapsed, 2),
+            'chunks_per_second': round(chunk_count / max(elapsed, 1e-6), 2),
+            'peak_threads': peak_threads[0],
+            'peak_python_heap_mb': round(peak_heap / (1024 * 1024), 2)
+        })
+        print(f"[LOADTEST] {engine} engine, {concurrency} in flight: {results[-1]['wall_seconds']}s for {chunk_count} chunks, "
+              f"{results[-1]['peak_threads']} threads, {results[-1]['peak_python_heap_mb']} MB peak heap")
+    return results
+
+
+def run_load_test(args) -> Dict:
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="lambda_load_test_")
+    os.makedirs(work_dir, exist_ok=True)
+    configure_environment(work_dir, args.transcription_mode, args.engine, args.backend, args.local_workers)
+    random.seed(args.seed)
+
+    audio_lambda = load_lambda_module(AUDIO_LAMBDA_PATH, "audio_trans_lambda")
+    notes_lambda = load_lambda_module(NOTES_LAMBDA_PATH, "note_gen_lambda")
+
+    if args.engine_benchmark:
+        # One short chunk sent many times; only the transcription stage is measured
+        chunk_path = os.path.join(work_dir, "audio", "benchmark_chunk.mp3")
+        os.makedirs(os.path.dirname(chunk_path), exist_ok=True)
+        generate_lecture_audio(chunk_path, 60, bitrate="24k")
+        results = []
+        for concurrency in args.benchmark_concurrency:
+            services = build_services(args, work_dir)
+            install_fakes(audio_lambda, notes_lambda, services)
+            results.extend(run_engine_benchmark(audio_lambda, services, chunk_path, args.benchmark_chunks, concurrency))
+        if not args.keep_work_dir and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return {'config': vars(args), 'summary': results}
+
+    if args.queue:
+        # Every run of every duration is queued at once, from args.users users taking turns
+        uploads = []
+        for duration_minutes in args.durations:
+            audio_path = os.path.join(work_dir, "audio", f"lecture_{duration_minutes:g}min.mp3")
+            os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+            print(f"[LOADTEST] Generating {duration_minutes:g} min of synthetic audio...")
+            generate_lecture_audio(audio_path, int(duration_minutes * 60))
+            for run in range(args.runs):
+                uploads.append({'audio_path': audio_path, 'duration_minutes': duration_minutes, 'user_id': f"user-{len(uploads) % args.users}"})
+        services = build_services(args, work_dir)
+        install_fakes(audio_lambda, notes_lambda, services)
+        results = run_queue_scenario(audio_lambda, notes_lambda, services, uploads)
+        if not args.keep_work_dir and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        return {'config': vars(args), 'summary': summarize_queue_results(results), 'runs': results, 'queue': services['queue'].stats}
+
+    results = []
+    for duration_minutes in args.durations:
+        audio_path = os.path.join(work_dir, "audio", f"lecture_{duration_minutes:g}min.mp3")
+        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        print(f"[LOADTEST] Generating {duration_minutes:g} min of synthetic audio...")
+        generate_lecture_audio(audio_path, int(duration_minutes * 60))
+
+        for run in range(args.runs):
+            # Fresh services per run so stats and rate-limit state do not leak between runs
+            services = build_services(args, work_dir)
+            install_fakes(audio_lambda, notes_lambda, services)
+            print(f"[LOADTEST] {duration_minutes:g} min, run {run + 1}/{args.runs}")
+            result = run_scenario(audio_lambda, notes_lambda, services, audio_path, duration_minutes)
+            result['run'] = run + 1
+            result['whisper'] = services['whisper'].summary()
+            result['local_whisper'] = dict(services['local_whisper'].stats)
+            result['gemini'] = services['gemini'].summary()
+            result['supabase_writes'] = services['supabase'].writes
+            results.append(result)
+            print(
+                f"[LOADTEST] {duration_minutes:g} min: transcription {result['transcription_seconds']}s, "
+                f"notes {result['notes_seconds']}s, {result['media_seconds_per_second']}x realtime, "
+                f"{result['whisper']['requests']} Whisper requests ({result['whisper']['rate_limited']} throttled), "
+                f"status {result['final_status']}"
+            )
+
+    summary = []
+    for duration_minutes in args.durations:
+        runs = [r for r in results if r['duration_minutes'] == duration_minutes]
+        end_to_end = [r['end_to_end_seconds'] for r in runs]
+        summary.append({
+            'duration_minutes': duration_minutes,
+            'runs': len(runs),
+            'end_to_end_median_seconds': round(statistics.median(end_to_end), 2),
+            'end_to_end_max_seconds': round(max(end_to_end), 2),
+            'transcription_median_seconds': round(statistics.median(r['transcription_seconds'] for r in runs), 2),
+            'all_completed': all(r['final_status'] == 'completed' for r in runs)
+        })
+
+    if not args.keep_work_dir and not args.work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {'config': vars(args), 'summary': summary, 'runs': results}
+
+
+def parse_args(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Offline load test for the transcription and note-generation Lambdas")
+    parser.add_argument('--durations', type=lambda value: [float(v) for v in value.split(',')], default=[5, 30, 120, 240],
+                        help="Comma-separated media durations in minutes (default 5,30,120,240)")
+    parser.add_argument('--runs', type=int, default=1, help="Runs per duration")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--time-scale', type=float, default=1.0, help="Multiplier for all simulated latencies")
+    parser.add_argument('--whisper-latency', type=float, default=3.0, help="Base seconds per Whisper request")
+    parser.add_argument('--whisper-seconds-per-minute', type=float, default=0.5, help="Extra Whisper seconds per minute of chunk audio")
+    parser.add_argument('--whisper-max-concurrency', type=int, default=50, help="In-flight requests before the fake returns 429")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fraction of Whisper requests answered with 429")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of Whisper requests answered with 500")
+    parser.add_argument('--gemini-latency', type=float, default=2.0, help="Seconds before Gemini starts answering")
+    parser.add_argument('--gemini-failure-rate', type=float, default=0.0)
+    parser.add_argument('--transcription-mode', choices=['single', 'distributed', 'auto'], default='single',
+                        help="Transcription Lambda mode; distributed workers run in-process")
+    parser.add_argument('--queue', action='store_true',
+                        help="Queue every upload at once and drain them through the SQS consumer; reports time to notes")
+    parser.add_argument('--users', type=int, default=3, help="Users the queued uploads are spread across")
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads', help="Transcription engine of the Lambda")
+    parser.add_argument('--backend', choices=['openai', 'local', 'auto'], default='openai',
+                        help="Speech-to-text backend; 'local' uses a fake CPU model fed with decoded PCM")
+    parser.add_argument('--local-speed', type=float, default=3.0, help="Audio seconds the fake local model transcribes per second per worker")
+    parser.add_argument('--local-workers', type=int, default=2, help="Local model workers")
+    parser.add_argument('--engine-benchmark', action='store_true',
+                        help="Compare the threads and asyncio engines on the transcription stage alone")
+    parser.add_argument('--benchmark-chunks', type=int, default=96, help="Chunks per engine benchmark run")
+    parser.add_argument('--benchmark-concurrency', type=lambda value: [int(v) for v in value.split(',')], default=[8, 32, 64],
+                        help="Comma-separated requests in flight to benchmark (default 8,32,64)")
+    parser.add_argument('--work-dir', help="Directory for generated audio and fake S3 (kept; reuses audio between runs)")
+    parser.add_argument('--keep-work-dir', action='store_true')
+    parser.add_argument('--json', dest='json_path', help="Write the full results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None):
+    args = parse_args(argv)
+    results = run_load_test(args)
+    print(json.dumps(results['summary'], indent=2))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[LOADTEST] Full results written to {args.json_path}")
+
+
+if __name__ == '__main__':
+    main()
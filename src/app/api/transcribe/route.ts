@@ -64,21 +64,11 @@ export async function POST(request: Request) {
     await s3Client.send(uploadCommand);
     console.log(`Audio stream uploaded to S3: ${fileKey}`);
 
-    // Trigger the transcription Lambda function
-    const invokeCommand = new InvokeCommand({
-      FunctionName: transcriptionLambdaFunctionName,
-      InvocationType: 'Event', // Use 'Event' for asynchronous invocation
-      Payload: JSON.stringify({ s3Key: fileKey, bucketName: s3BucketName, videoId: videoId, userId: user.id }), // Pass actual userId
-    });
-
-    await lambdaClient.send(invokeCommand);
-    console.log(`Transcription Lambda function triggered for S3 key: ${fileKey}`);
-
-    // Save initial transcription request status to Supabase
-    // Save initial transcription request status to Supabase
+    // Save initial transcription request status to Supabase before invoking, so the Lambda can
+    // claim the job by moving it from 'pending' to 'in_progress' itself
     const { error } = await supabaseServer
       .from('videos')
-      .update({ transcription_status: 'in_progress', s3_audio_key: fileKey })
+      .update({ transcription_status: 'pending', s3_audio_key: fileKey })
       .eq('id', videoId)
       .eq('user_id', user.id); // Ensure video belongs to the user
 
@@ -90,6 +80,16 @@ export async function POST(request: Request) {
 
     console.log(`Transcription status updated in Supabase for video ${videoId}`);
 
+    // Trigger the transcription Lambda function
+    const invokeCommand = new InvokeCommand({
+      FunctionName: transcriptionLambdaFunctionName,
+      InvocationType: 'Event', // Use 'Event' for asynchronous invocation
+      Payload: JSON.stringify({ s3Key: fileKey, bucketName: s3BucketName, videoId: videoId, userId: user.id }), // Pass actual userId
+    });
+
+    await lambdaClient.send(invokeCommand);
+    console.log(`Transcription Lambda function triggered for S3 key: ${fileKey}`);
+
   } catch (error) {
     console.error('Error processing transcription request:', error);
     return NextResponse.json({ status: 'error', message: 'Failed to process transcription request' }, { status: 500 });
@@ -70,6 +70,8 @@ export default function AnalysisPage() {
 
   // Check if processing is complete (transcription and notes are done)
   const isProcessingComplete = media?.transcription_status === 'completed';
+  // The transcript is saved and the note generator is writing partial notes
+  const isGeneratingNotes = media?.transcription_status === 'generating_notes';
 
   // Set up S3 cleanup hook
   const { manualCleanup } = useS3Cleanup({
@@ -118,9 +120,10 @@ export default function AnalysisPage() {
             filter: `id=eq.${id}`, // Filter for the specific media item ID
           },
           (payload) => {
-            // Check if the transcription status has changed to 'completed'
-            if (payload.new.transcription_status === 'completed') {
-               fetchData(); // Refetch data when status is completed
+            // Refetch once the transcript is saved (to start following the notes) and again when the notes are done
+            const status = payload.new.transcription_status;
+            if (status === 'generating_notes' || status === 'completed') {
+               fetchData();
             }
           }
         )
@@ -133,6 +136,42 @@ export default function AnalysisPage() {
     }
   }, [id, fetchData]); // Removed fetchData from dependency array
 
+  // While notes are being generated, the note generator checkpoints partial notes to the notes row.
+  // Listen for those writes so the notes fill in progressively instead of appearing all at once.
+  // notes rows only carry the transcript id; it is loaded by the refetch when the status moves to
+  // 'generating_notes', and every checkpoint holds the whole note so far, so none are missed.
+  const transcriptId = media?.transcripts?.[0]?.id;
+  useEffect(() => {
+    if (!id || !transcriptId || !isGeneratingNotes) {
+      return;
+    }
+    const channel = supabase
+      .channel(`note_progress_${id}`)
+      .on(
+        'postgres_changes',
+        {
+          event: '*', // The first checkpoint inserts the note, later ones update it
+          schema: 'public',
+          table: 'notes',
+          filter: `transcript_id=eq.${transcriptId}`,
+        },
+        (payload) => {
+          const note = payload.new as Note;
+          if (!note || !note.content) return;
+          setMedia((current) => {
+            if (!current?.transcripts?.length) return current;
+            const [transcript, ...rest] = current.transcripts;
+            return { ...current, transcripts: [{ ...transcript, notes: [note] }, ...rest] };
+          });
+        }
+      )
+      .subscribe();
+
+    return () => {
+      supabase.removeChannel(channel)
+    };
+  }, [id, transcriptId, isGeneratingNotes]);
+
 
   // Format time in MM:SS format
   const formatTime = (time: number) => {
@@ -0,0 +1,29 @@
+"""
+Shared fixtures. The Lambda handlers live in hyphenated files at the repo root, so they are
+loaded by path; the shared modules next to them (lambda_tracing, lambda_queue, ...) import normally.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+
+def load_lambda_module(filename: str, name: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def audio_lambda():
+    return load_lambda_module('lambda_function-audio_trans.py', 'audio_trans_lambda')
+
+
+@pytest.fixture(scope='session')
+def notes_lambda():
+    return load_lambda_module('lambda_function-note_gen.py', 'note_gen_lambda')
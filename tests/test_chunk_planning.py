@@ -0,0 +1,119 @@
+"""
+Chunk window planning: full coverage of the recording, overlaps between windows, cuts placed in
+pauses, and the MAX_CHUNKS cap, which must fail the plan rather than leave the end of the
+recording out. Silence detection is replaced by a fixed list of pauses.
+"""
+import pytest
+
+CHUNK_SECONDS = 480
+OVERLAP_SECONDS = 30
+
+
+def assert_covers(windows, total_seconds):
+    assert windows[0]['start_seconds'] == 0.0
+    assert windows[-1]['end_seconds'] == total_seconds
+    assert [window['index'] for window in windows] == list(range(len(windows)))
+    for previous, window in zip(windows, windows[1:]):
+        assert window['start_seconds'] == previous['end_seconds'] - window['overlap_seconds']
+
+
+def test_fixed_windows_overlap_and_cover_the_recording(audio_lambda):
+    windows = audio_lambda.plan_chunk_windows(3000.0, CHUNK_SECONDS, OVERLAP_SECONDS)
+
+    assert_covers(windows, 3000.0)
+    assert windows[0]['overlap_seconds'] == 0.0
+    assert all(window['overlap_seconds'] == OVERLAP_SECONDS for window in windows[1:])
+    assert all(window['duration_seconds'] <= CHUNK_SECONDS for window in windows)
+
+
+def test_last_window_stops_at_the_end_of_the_recording(audio_lambda):
+    # The second window reaches the end; stepping back by the overlap would only repeat its tail
+    windows = audio_lambda.plan_chunk_windows(900.0, CHUNK_SECONDS, OVERLAP_SECONDS)
+
+    assert [(window['start_seconds'], window['end_seconds']) for window in windows] == [(0.0, 480.0), (450.0, 900.0)]
+
+
+def test_fixed_windows_may_use_exactly_max_chunks(audio_lambda):
+    # Three windows step 450 s each after the first, so they cover 480 + 2 * 450 seconds
+    windows = audio_lambda.plan_chunk_windows(1380.0, CHUNK_SECONDS, OVERLAP_SECONDS, max_chunks=3)
+
+    assert len(windows) == 3
+    assert_covers(windows, 1380.0)
+
+
+def test_fixed_windows_over_the_cap_raise_instead_of_truncating(audio_lambda):
+    with pytest.raises(audio_lambda.ChunkLimitError) as error:
+        audio_lambda.plan_chunk_windows(1381.0, CHUNK_SECONDS, OVERLAP_SECONDS, max_chunks=3)
+
+    assert error.value.max_chunks == 3
+    assert error.value.covered_seconds == 1380.0
+    assert error.value.total_duration_seconds == 1381.0
+
+
+@pytest.fixture
+def pauses(audio_lambda, monkeypatch):
+    """Replace ffmpeg silencedetect with a fixed list of (start, end) pauses in absolute seconds."""
+    found = []
+    searched = []
+
+    def detect_silences(input_path, start_seconds, duration_seconds):
+        searched.append((start_seconds, start_seconds + duration_seconds))
+        return [pause for pause in found if start_seconds <= pause[0] < start_seconds + duration_seconds]
+
+    monkeypatch.setattr(audio_lambda, 'detect_silences', detect_silences)
+    return found, searched
+
+
+def test_cut_falls_in_the_pause_closest_to_the_target(audio_lambda, pauses):
+    found, searched = pauses
+    found.extend([(430.0, 432.0), (470.0, 472.0)])
+
+    windows = audio_lambda.plan_silence_aware_windows('input', 900.0, CHUNK_SECONDS, search_seconds=60)
+
+    assert searched[0] == (420.0, 480.0)
+    assert windows[0]['end_seconds'] == 471.0
+    assert windows[0]['boundary'] == 'silence'
+    # A cut inside a pause needs no overlap
+    assert windows[1]['start_seconds'] == 471.0
+    assert windows[1]['overlap_seconds'] == 0.0
+    assert windows[1]['end_seconds'] == 900.0
+
+
+def test_without_a_pause_the_cut_is_fixed_with_a_small_overlap(audio_lambda, pauses):
+    windows = audio_lambda.plan_silence_aware_windows('input', 900.0, CHUNK_SECONDS, search_seconds=60,
+                                                      fallback_overlap_seconds=5)
+
+    assert windows[0]['end_seconds'] == 480.0
+    assert windows[0]['boundary'] == 'fixed'
+    assert windows[1]['start_seconds'] == 475.0
+    assert windows[1]['overlap_seconds'] == 5
+
+
+def test_failed_silence_detection_falls_back_to_a_fixed_cut(audio_lambda, monkeypatch):
+    def detect_silences(input_path, start_seconds, duration_seconds):
+        raise RuntimeError("ffmpeg silencedetect failed")
+
+    monkeypatch.setattr(audio_lambda, 'detect_silences', detect_silences)
+
+    windows = audio_lambda.plan_silence_aware_windows('input', 900.0, CHUNK_SECONDS)
+
+    assert [window['boundary'] for window in windows] == ['fixed', 'end']
+    assert windows[-1]['end_seconds'] == 900.0
+
+
+def test_short_remainder_joins_the_last_window(audio_lambda, pauses):
+    # Less than MIN_CHUNK_SECONDS past the target, so no search and no tiny final window
+    windows = audio_lambda.plan_silence_aware_windows('input', CHUNK_SECONDS + 5.0, CHUNK_SECONDS)
+
+    assert len(windows) == 1
+    assert windows[0]['end_seconds'] == CHUNK_SECONDS + 5.0
+    assert pauses[1] == []
+
+
+def test_silence_windows_over_the_cap_raise_instead_of_truncating(audio_lambda, pauses):
+    found, _ = pauses
+    found.extend((cut - 1.0, cut + 1.0) for cut in (470.0, 940.0))
+
+    assert len(audio_lambda.plan_silence_aware_windows('input', 1400.0, CHUNK_SECONDS, max_chunks=3)) == 3
+    with pytest.raises(audio_lambda.ChunkLimitError):
+        audio_lambda.plan_silence_aware_windows('input', 1500.0, CHUNK_SECONDS, max_chunks=3)
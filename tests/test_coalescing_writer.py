@@ -0,0 +1,117 @@
+"""
+CoalescingWriter: writes queued for the same row while it is busy merge into one, rows keep the
+order they were first queued in, failures are logged instead of raised, and a video status
+coalesced over a failure does not keep the failure's error message.
+"""
+import threading
+
+import lambda_persistence
+from lambda_persistence import CoalescingWriter
+
+
+class RecordingWrites:
+    """A write function that records what it was asked to write; can hold the writer on a key."""
+
+    def __init__(self, hold_key=None):
+        self.written = []
+        self.hold_key = hold_key
+        self.holding = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, client, key, values):
+        if key == self.hold_key:
+            self.holding.set()
+            self.release.wait(5)
+        self.written.append((key, dict(values)))
+
+
+def busy_writer(writes):
+    """A writer whose thread is blocked on writes.hold_key, so later submits stay pending."""
+    writer = CoalescingWriter(lambda: object(), name='test')
+    writer.submit(writes.hold_key, {'status': 'first'}, writes)
+    assert writes.holding.wait(5)
+    return writer
+
+
+def test_updates_to_a_pending_row_are_merged_into_one_write():
+    writes = RecordingWrites(hold_key='blocker')
+    writer = busy_writer(writes)
+
+    writer.submit('video-1', {'status': 'in_progress'}, writes)
+    writer.submit('video-1', {'progress': 40}, writes)
+    writer.submit('video-1', {'status': 'generating_notes'}, writes)
+    writes.release.set()
+
+    assert writer.flush(5)
+    assert writes.written == [
+        ('blocker', {'status': 'first'}),
+        ('video-1', {'status': 'generating_notes', 'progress': 40}),
+    ]
+    assert writer.stats['submitted'] == 4
+    assert writer.stats['coalesced'] == 2
+    assert writer.stats['written'] == 2
+
+
+def test_rows_are_written_in_the_order_first_queued():
+    writes = RecordingWrites(hold_key='blocker')
+    writer = busy_writer(writes)
+
+    writer.submit('a', {'n': 1}, writes)
+    writer.submit('b', {'n': 1}, writes)
+    writer.submit('a', {'n': 2}, writes)
+    writes.release.set()
+
+    assert writer.flush(5)
+    assert [key for key, _ in writes.written] == ['blocker', 'a', 'b']
+    assert writes.written[1] == ('a', {'n': 2})
+
+
+def test_discarded_write_is_never_sent():
+    writes = RecordingWrites(hold_key='blocker')
+    writer = busy_writer(writes)
+
+    writer.submit('checkpoint', {'content': 'partial'}, writes)
+    writer.discard('checkpoint')
+    writes.release.set()
+
+    assert writer.flush(5)
+    assert [key for key, _ in writes.written] == ['blocker']
+
+
+def test_failed_write_is_counted_and_later_writes_still_run():
+    writes = RecordingWrites()
+    writer = CoalescingWriter(lambda: object(), name='test')
+
+    def failing_write(client, key, values):
+        raise RuntimeError("connection reset")
+
+    writer.submit('bad', {'status': 'failed'}, failing_write)
+    writer.submit('good', {'status': 'completed'}, writes)
+
+    assert writer.flush(5)
+    assert writer.stats['failed'] == 1
+    assert writes.written == [('good', {'status': 'completed'})]
+
+
+def test_flush_times_out_while_a_write_is_stuck():
+    writes = RecordingWrites(hold_key='blocker')
+    writer = busy_writer(writes)
+
+    assert writer.flush(0.1) is False
+
+    writes.release.set()
+    assert writer.flush(5)
+
+
+def test_status_after_a_failure_clears_its_error_message(monkeypatch):
+    writes = RecordingWrites(hold_key='blocker')
+    writer = busy_writer(writes)
+    monkeypatch.setattr(lambda_persistence, '_writer', writer)
+    monkeypatch.setattr(lambda_persistence, 'write_video_update', writes)
+
+    lambda_persistence.queue_video_status(None, 'video-1', 'failed', 'Whisper unavailable')
+    lambda_persistence.queue_video_status(None, 'video-1', 'in_progress')
+    writes.release.set()
+
+    assert writer.flush(5)
+    assert writes.written[1] == (('videos', 'video-1'), {'transcription_status': 'in_progress', 'error_message': None})
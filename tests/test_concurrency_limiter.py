@@ -0,0 +1,198 @@
+"""
+AdaptiveConcurrencyLimiter: additive increase per limit's worth of successes, multiplicative
+decrease on throttles at most once per cooldown, the bounds, and slots blocking at the limit.
+AsyncConcurrencyLimiter: coroutines waiting on an event loop are woken by releases from other
+threads, stay held through a Retry-After pause, and follow limit changes.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+
+def run_requests(limiter, outcomes):
+    for outcome in outcomes:
+        limiter.acquire()
+        limiter.release(outcome)
+
+
+def test_limit_grows_by_one_per_limits_worth_of_successes(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=16)
+
+    run_requests(limiter, ['success'] * 4)
+    assert int(limiter.limit) == 4  # 1/4 + 1/4.x + ... falls just short of a whole request
+
+    run_requests(limiter, ['success'] * 2)
+    assert int(limiter.limit) == 5
+
+
+def test_limit_never_exceeds_max(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=3)
+
+    run_requests(limiter, ['success'] * 50)
+
+    assert limiter.limit == 3.0
+
+
+def test_throttle_halves_the_limit_once_per_cooldown(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=16, decrease_cooldown_seconds=60)
+
+    # A burst of 429s is one congestion event
+    run_requests(limiter, ['throttled'] * 3)
+
+    assert limiter.limit == 4.0
+    snapshot = limiter.snapshot()
+    assert snapshot['throttle_events'] == 3
+    assert snapshot['limit_decreases'] == 1
+    assert snapshot['failures'] == 3
+
+
+def test_throttles_after_the_cooldown_decrease_again_down_to_min(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=16, min_limit=1, decrease_cooldown_seconds=0)
+
+    run_requests(limiter, ['throttled'] * 5)
+
+    assert limiter.limit == 1.0
+    assert limiter.snapshot()['limit_decreases'] == 5
+
+
+def test_errors_neither_grow_nor_shrink_the_limit(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=16)
+
+    run_requests(limiter, ['error'] * 10)
+
+    assert limiter.limit == 4.0
+
+
+def test_acquire_blocks_at_the_limit_until_a_slot_is_released(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=2)
+    limiter.acquire()
+    limiter.acquire()
+    acquired = threading.Event()
+
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.1)
+
+    limiter.release('success')
+    assert acquired.wait(1.0)
+    waiter.join()
+    assert limiter.snapshot()['peak_in_flight'] == 2
+
+
+def test_pause_holds_back_new_requests(audio_lambda):
+    limiter = audio_lambda.AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=4)
+    limiter.pause(0.2)
+
+    started = time.monotonic()
+    limiter.acquire()
+
+    assert time.monotonic() - started >= 0.15
+
+
+@pytest.fixture
+def loop(audio_lambda):
+    """An event loop on its own thread, as the container runs one."""
+    loop = audio_lambda.start_event_loop()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def acquire_async(loop, limiter):
+    return asyncio.run_coroutine_threadsafe(limiter.acquire_async(), loop)
+
+
+def test_async_waiter_is_woken_by_a_release_from_another_thread(audio_lambda, loop):
+    limiter = audio_lambda.AsyncConcurrencyLimiter(initial_limit=1, max_limit=1)
+    acquire_async(loop, limiter).result(1.0)
+
+    waiter = acquire_async(loop, limiter)
+    time.sleep(0.1)
+    assert not waiter.done()
+
+    threading.Thread(target=limiter.release, args=('success',)).start()
+    waiter.result(1.0)
+    assert limiter.in_flight == 1
+
+
+def test_each_release_lets_one_async_waiter_in(audio_lambda, loop):
+    limiter = audio_lambda.AsyncConcurrencyLimiter(initial_limit=2, max_limit=2)
+    limiter.acquire()
+    limiter.acquire()
+    waiters = [acquire_async(loop, limiter) for _ in range(3)]
+    time.sleep(0.1)
+
+    limiter.release('error')
+    time.sleep(0.1)
+    assert sum(waiter.done() for waiter in waiters) == 1
+
+    limiter.release('error')
+    time.sleep(0.1)
+    assert sum(waiter.done() for waiter in waiters) == 2
+    assert limiter.snapshot()['peak_in_flight'] == 2
+    for waiter in waiters:
+        waiter.cancel()
+
+
+def test_thread_and_coroutine_waiters_share_the_limit(audio_lambda, loop):
+    limiter = audio_lambda.AsyncConcurrencyLimiter(initial_limit=1, max_limit=1)
+    limiter.acquire()
+    thread_acquired = threading.Event()
+    thread_waiter = threading.Thread(target=lambda: (limiter.acquire(), thread_acquired.set()))
+    thread_waiter.start()
+    coroutine_waiter = acquire_async(loop, limiter)
+    time.sleep(0.1)
+
+    limiter.release('error')
+    time.sleep(0.1)
+    assert thread_acquired.is_set() != coroutine_waiter.done()
+
+    limiter.release('error')
+    assert thread_acquired.wait(1.0)
+    coroutine_waiter.result(1.0)
+    thread_waiter.join()
+
+
+def test_release_during_a_pause_does_not_let_waiters_in_early(audio_lambda, loop):
+    limiter = audio_lambda.AsyncConcurrencyLimiter(initial_limit=1, max_limit=1)
+    limiter.acquire()
+    waiter = acquire_async(loop, limiter)
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    limiter.pause(0.3)
+    limiter.release('throttled')
+    time.sleep(0.1)
+    assert not waiter.done()
+
+    waiter.result(1.0)
+    assert time.monotonic() - started >= 0.25
+
+
+def test_async_waiters_follow_a_lowered_limit(audio_lambda, loop):
+    limiter = audio_lambda.AsyncConcurrencyLimiter(initial_limit=4, max_limit=4, decrease_cooldown_seconds=0)
+    for _ in range(3):
+        limiter.acquire()
+
+    limiter.release('throttled')  # limit 4 -> 2 with 2 requests still in flight
+    waiter = acquire_async(loop, limiter)
+    time.sleep(0.1)
+    assert not waiter.done()
+
+    limiter.release('error')
+    waiter.result(1.0)
+    assert limiter.in_flight == 2
+
+
+def test_async_waiter_gets_a_slot_the_raised_limit_adds(audio_lambda, loop):
+    limiter = audio_lambda.AsyncConcurrencyLimiter(initial_limit=1, max_limit=2)
+    acquire_async(loop, limiter).result(1.0)
+    waiters = [acquire_async(loop, limiter) for _ in range(2)]
+    time.sleep(0.1)
+
+    # One success at limit 1 raises it to 2: the freed slot and the new one both go to waiters
+    limiter.release('success')
+    for waiter in waiters:
+        waiter.result(1.0)
+    assert limiter.in_flight == 2
@@ -0,0 +1,164 @@
+"""
+Distributed transcription with DISTRIBUTED_EXECUTOR=local and a SQLite checkpoint store: shards
+cover every window once, only the last worker to report merges, and a shard with a failed chunk
+leaves the video failed with no merged transcript until a retry re-runs just that shard.
+ffmpeg and Whisper are replaced by a pipeline that returns one segment per chunk.
+"""
+import threading
+
+import pytest
+
+FILE_INFO = {'ETag': '"abc123"', 'ContentLength': 1024}
+DURATION_SECONDS = 3000.0
+PAYLOAD = {'bucketName': 'uploads', 's3Key': 'lecture.mp4', 'videoId': 'video-1', 'userId': 'user-1', 'jobId': 'job-1'}
+
+
+class FakeJob:
+    """Records what the workers transcribed, the transcripts saved and the status updates."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.transcribed = []
+        self.failing = set()
+        self.saved = []
+        self.statuses = []
+
+    def run_chunk_pipeline(self, input_path, windows, total_chunks, openai_client, encode_workers, limiter,
+                           timings, pipeline_start, cache=None, workspace=None, checkpoint=None, backend=None):
+        results = []
+        for window in windows:
+            with self.lock:
+                self.transcribed.append(window['index'])
+            if window['index'] in self.failing:
+                results.append({'index': window['index'], 'success': False, 'text': '', 'error': 'HTTP 500'})
+                continue
+            # One segment just past the overlap, so merging keeps exactly one copy of it
+            start = window.get('overlap_seconds', 0.0) + 1.0
+            text = f"chunk{window['index']}"
+            result = {**window, 'success': True, 'text': text, 'segments': [{'start': start, 'end': start + 1.0, 'text': text}]}
+            checkpoint.save_result(result)
+            results.append(result)
+        return windows, results
+
+    def save_transcript_and_trigger_notes(self, supabase, video_id, user_id, note_format, merged_transcript, tracer):
+        with self.lock:
+            self.saved.append(merged_transcript)
+        return True
+
+    def update_video_status(self, video_id, status, error_message=None):
+        with self.lock:
+            self.statuses.append((status, error_message))
+
+
+@pytest.fixture
+def job(audio_lambda, monkeypatch, tmp_path):
+    fake = FakeJob()
+    monkeypatch.setattr(audio_lambda, 'DISTRIBUTED_EXECUTOR', 'local')
+    monkeypatch.setattr(audio_lambda, 'DISTRIBUTED_CHUNKS_PER_WORKER', 2)
+    monkeypatch.setattr(audio_lambda, 'CHUNK_BOUNDARY_MODE', 'fixed')
+    monkeypatch.setattr(audio_lambda, 'JOB_CHECKPOINT_BACKEND', 'sqlite')
+    monkeypatch.setattr(audio_lambda, 'JOB_CHECKPOINT_SQLITE_PATH', str(tmp_path / 'checkpoints.sqlite3'))
+    monkeypatch.setattr(audio_lambda, '_sqlite_job_checkpoint_store', None)
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPT_CACHE_BACKEND', 'none')
+    monkeypatch.setattr(audio_lambda, 'TMP_ROOT', str(tmp_path))
+    monkeypatch.setattr(audio_lambda, 'presign_source', lambda bucket, key: f"https://{bucket}.example/{key}")
+    monkeypatch.setattr(audio_lambda, 'get_openai_client', lambda: None)
+    monkeypatch.setattr(audio_lambda, 'get_supabase', lambda: None)
+    monkeypatch.setattr(audio_lambda, 'run_chunk_pipeline', fake.run_chunk_pipeline)
+    monkeypatch.setattr(audio_lambda, 'save_transcript_and_trigger_notes', fake.save_transcript_and_trigger_notes)
+    monkeypatch.setattr(audio_lambda, 'update_video_status', fake.update_video_status)
+    return fake
+
+
+def new_checkpoint(audio_lambda, owner='coordinator'):
+    store = audio_lambda.get_job_checkpoint_store('uploads')
+    checkpoint = audio_lambda.JobCheckpoint(store, 'video-1', audio_lambda.build_job_fingerprint(FILE_INFO, 'openai'), owner)
+    checkpoint.load()
+    return checkpoint
+
+
+def start(audio_lambda, checkpoint):
+    tracer = audio_lambda.JobTracer('transcription', 'job-1', VideoId='video-1')
+    return audio_lambda.start_distributed_transcription(
+        PAYLOAD, 'https://uploads.example/lecture.mp4', DURATION_SECONDS, checkpoint, None, tracer, None
+    )
+
+
+def test_shards_are_contiguous_and_cover_every_window_once(audio_lambda):
+    windows = audio_lambda.plan_chunk_windows(DURATION_SECONDS, 480, 30)
+
+    shards = audio_lambda.build_shards(windows, 3)
+
+    assert [index for shard in shards for index in shard] == [window['index'] for window in windows]
+    assert all(len(shard) == 3 for shard in shards[:-1])
+    assert 0 < len(shards[-1]) <= 3
+
+
+def test_workers_transcribe_every_window_once_and_one_merges(audio_lambda, job):
+    checkpoint = new_checkpoint(audio_lambda)
+
+    response = start(audio_lambda, checkpoint)
+
+    windows = checkpoint.windows
+    assert response['statusCode'] == 202
+    assert sorted(job.transcribed) == [window['index'] for window in windows]
+    assert len(job.saved) == 1
+    assert job.saved[0]['text'] == ' '.join(f"chunk{window['index']}" for window in windows)
+    # The transcript is saved, so the checkpoint is gone
+    assert checkpoint.store.read('video-1', 'manifest') is None
+
+
+def test_only_the_last_shard_to_report_merges(audio_lambda, job):
+    checkpoint = new_checkpoint(audio_lambda)
+    windows = audio_lambda.plan_chunk_windows(DURATION_SECONDS, 480, 30)
+    shards = audio_lambda.build_shards(windows, 2)
+    checkpoint.start(windows, shards)
+    for window in windows:
+        checkpoint.save_result({**window, 'success': True, 'text': 'words', 'segments': []})
+    tracer = audio_lambda.JobTracer('transcription_worker', 'job-1', VideoId='video-1')
+
+    for shard in range(len(shards) - 1):
+        checkpoint.store.write('video-1', checkpoint.shard_name(shard), {'failed': []})
+        assert audio_lambda.finish_distributed_job(PAYLOAD, checkpoint, None, tracer) is False
+    checkpoint.store.write('video-1', checkpoint.shard_name(len(shards) - 1), {'failed': []})
+
+    # Workers that finish together all see every report; the merge lock lets one through
+    merged = []
+    barrier = threading.Barrier(4)
+
+    def finish():
+        worker_checkpoint = new_checkpoint(audio_lambda, owner=f'worker-{threading.get_ident()}')
+        barrier.wait()
+        merged.append(audio_lambda.finish_distributed_job(PAYLOAD, worker_checkpoint, None, tracer))
+
+    threads = [threading.Thread(target=finish) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(merged) == [False, False, False, True]
+    assert len(job.saved) == 1
+
+
+def test_failed_shard_leaves_no_merged_transcript_until_retried(audio_lambda, job):
+    job.failing = {3}
+    checkpoint = new_checkpoint(audio_lambda)
+
+    start(audio_lambda, checkpoint)
+
+    assert job.saved == []
+    assert job.statuses[-1][0] == 'failed'
+    assert checkpoint.store.read('video-1', 'manifest') is not None
+
+    # A retried coordinator runs only the shard holding chunk 3; the others' chunks are reused
+    job.failing = set()
+    job.transcribed = []
+    retry = new_checkpoint(audio_lambda, owner='coordinator-retry')
+    assert [2, 3] in retry.shards
+
+    start(audio_lambda, retry)
+
+    assert sorted(job.transcribed) == [3]
+    assert len(job.saved) == 1
+    assert job.saved[0]['text'] == ' '.join(f"chunk{window['index']}" for window in retry.windows)
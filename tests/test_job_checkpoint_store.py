@@ -0,0 +1,137 @@
+"""
+Job checkpoint stores: create-if-absent (SQLite INSERT OR IGNORE, S3 IfNoneMatch), missing records,
+and the lease rules that decide when an invocation may take over a job that is in progress.
+"""
+import threading
+import time
+
+import pytest
+
+
+class S3Error(Exception):
+    """Shaped like botocore's ClientError: the code is in response['Error']['Code']."""
+
+    def __init__(self, code, status_code):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status_code}}
+
+
+class FakeS3:
+    """The calls S3JobCheckpointStore makes, with S3's conditional-write behaviour."""
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.put_calls = []
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise S3Error('NoSuchKey', 404)
+        body = self.objects[(Bucket, Key)]
+        return {'Body': type('Body', (), {'read': lambda self: body})()}
+
+    def put_object(self, Bucket, Key, Body, IfNoneMatch=None, **kwargs):
+        with self.lock:
+            self.put_calls.append({'Key': Key, 'IfNoneMatch': IfNoneMatch})
+            if IfNoneMatch == '*' and (Bucket, Key) in self.objects:
+                raise S3Error('PreconditionFailed', 412)
+            self.objects[(Bucket, Key)] = Body
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        with self.lock:
+            for item in Delete['Objects']:
+                self.objects.pop((Bucket, item['Key']), None)
+        return {}
+
+
+@pytest.fixture
+def fake_s3(audio_lambda, monkeypatch):
+    client = FakeS3()
+    monkeypatch.setitem(audio_lambda._clients, 's3_client', client)
+    return client
+
+
+@pytest.fixture(params=['sqlite', 's3'])
+def store(request, audio_lambda, tmp_path):
+    if request.param == 'sqlite':
+        return audio_lambda.SQLiteJobCheckpointStore(str(tmp_path / 'checkpoints.sqlite3'))
+    request.getfixturevalue('fake_s3')
+    return audio_lambda.S3JobCheckpointStore('uploads', 'transcription-checkpoints/')
+
+
+def test_missing_record_reads_as_none(store):
+    assert store.read('video-1', 'manifest') is None
+
+
+def test_write_read_and_delete(store):
+    store.write('video-1', 'chunk-0', {'text': 'first'})
+    store.write('video-1', 'chunk-0', {'text': 'second'})
+    assert store.read('video-1', 'chunk-0') == {'text': 'second'}
+
+    store.delete('video-1', ['chunk-0'])
+    assert store.read('video-1', 'chunk-0') is None
+
+
+def test_create_succeeds_only_when_the_record_is_absent(store):
+    assert store.create('video-1', 'merge-lock', {'owner': 'a'}) is True
+    assert store.create('video-1', 'merge-lock', {'owner': 'b'}) is False
+    assert store.read('video-1', 'merge-lock') == {'owner': 'a'}
+
+
+def test_exactly_one_concurrent_create_wins(store):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def create(owner):
+        barrier.wait()
+        results.append(store.create('video-1', 'merge-lock', {'owner': owner}))
+
+    threads = [threading.Thread(target=create, args=(f'worker-{i}',)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 7 + [True]
+
+
+def test_s3_create_is_a_conditional_put(audio_lambda, fake_s3):
+    store = audio_lambda.S3JobCheckpointStore('uploads', 'transcription-checkpoints/')
+
+    store.create('video-1', 'merge-lock', {'owner': 'a'})
+
+    assert fake_s3.put_calls == [{'Key': 'transcription-checkpoints/video-1/merge-lock.json', 'IfNoneMatch': '*'}]
+
+
+def test_s3_create_reports_other_errors_as_not_created(audio_lambda, fake_s3, monkeypatch):
+    def put_object(**kwargs):
+        raise S3Error('AccessDenied', 403)
+
+    monkeypatch.setattr(fake_s3, 'put_object', put_object)
+    store = audio_lambda.S3JobCheckpointStore('uploads', 'transcription-checkpoints/')
+
+    assert store.create('video-1', 'merge-lock', {'owner': 'a'}) is False
+
+
+def test_no_lease_means_no_takeover(audio_lambda, store):
+    assert audio_lambda.can_take_over_job(store, 'video-1', 'request-1') is False
+
+
+def test_lease_holder_may_resume_its_own_job(audio_lambda, store):
+    audio_lambda.renew_job_lease(store, 'video-1', 'request-1')
+
+    assert audio_lambda.can_take_over_job(store, 'video-1', 'request-1') is True
+
+
+def test_fresh_lease_of_another_invocation_blocks_takeover(audio_lambda, store):
+    audio_lambda.renew_job_lease(store, 'video-1', 'request-1')
+
+    assert audio_lambda.can_take_over_job(store, 'video-1', 'request-2') is False
+
+
+def test_stale_lease_of_another_invocation_allows_takeover(audio_lambda, store):
+    stale = time.time() - audio_lambda.JOB_LEASE_SECONDS - 1
+    store.write('video-1', 'lease', {'owner': 'request-1', 'renewed_at': stale})
+
+    assert audio_lambda.can_take_over_job(store, 'video-1', 'request-2') is True
@@ -0,0 +1,148 @@
+"""
+Golden outputs, tokenizer cases, fuzzing and scaling checks for post_process_latex_content.
+
+The fuzzer mixes every delimiter form, unbalanced on purpose. Each sample is timed at two sizes,
+and a slowdown well beyond the size ratio is reported as superlinear (a ReDoS-style path).
+The timing checks are marked slow and only run with -m slow.
+"""
+import random
+import time
+
+import pytest
+
+FUZZ_TOKENS = [
+    '$', '$$', '\\[', '\\]', '\\(', '\\)', '```', '`', '\n', '\n\n', ' ', '\\', '\\$', '\\\\',
+    '\\begin{align}', '\\end{align}', '\\begin{equation}', '\\end{equation}', '\\text{pi}',
+    '{', '}', '&', '#', '5', 'x', 'frac', 'sin', 'word'
+]
+
+# (name, input, expected output)
+GOLDEN_CASES = [
+    ('inline spacing and missing backslashes',
+     "For functions$u$and $v$ the limit $lim_{x \\to 0} frac{sin x}{x} = 1$ holds.",
+     "For functions $u$ and $v$ the limit $\\lim_{x \\to 0} \\frac{\\sin x}{x} = 1$ holds."),
+    ('display math keeps existing commands',
+     "We have $$ \\int u \\, dv = uv - \\int v \\, du $$ here.",
+     "We have $$\\int u \\, dv = uv - \\int v \\, du$$ here."),
+    ('bracket delimiters',
+     "\\[ sum_{n=1}^{infty} frac{1}{n^2} \\]\n\nText \\( alpha + beta \\) end",
+     "$$\\sum_{n=1}^{\\infty} \\frac{1}{n^2}$$\n\nText $\\alpha + \\beta$ end"),
+    ('double-escaped brackets',
+     "\\\\[ x^2 \\\\]",
+     "$$x^2$$"),
+    ('align environment',
+     "\\begin{align} a &= b \\\\ c &= d \\end{align}",
+     "$$\\begin{aligned}a &= b \\\\ c &= d\\end{aligned}$$"),
+    ('equation environment',
+     "\\begin{equation*} E = mc^2 \\end{equation*}",
+     "$$E = mc^2$$"),
+    ('currency and escaped dollars are not math',
+     "Price $5 and $10. Escaped \\$3.",
+     "Price $5 and $10. Escaped \\$3."),
+    ('currency before inline math',
+     "Price is $5, but $x$ is var",
+     "Price is $5, but $x$ is var"),
+    ('dollars padded with spaces are not math',
+     "It costs $ 5 or $ 6 today",
+     "It costs $ 5 or $ 6 today"),
+    ('code is left untouched',
+     "```python\nx = '$a$' + frac\n```\n\nUse `$PATH` and $frac{1}{2}$.",
+     "```python\nx = '$a$' + frac\n```\n\nUse `$PATH` and $\\frac{1}{2}$."),
+    ('text arguments and longer commands',
+     "$\\arcsin x$ and $\\text{the pi value}$",
+     "$\\arcsin x$ and $\\text{the pi value}$"),
+    ('stray backslashes',
+     "$\\ x + 1$ and $$\\ y \\$$",
+     "$x + 1$ and $$y$$"),
+    ('document commands and blank lines',
+     "\\documentclass{article}\n\\usepackage{amsmath}\n\\begin{document}\n# Notes\n\n\n\nBody\n\\end{document}",
+     "# Notes\n\nBody"),
+    ('unclosed delimiters',
+     "Cost \\[ x and \\( y and $$ z",
+     "Cost \\[ x and \\( y and $$ z"),
+]
+
+# (input, [(token kind, captured text)]) for LATEX_TOKEN_PATTERN
+TOKEN_CASES = [
+    ("```py\nx = '$a$'\n```", [('code_block', "```py\nx = '$a$'\n```")]),
+    ("Use `$PATH` here", [('inline_code', "`$PATH`")]),
+    ("Escaped \\$3", [('escaped_dollar', "\\$")]),
+    ("$$ a + b $$", [('display', " a + b ")]),
+    ("\\[ a \\] and \\\\[ b \\\\]", [('bracket_display', " a "), ('bracket_display', " b ")]),
+    ("\\begin{align*} a &= b \\end{align*}", [('env_body', " a &= b ")]),
+    ("\\( a \\)", [('paren_inline', " a ")]),
+    ("$x$ and $y + 1$", [('inline', "x"), ('inline', "y + 1")]),
+    ("Price is $5, but $x$ is var", [('inline', "x")]),
+    ("From $5 to $10", []),
+    ("It costs $ 5 or $ 6 today", []),
+    ("$x$5", []),
+    ("Cost \\[ x and \\( y and $$ z", []),
+    # An unclosed environment cannot swallow the next one
+    ("\\begin{align} a \\begin{align} b \\end{align}", [('env_body', " b ")]),
+]
+
+CORPUS_SIZES = [1024, 10 * 1024, 100 * 1024, 1024 * 1024]
+
+
+def build_sample(target_chars: int) -> str:
+    """Math-dense synthetic notes of about target_chars, including unbalanced delimiters."""
+    paragraph = (
+        "## Integration by parts\n\n"
+        "For functions$u$and $v$ we have $$ \\int u \\, dv = uv - \\int v \\, du $$ and the limit "
+        "$lim_{x \\to 0} frac{sin x}{x} = 1$ holds. A price of $5 is not math, nor is \\$10.\n\n"
+        "\\[ sum_{n=1}^{infty} frac{1}{n^2} = frac{pi^2}{6} \\]\n\n"
+        "\\begin{align} a &= b + c \\\\ d &= e \\end{align}\n\n"
+        "```python\nprice = '$x$'\n```\n\n"
+    )
+    return (paragraph * (target_chars // len(paragraph) + 1))[:target_chars]
+
+
+def best_time(function, content: str, repeats: int = 3) -> float:
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function(content)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@pytest.mark.parametrize('source, expected', [case[1:] for case in GOLDEN_CASES], ids=[case[0] for case in GOLDEN_CASES])
+def test_golden_output(notes_lambda, source, expected):
+    actual = notes_lambda.post_process_latex_content(source)
+    assert actual == expected
+    # Well-formed notes come out unchanged when processed again; checkpoints rely on it
+    assert notes_lambda.post_process_latex_content(actual) == actual
+
+
+@pytest.mark.parametrize('source, expected', TOKEN_CASES)
+def test_token_pattern_classifies_delimiters(notes_lambda, source, expected):
+    tokens = [(match.lastgroup, match.group(match.lastgroup)) for match in notes_lambda.LATEX_TOKEN_PATTERN.finditer(source)]
+    assert tokens == expected
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize('seed', range(4))
+def test_fuzzed_input_is_handled_in_linear_time(notes_lambda, seed, iterations=50, base_chars=20000, growth=4, max_growth_ratio=8.0):
+    rng = random.Random(seed)
+    superlinear = []
+    for _ in range(iterations):
+        unit = ''.join(rng.choice(FUZZ_TOKENS) for _ in range(rng.randint(1, 40)))
+        small = (unit * (base_chars // len(unit) + 1))[:base_chars]
+        large = (unit * (base_chars * growth // len(unit) + 1))[:base_chars * growth]
+        small_seconds = best_time(notes_lambda.post_process_latex_content, small)
+        large_seconds = best_time(notes_lambda.post_process_latex_content, large)
+        # Ignore noise on inputs that are fast at both sizes
+        if large_seconds > 0.01 and large_seconds / max(small_seconds, 1e-6) > max_growth_ratio:
+            superlinear.append((unit, round(small_seconds, 4), round(large_seconds, 4)))
+    assert superlinear == []
+
+
+@pytest.mark.slow
+def test_corpus_scales_linearly(notes_lambda):
+    """Time per KB stays roughly flat from 1 KB to 1 MB of notes."""
+    us_per_kb = [
+        best_time(notes_lambda.post_process_latex_content, build_sample(size)) * 1e6 / (size / 1024)
+        for size in CORPUS_SIZES
+    ]
+    assert us_per_kb[-1] < us_per_kb[0] * 4, us_per_kb
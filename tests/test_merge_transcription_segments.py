@@ -0,0 +1,85 @@
+"""
+merge_transcription_segments: overlap de-duplication by segment midpoint, absolute timestamps,
+failed chunks and the word-alignment fallback for chunks without timestamps.
+"""
+
+
+def chunk_result(index, start_seconds, end_seconds, segments=None, text=None, overlap_seconds=0.0, success=True):
+    if text is None:
+        text = " ".join(seg['text'] for seg in segments or [])
+    return {
+        'index': index,
+        'success': success,
+        'text': text,
+        'segments': segments,
+        'start_seconds': start_seconds,
+        'end_seconds': end_seconds,
+        'overlap_seconds': overlap_seconds,
+    }
+
+
+def segment(start, end, text):
+    return {'start': start, 'end': end, 'text': text}
+
+
+def test_no_results_gives_empty_transcript(audio_lambda):
+    assert audio_lambda.merge_transcription_segments([]) == {'text': "", 'segments': []}
+
+
+def test_overlap_is_split_at_its_midpoint(audio_lambda):
+    # Chunk 1 starts 10 s before chunk 0 ends, so the cut is at 55 s: beta is kept from chunk 0,
+    # gamma from chunk 1
+    first = chunk_result(0, 0.0, 60.0, [segment(0, 10, "alpha"), segment(50, 54, "beta"), segment(56, 60, "gamma")])
+    second = chunk_result(1, 50.0, 110.0, [segment(0, 4, "beta"), segment(6, 10, "gamma"), segment(10, 20, "delta")],
+                          overlap_seconds=10.0)
+
+    merged = audio_lambda.merge_transcription_segments([first, second])
+
+    assert merged['text'] == "alpha beta gamma delta"
+    assert merged['segments'] == [
+        {'start': 0, 'end': 10, 'text': "alpha"},
+        {'start': 50, 'end': 54, 'text': "beta"},
+        {'start': 56.0, 'end': 60.0, 'text': "gamma"},
+        {'start': 60.0, 'end': 70.0, 'text': "delta"},
+    ]
+
+
+def test_results_are_merged_in_time_order(audio_lambda):
+    later = chunk_result(1, 60.0, 120.0, [segment(0, 5, "second")])
+    earlier = chunk_result(0, 0.0, 60.0, [segment(0, 5, "first")])
+
+    merged = audio_lambda.merge_transcription_segments([later, earlier])
+
+    assert merged['text'] == "first second"
+    assert [seg['start'] for seg in merged['segments']] == [0, 60.0]
+
+
+def test_failed_chunk_keeps_its_placeholder_but_no_segments(audio_lambda):
+    ok = chunk_result(0, 0.0, 60.0, [segment(0, 5, "hello")])
+    failed = chunk_result(1, 55.0, 120.0, text="[Error transcribing chunk 2: timeout]", overlap_seconds=5.0, success=False)
+    after = chunk_result(2, 115.0, 180.0, [segment(5, 10, "again")], overlap_seconds=5.0)
+
+    merged = audio_lambda.merge_transcription_segments([ok, failed, after])
+
+    assert merged['text'] == "hello [Error transcribing chunk 2: timeout] again"
+    assert [seg['text'] for seg in merged['segments']] == ["hello", "again"]
+
+
+def test_untimed_chunk_drops_words_repeated_from_the_overlap(audio_lambda):
+    first = chunk_result(0, 0.0, 60.0, text="we start with the chain rule for derivatives")
+    second = chunk_result(1, 50.0, 110.0, text="the chain rule for derivatives says more", overlap_seconds=10.0)
+
+    merged = audio_lambda.merge_transcription_segments([first, second])
+
+    assert merged['text'] == "we start with the chain rule for derivatives says more"
+    assert merged['segments'] == []
+
+
+def test_short_accidental_match_is_not_treated_as_overlap(audio_lambda):
+    # Two shared words is below MIN_ALIGNMENT_WORDS, so nothing is dropped
+    first = chunk_result(0, 0.0, 60.0, text="this is the end")
+    second = chunk_result(1, 50.0, 110.0, text="the end of one topic", overlap_seconds=10.0)
+
+    merged = audio_lambda.merge_transcription_segments([first, second])
+
+    assert merged['text'] == "this is the end the end of one topic"
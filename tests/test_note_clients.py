@@ -0,0 +1,44 @@
+"""
+Note generation clients: built once per container even when several section threads ask for one
+at the same moment, and reused afterwards.
+"""
+import threading
+import time
+
+
+def test_concurrent_first_use_builds_one_client(notes_lambda, monkeypatch):
+    built = []
+
+    def create_gemini_client():
+        time.sleep(0.05)  # long enough for every thread to find the cache empty
+        built.append(object())
+        return built[-1]
+
+    monkeypatch.setattr(notes_lambda, '_clients', {})
+    monkeypatch.setattr(notes_lambda, 'create_gemini_client', create_gemini_client)
+    barrier = threading.Barrier(8)
+    clients = []
+
+    def get_client():
+        barrier.wait()
+        clients.append(notes_lambda.get_gemini_client())
+
+    threads = [threading.Thread(target=get_client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert all(client is built[0] for client in clients)
+    assert 'gemini' in notes_lambda.INIT_TIMINGS
+
+
+def test_clients_are_cached_by_name(notes_lambda, monkeypatch):
+    monkeypatch.setattr(notes_lambda, '_clients', {})
+    monkeypatch.setattr(notes_lambda, 'create_supabase_client', lambda: 'supabase')
+    monkeypatch.setattr(notes_lambda, 'create_gemini_client', lambda: 'gemini')
+
+    assert notes_lambda.get_supabase() == 'supabase'
+    assert notes_lambda.get_gemini_client() == 'gemini'
+    assert notes_lambda.get_supabase() is notes_lambda.get_supabase()
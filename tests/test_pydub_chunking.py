@@ -0,0 +1,64 @@
+"""
+The pydub chunking fallback: every window is exported, and a chunk that cannot be exported part
+way through fails the job instead of returning chunks that stop short of the end of the recording.
+"""
+import pytest
+
+DURATION_MS = 30 * 60 * 1000
+
+
+class FakeAudio:
+    """Stands in for a decoded AudioSegment; export fails for the slice starting at fail_at_ms."""
+
+    def __init__(self, length_ms, start_ms=0, fail_at_ms=None):
+        self.length_ms = length_ms
+        self.start_ms = start_ms
+        self.fail_at_ms = fail_at_ms
+
+    def __len__(self):
+        return self.length_ms
+
+    def __getitem__(self, window):
+        end_ms = min(window.stop, self.start_ms + self.length_ms)
+        return FakeAudio(end_ms - window.start, window.start, self.fail_at_ms)
+
+    def export(self, path, format, bitrate):
+        if self.start_ms == self.fail_at_ms:
+            raise OSError("No space left on device")
+        with open(path, 'wb') as output:
+            output.write(b'\0' * 1024)
+
+
+@pytest.fixture
+def decode_as(audio_lambda, monkeypatch):
+    def decode_as(audio):
+        segment = type('AudioSegment', (), {'from_file': staticmethod(lambda path: audio)})
+        monkeypatch.setattr(audio_lambda, 'get_audio_segment', lambda: segment)
+    return decode_as
+
+
+def test_every_window_is_exported(audio_lambda, decode_as, tmp_path):
+    decode_as(FakeAudio(DURATION_MS))
+    with audio_lambda.TempWorkspace('video-1', 100, str(tmp_path)) as workspace:
+        chunks = audio_lambda.create_audio_chunks_pydub('source.mp3', 8, 30, workspace)
+
+    assert chunks[-1]['end_seconds'] == DURATION_MS / 1000
+    assert [chunk['index'] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_failed_export_after_the_first_chunk_raises(audio_lambda, decode_as, tmp_path):
+    windows = audio_lambda.plan_chunk_windows(DURATION_MS / 1000, 8 * 60, 30)
+    decode_as(FakeAudio(DURATION_MS, fail_at_ms=int(windows[2]['start_seconds'] * 1000)))
+    with audio_lambda.TempWorkspace('video-1', 100, str(tmp_path)) as workspace:
+        with pytest.raises(audio_lambda.ChunkCreationError) as error:
+            audio_lambda.create_audio_chunks_pydub('source.mp3', 8, 30, workspace)
+
+    assert error.value.chunk_index == 2
+
+
+def test_failed_first_export_falls_back_to_the_whole_file(audio_lambda, decode_as, monkeypatch):
+    decode_as(FakeAudio(DURATION_MS, fail_at_ms=0))
+    fallback = [{'index': 0, 'path': 'source.mp3'}]
+    monkeypatch.setattr(audio_lambda, 'create_single_chunk_fallback', lambda path: fallback)
+
+    assert audio_lambda.create_audio_chunks_pydub('source.mp3', 8, 30) is fallback
@@ -0,0 +1,114 @@
+"""
+SQS batch scheduling: shortest-first with users taking turns, aging so long jobs cannot starve,
+and which messages are re-sent, reported as failures or left to be deleted.
+"""
+import json
+import time
+
+import lambda_queue
+
+
+def make_record(message_id, user_id, sent_seconds_ago=0.0, now=None, **payload):
+    sent_ms = int(((now or time.time()) - sent_seconds_ago) * 1000)
+    return {
+        'messageId': message_id,
+        'receiptHandle': message_id,
+        'body': json.dumps({'userId': user_id, 'videoId': message_id, **payload}),
+        'attributes': {'SentTimestamp': str(sent_ms)},
+        'messageAttributes': {},
+        'eventSourceARN': 'arn:aws:sqs:us-east-1:000000000000:transcription-jobs',
+    }
+
+
+def make_job(message_id, user_id, estimated_seconds, waited_seconds=0.0, now=1_000_000.0):
+    job = lambda_queue.QueuedJob(make_record(message_id, user_id, waited_seconds, now), now)
+    job.estimated_seconds = estimated_seconds
+    return job
+
+
+def ids(jobs):
+    return [job.message_id for job in jobs]
+
+
+def test_users_take_turns_shortest_first():
+    jobs = [
+        make_job('a-long', 'a', 3600),
+        make_job('a-short', 'a', 60),
+        make_job('a-mid', 'a', 600),
+        make_job('b-mid', 'b', 300),
+        make_job('c-long', 'c', 7200),
+    ]
+
+    # Round one is every user's shortest job, itself ordered shortest first; then their next ones
+    assert ids(lambda_queue.order_jobs(jobs)) == ['a-short', 'b-mid', 'c-long', 'a-mid', 'a-long']
+
+
+def test_one_user_with_many_uploads_cannot_crowd_out_another():
+    jobs = [make_job(f'a-{i}', 'a', 60) for i in range(5)] + [make_job('b-0', 'b', 1200)]
+
+    assert ids(lambda_queue.order_jobs(jobs))[:2] == ['a-0', 'b-0']
+
+
+def test_waiting_discounts_a_long_jobs_effective_length(monkeypatch):
+    monkeypatch.setattr(lambda_queue, 'QUEUE_AGING_SECONDS', 600.0)
+    fresh_short = make_job('short', 'a', 600)
+    old_long = make_job('long', 'b', 3600, waited_seconds=3600)
+
+    # 3600 s of media that has waited six aging periods counts as 3600 / 7 seconds
+    assert abs(old_long.effective_seconds() - 3600 / 7) < 1.0
+    assert ids(lambda_queue.order_jobs([fresh_short, old_long])) == ['long', 'short']
+
+
+def test_unknown_length_counts_as_a_short_job():
+    job = make_job('unknown', 'a', None)
+
+    assert job.effective_seconds() == lambda_queue.QUEUE_SHORT_JOB_MINUTES * 60
+    assert not job.is_long
+
+
+def test_requeue_keeps_the_first_send_time_for_aging():
+    record = make_record('m1', 'a', sent_seconds_ago=900)
+    fields = lambda_queue.requeue_message_fields(record)
+    first_sent = fields['MessageAttributes'][lambda_queue.FIRST_SENT_ATTRIBUTE]['StringValue']
+
+    # As SQS would deliver the re-sent message: a new SentTimestamp, the attribute carried along
+    redelivered = make_record('m2', 'a')
+    redelivered['body'] = fields['MessageBody']
+    redelivered['messageAttributes'] = {
+        name: {'dataType': value['DataType'], 'stringValue': value['StringValue']}
+        for name, value in fields['MessageAttributes'].items()
+    }
+
+    assert first_sent == record['attributes']['SentTimestamp']
+    assert lambda_queue.QueuedJob(redelivered).waited_seconds >= 899
+
+
+def test_only_failed_jobs_are_reported_and_the_rest_are_sent_again(monkeypatch):
+    monkeypatch.setattr(lambda_queue, 'QUEUE_MAX_JOBS_PER_USER', 1)
+    statuses = {'ok': 200, 'bad': 500, 'held': 409}
+    records = [make_record('ok', 'a'), make_record('over-limit', 'a'), make_record('bad', 'b'), make_record('held', 'c')]
+    requeued = []
+
+    response = lambda_queue.process_queue_batch(
+        {'Records': records}, None,
+        handle_job=lambda payload: {'statusCode': statuses[payload['videoId']]},
+        requeue=lambda record, delay_seconds: requeued.append((record['messageId'], delay_seconds))
+    )
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'bad'}]}
+    assert sorted(requeued) == [('held', min(lambda_queue.QUEUE_HELD_JOB_DELAY_SECONDS, 900)),
+                                ('over-limit', lambda_queue.QUEUE_DEFER_SECONDS)]
+
+
+def test_jobs_that_could_not_be_sent_again_are_redelivered(monkeypatch):
+    monkeypatch.setattr(lambda_queue, 'QUEUE_MAX_JOBS_PER_USER', 1)
+    records = [make_record('first', 'a'), make_record('second', 'a')]
+
+    def requeue(record, delay_seconds):
+        raise RuntimeError("SendMessage denied")
+
+    response = lambda_queue.process_queue_batch(
+        {'Records': records}, None, handle_job=lambda payload: {'statusCode': 200}, requeue=requeue
+    )
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'second'}]}
@@ -0,0 +1,83 @@
+"""
+Map-reduce note generation without Gemini: cohesion scores across block gaps, topic-following
+section cuts, transcripts that end in a long unpunctuated stretch, and the stitch fallback.
+"""
+import json
+
+import pytest
+
+ASTRONOMY = "The telescope gathers starlight and the mirror focuses starlight onto the camera sensor."
+COOKING = "The oven bakes bread while the dough rises and the flour absorbs butter and sugar."
+
+
+def sentences(template, count):
+    return ' '.join(f"{template} Point {i}." for i in range(count))
+
+
+def test_cohesion_is_lowest_at_the_topic_shift(notes_lambda):
+    blocks = [ASTRONOMY, ASTRONOMY, ASTRONOMY, COOKING, COOKING, COOKING]
+
+    scores = notes_lambda.score_block_gaps(blocks, window=2)
+
+    assert len(scores) == len(blocks) - 1
+    assert scores.index(min(scores)) == 2  # the gap between block 2 and block 3
+    assert scores[2] < 0.2 < scores[0]
+
+
+def test_short_transcript_is_one_section(notes_lambda):
+    transcript = sentences(ASTRONOMY, 5)
+
+    assert notes_lambda.split_transcript_into_sections(transcript, 1000, 500, 1500) == [transcript]
+
+
+def test_sections_cover_the_transcript_within_the_limits(notes_lambda):
+    transcript = sentences(ASTRONOMY, 60) + ' ' + sentences(COOKING, 60)
+
+    sections = notes_lambda.split_transcript_into_sections(transcript, 2000, 1000, 3000)
+
+    assert len(sections) > 1
+    assert ' '.join(sections).split() == transcript.split()
+    assert all(len(section) <= 3000 for section in sections[:-1])
+
+
+def test_unpunctuated_tail_longer_than_max_chars_is_cut_at_spaces(notes_lambda):
+    # The last cohesion block is one "sentence" far longer than max_chars; this used to loop forever
+    tail = ' '.join(f"phrase {i} without stops" for i in range(600))
+    transcript = sentences(ASTRONOMY, 40) + ' ' + tail
+
+    sections = notes_lambda.split_transcript_into_sections(transcript, 2000, 1000, 3000)
+
+    assert ' '.join(sections).split() == transcript.split()
+    assert all(0 < len(section) <= 3000 for section in sections)
+
+
+def test_split_at_spaces_never_exceeds_the_limit(notes_lambda):
+    pieces = notes_lambda.split_at_spaces("aaaa bbbb cccc " + "x" * 25, 10)
+
+    assert pieces == ["aaaa bbbb", "cccc", "x" * 10, "x" * 10, "x" * 5]
+
+
+def test_stitch_wraps_sections_in_the_generated_frame(notes_lambda, monkeypatch):
+    frame = {'title': '# Optics', 'overview': 'How telescopes work.', 'summary': 'Mirrors focus light.'}
+    monkeypatch.setattr(notes_lambda, 'generate_with_gemini', lambda *args, **kwargs: json.dumps(frame))
+
+    notes = notes_lambda.stitch_section_notes(["## Mirrors\n\nText.", "## Lenses\n\nMore.\n"])
+
+    assert notes == (
+        "# Optics\n\n## Overview\n\nHow telescopes work.\n\n## Mirrors\n\nText.\n\n"
+        "## Lenses\n\nMore.\n\n## Summary\n\nMirrors focus light."
+    )
+
+
+@pytest.mark.parametrize('stitch_output', [RuntimeError("Gemini unavailable"), "not json"])
+def test_stitch_failure_keeps_the_section_notes(notes_lambda, monkeypatch, stitch_output):
+    def generate_with_gemini(*args, **kwargs):
+        if isinstance(stitch_output, Exception):
+            raise stitch_output
+        return stitch_output
+
+    monkeypatch.setattr(notes_lambda, 'generate_with_gemini', generate_with_gemini)
+
+    notes = notes_lambda.stitch_section_notes(["## Mirrors\n\nText."])
+
+    assert notes == "# Lecture Notes\n\n## Mirrors\n\nText."
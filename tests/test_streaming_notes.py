@@ -0,0 +1,131 @@
+"""
+Streamed notes: finished Markdown blocks are cut only outside code fences and $$ display math,
+flush() hands back the unfinished tail, and partial-note checkpoints are throttled to one per
+NOTE_CHECKPOINT_INTERVAL_SECONDS with the latest content winning.
+"""
+import pytest
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class RecordingWriter:
+    """Stands in for the shared CoalescingWriter; keeps what was submitted and discarded."""
+
+    def __init__(self):
+        self.submitted = []
+        self.discarded = []
+        self.flushes = 0
+
+    def submit(self, key, values, write):
+        self.submitted.append(values['content'])
+
+    def discard(self, key):
+        self.discarded.append(key)
+
+    def flush(self, timeout=None):
+        self.flushes += 1
+        return True
+
+
+def feed_all(buffer, pieces):
+    blocks = []
+    for piece in pieces:
+        blocks.extend(buffer.feed(piece))
+    return blocks
+
+
+def test_blocks_end_at_blank_lines(notes_lambda):
+    buffer = notes_lambda.MarkdownBlockBuffer()
+
+    blocks = feed_all(buffer, ["# Title\n\nFirst para", "graph.\n", "\nSecond"])
+
+    assert blocks == ["# Title", "First paragraph."]
+    assert buffer.flush() == ["Second"]
+    assert buffer.flush() == []
+
+
+@pytest.mark.parametrize('opening, body, closing', [
+    ("```python\n", "x = 1\n\ny = 2\n", "```"),
+    ("$$\n", "a = b\n\n+ c\n", "$$"),
+])
+def test_no_block_is_cut_inside_a_fence_or_display_math(notes_lambda, opening, body, closing):
+    buffer = notes_lambda.MarkdownBlockBuffer()
+
+    # Streamed a character at a time, so every blank line inside is seen while the block is open
+    blocks = feed_all(buffer, list("Intro.\n\n" + opening + body + closing + "\n\nAfter."))
+
+    assert blocks == ["Intro.", opening + body + closing]
+    assert buffer.flush() == ["After."]
+
+
+def test_dollars_inside_code_do_not_open_display_math(notes_lambda):
+    buffer = notes_lambda.MarkdownBlockBuffer()
+
+    blocks = buffer.feed("```\necho $$\n```\n\nNext.\n\n")
+
+    assert blocks == ["```\necho $$\n```", "Next."]
+
+
+def test_flush_returns_an_unclosed_fence_as_the_tail(notes_lambda):
+    buffer = notes_lambda.MarkdownBlockBuffer()
+
+    assert buffer.feed("```\ncode\n\nmore code") == []
+    assert buffer.flush() == ["```\ncode\n\nmore code"]
+
+
+@pytest.fixture
+def checkpoints(notes_lambda, monkeypatch):
+    """A NoteCheckpointWriter on a fake clock, recording what it queues."""
+    clock = FakeClock()
+    recorder = RecordingWriter()
+    monkeypatch.setattr(notes_lambda, 'time', clock)
+    monkeypatch.setattr(notes_lambda, 'get_writer', lambda get_client: recorder)
+    writer = notes_lambda.NoteCheckpointWriter(None, 'transcript-1', 'user-1')
+    return writer, recorder, clock
+
+
+def test_checkpoints_are_throttled_to_the_interval(notes_lambda, checkpoints):
+    writer, recorder, clock = checkpoints
+    interval = notes_lambda.NOTE_CHECKPOINT_INTERVAL_SECONDS
+
+    writer.checkpoint("one")
+    clock.now += interval / 3
+    writer.checkpoint("one two")
+    clock.now += interval / 3
+    writer.checkpoint("one two three")
+    assert recorder.submitted == ["one"]
+
+    clock.now += interval
+    writer.checkpoint("one two three four")
+    assert recorder.submitted == ["one", "one two three four"]
+    assert writer.writes == 2
+
+
+def test_unchanged_content_is_not_queued_again(checkpoints):
+    writer, recorder, clock = checkpoints
+
+    writer.checkpoint("one")
+    clock.now += 60
+    writer.checkpoint("one")
+
+    assert recorder.submitted == ["one"]
+
+
+def test_close_drops_the_throttled_checkpoint(checkpoints):
+    writer, recorder, clock = checkpoints
+
+    writer.checkpoint("one")
+    writer.checkpoint("one two")
+    writer.close()
+
+    assert recorder.submitted == ["one"]
+    assert recorder.discarded == [('notes', 'transcript-1')]
+    assert recorder.flushes == 1
+    writer.flush()
+    assert recorder.submitted == ["one"]
@@ -0,0 +1,48 @@
+"""
+compute_target_bitrate_kbps: the largest bitrate that fits a recording into the upload budget,
+clamped to each codec's speech range, and for MP3 snapped down to a rate MPEG-2 Layer III allows.
+"""
+import pytest
+
+TARGET_MB = 24.0
+
+
+def fits_budget(audio_lambda, bitrate_kbps, duration_seconds):
+    return bitrate_kbps * 1000 * duration_seconds <= TARGET_MB * 1024 * 1024 * 8 * audio_lambda.BITRATE_HEADROOM_RATIO
+
+
+@pytest.mark.parametrize('duration_seconds', [2 * 3600, 3 * 3600, 4.5 * 3600])
+def test_opus_uses_the_largest_bitrate_that_fits(audio_lambda, duration_seconds):
+    bitrate_kbps = audio_lambda.compute_target_bitrate_kbps(duration_seconds, TARGET_MB, 'opus')
+
+    assert fits_budget(audio_lambda, bitrate_kbps, duration_seconds)
+    assert not fits_budget(audio_lambda, bitrate_kbps + 1, duration_seconds)
+
+
+@pytest.mark.parametrize('duration_seconds, expected', [
+    (3600, 48),      # 53 kbps would fit; 48 is the next allowed rate below it
+    (2 * 3600, 24),  # 26 kbps
+    (60, 96),        # capped at the codec's speech maximum
+])
+def test_mp3_snaps_down_to_a_standard_rate(audio_lambda, duration_seconds, expected):
+    bitrate_kbps = audio_lambda.compute_target_bitrate_kbps(duration_seconds, TARGET_MB, 'mp3')
+
+    assert bitrate_kbps == expected
+    assert bitrate_kbps in audio_lambda.MP3_16KHZ_BITRATES_KBPS
+    assert fits_budget(audio_lambda, bitrate_kbps, duration_seconds)
+
+
+def test_short_recording_is_capped_at_the_opus_maximum(audio_lambda):
+    assert audio_lambda.compute_target_bitrate_kbps(60, TARGET_MB, 'opus') == audio_lambda.AUDIO_CODECS['opus']['max_kbps']
+
+
+def test_zero_duration_is_treated_as_one_second(audio_lambda):
+    assert audio_lambda.compute_target_bitrate_kbps(0, TARGET_MB, 'opus') == audio_lambda.AUDIO_CODECS['opus']['max_kbps']
+
+
+@pytest.mark.parametrize('codec', ['opus', 'mp3'])
+def test_very_long_recording_drops_to_the_floor(audio_lambda, codec):
+    # 20 hours would need about 2.7 kbps to fit; speech is not encoded below the codec's minimum
+    bitrate_kbps = audio_lambda.compute_target_bitrate_kbps(20 * 3600, TARGET_MB, codec)
+
+    assert bitrate_kbps == audio_lambda.AUDIO_CODECS[codec]['min_kbps'] == 8
@@ -0,0 +1,118 @@
+"""
+TempWorkspace: reserve/track/release accounting against the disk budget, writers blocking until
+space is freed or timing out, files that can never fit, cleanup after a failure, and the sweep of
+workspaces left behind by dead invocations.
+"""
+import os
+import threading
+import time
+
+import pytest
+
+KB = 1 / 1024  # budgets are given in MB
+
+
+def write_file(workspace, name, nbytes):
+    path = workspace.file_path(name)
+    with open(path, 'wb') as output:
+        output.write(b'\0' * nbytes)
+    return path
+
+
+@pytest.fixture
+def workspace(audio_lambda, tmp_path):
+    with audio_lambda.TempWorkspace('video-1', 4 * KB, str(tmp_path)) as workspace:
+        yield workspace
+
+
+def test_reservation_is_swapped_for_the_written_size(workspace):
+    workspace.reserve(3000)
+    assert workspace.used_bytes() == 3000
+
+    path = write_file(workspace, 'chunk_000.mp3', 1000)
+    workspace.track(path, reserved_bytes=3000)
+    assert workspace.used_bytes() == 1000
+
+    workspace.release(path)
+    assert workspace.used_bytes() == 0
+    assert not os.path.exists(path)
+    assert workspace.peak_bytes == 1000
+
+
+def test_unreserve_returns_space_that_was_never_written(workspace):
+    workspace.reserve(4096)
+    workspace.unreserve(4096)
+
+    workspace.reserve(4096)
+    assert workspace.used_bytes() == 4096
+
+
+def test_reserve_blocks_until_a_file_is_released(workspace):
+    path = write_file(workspace, 'chunk_000.mp3', 3000)
+    workspace.track(path)
+    reserved = threading.Event()
+
+    writer = threading.Thread(target=lambda: (workspace.reserve(2000, timeout=5), reserved.set()))
+    writer.start()
+    assert not reserved.wait(0.1)
+
+    workspace.release(path)
+    assert reserved.wait(1.0)
+    writer.join()
+    assert workspace.used_bytes() == 2000
+
+
+def test_reserve_times_out_while_the_budget_stays_used(workspace):
+    workspace.reserve(3000)
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="Timed out"):
+        workspace.reserve(2000, timeout=0.1)
+    assert time.monotonic() - started >= 0.1
+    assert workspace.used_bytes() == 3000
+
+
+def test_file_larger_than_the_budget_is_rejected_without_waiting(workspace):
+    assert workspace.fits(4096)
+    assert not workspace.fits(4097)
+
+    with pytest.raises(RuntimeError, match="exceeds"):
+        workspace.reserve(4097, timeout=60)
+
+
+def test_directory_is_removed_after_an_exception(audio_lambda, tmp_path):
+    with pytest.raises(ValueError):
+        with audio_lambda.TempWorkspace('video-1', 4 * KB, str(tmp_path)) as workspace:
+            # An untracked file is removed along with the directory
+            write_file(workspace, 'partial.mp3', 100)
+            raise ValueError("encode failed")
+
+    assert not os.path.exists(workspace.path)
+    assert workspace.used_bytes() == 0
+
+
+def test_job_id_cannot_escape_the_root(audio_lambda, tmp_path):
+    with audio_lambda.TempWorkspace('../../etc/passwd', 4 * KB, str(tmp_path)) as workspace:
+        assert os.path.dirname(workspace.path) == str(tmp_path)
+        assert os.path.dirname(workspace.file_path('../escape.mp3')) == workspace.path
+
+
+def test_sweep_removes_only_stale_workspaces(audio_lambda, tmp_path):
+    stale = tmp_path / f"{audio_lambda.WORKSPACE_PREFIX}old_1"
+    fresh = tmp_path / f"{audio_lambda.WORKSPACE_PREFIX}new_1"
+    unrelated = tmp_path / 'other_old'
+    for directory in (stale, fresh, unrelated):
+        directory.mkdir()
+    old = time.time() - audio_lambda.STALE_WORKSPACE_SECONDS - 60
+    os.utime(stale, (old, old))
+    os.utime(unrelated, (old, old))
+
+    audio_lambda.sweep_stale_workspaces(str(tmp_path))
+
+    assert not stale.exists()
+    assert fresh.exists()
+    assert unrelated.exists()
+
+
+def test_sweep_of_a_missing_root_is_only_logged(audio_lambda, tmp_path):
+    audio_lambda.sweep_stale_workspaces(str(tmp_path / 'missing'))
@@ -0,0 +1,149 @@
+"""
+Transcript cache: versioned keys and hit/miss counters, chunk transcripts served from the cache,
+media keys from the ETag or the object's bytes, and the rule that only a transcript whose every
+chunk succeeded is stored for identical media.
+"""
+import hashlib
+
+import pytest
+
+FILE_INFO = {'ETag': '"abc123"', 'ContentLength': 1024}
+
+
+class FakeBody:
+    def __init__(self, data):
+        self.data = data
+
+    def iter_chunks(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+
+class FakeS3:
+    """get_object for build_media_cache_key's sha256 mode; records the keys it was asked for."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.get_calls = []
+
+    def get_object(self, Bucket, Key):
+        self.get_calls.append(Key)
+        return {'Body': FakeBody(self.objects[Key])}
+
+
+@pytest.fixture
+def cache(audio_lambda, tmp_path):
+    return audio_lambda.SQLiteTranscriptCache(str(tmp_path / 'transcripts.sqlite3'))
+
+
+@pytest.fixture
+def chunk(tmp_path):
+    path = tmp_path / 'chunk_000.mp3'
+    path.write_bytes(b'chunk audio')
+    return {'index': 0, 'path': str(path), 'start_seconds': 0.0, 'end_seconds': 480.0}
+
+
+def test_miss_then_hit(cache):
+    assert cache.get('abc', 'chunk') is None
+
+    cache.put('abc', 'chunk', {'text': 'hello', 'segments': []})
+
+    assert cache.get('abc', 'chunk') == {'text': 'hello', 'segments': []}
+    assert cache.stats == {'media_hits': 0, 'media_misses': 0, 'chunk_hits': 1, 'chunk_misses': 1, 'errors': 0}
+
+
+def test_kinds_and_versions_do_not_share_entries(audio_lambda, cache, monkeypatch):
+    cache.put('abc', 'chunk', {'text': 'hello'})
+
+    assert cache.get('abc', 'media') is None
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPT_CACHE_VERSION', 'v2-whisper-1')
+    assert cache.get('abc', 'chunk') is None
+
+
+def test_read_failure_counts_as_an_error_and_a_miss(cache, monkeypatch):
+    def failing_read(key):
+        raise OSError("database is locked")
+
+    monkeypatch.setattr(cache, '_read', failing_read)
+
+    assert cache.get('abc', 'media') is None
+    assert cache.stats['errors'] == 1
+    assert cache.stats['media_misses'] == 1
+
+
+def test_sqlite_cache_is_reused_with_fresh_counters(audio_lambda, monkeypatch, tmp_path):
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPT_CACHE_BACKEND', 'sqlite')
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPT_CACHE_SQLITE_PATH', str(tmp_path / 'transcripts.sqlite3'))
+    monkeypatch.setattr(audio_lambda, '_sqlite_transcript_cache', None)
+
+    first = audio_lambda.get_transcript_cache('uploads')
+    first.get('abc', 'chunk')
+    second = audio_lambda.get_transcript_cache('uploads')
+
+    assert second is first
+    assert second.stats['chunk_misses'] == 0
+
+
+def test_chunk_is_transcribed_once_then_served_from_the_cache(audio_lambda, cache, chunk, monkeypatch):
+    requests = []
+
+    def transcribe_single_chunk(chunk_info, openai_client, chunk_number, total_chunks, limiter=None):
+        requests.append(chunk_info['index'])
+        return audio_lambda.build_chunk_result(chunk_info, 'hello world', [{'start': 0.0, 'end': 1.0, 'text': 'hello world'}])
+
+    monkeypatch.setattr(audio_lambda, 'transcribe_single_chunk', transcribe_single_chunk)
+
+    first = audio_lambda.transcribe_chunk_cached(chunk, None, 1, 1, cache=cache)
+    second = audio_lambda.transcribe_chunk_cached(chunk, None, 1, 1, cache=cache)
+
+    assert requests == [0]
+    assert second['cached'] is True
+    assert second['text'] == first['text'] and second['segments'] == first['segments']
+    assert (cache.stats['chunk_hits'], cache.stats['chunk_misses']) == (1, 1)
+
+
+def test_failed_chunk_is_not_cached(audio_lambda, cache, chunk, monkeypatch):
+    def transcribe_single_chunk(chunk_info, openai_client, chunk_number, total_chunks, limiter=None):
+        return {'index': 0, 'success': False, 'text': '[Error transcribing chunk 1]'}
+
+    monkeypatch.setattr(audio_lambda, 'transcribe_single_chunk', transcribe_single_chunk)
+
+    audio_lambda.transcribe_chunk_cached(chunk, None, 1, 1, cache=cache)
+
+    assert cache.get(audio_lambda.compute_file_sha256(chunk['path']), 'chunk') is None
+
+
+def test_etag_key_needs_no_read_of_the_object(audio_lambda, monkeypatch):
+    s3 = FakeS3({})
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPT_CACHE_HASH_MODE', 'etag')
+    monkeypatch.setitem(audio_lambda._clients, 's3_client', s3)
+
+    assert audio_lambda.build_media_cache_key('uploads', 'video.mp4', FILE_INFO) == 'etag-abc123-1024'
+    assert s3.get_calls == []
+
+
+def test_sha256_key_hashes_the_object_bytes(audio_lambda, monkeypatch):
+    data = b'\x01' * (3 * 1024 * 1024 + 17)
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPT_CACHE_HASH_MODE', 'sha256')
+    monkeypatch.setitem(audio_lambda._clients, 's3_client', FakeS3({'video.mp4': data}))
+
+    key = audio_lambda.build_media_cache_key('uploads', 'video.mp4', FILE_INFO)
+
+    assert key == f"sha256-{hashlib.sha256(data).hexdigest()}"
+
+
+def results(*successes):
+    return [{'index': index, 'success': success} for index, success in enumerate(successes)]
+
+
+@pytest.mark.parametrize('chunk_results, backend_name, stored', [
+    (results(True, True, True), 'openai', True),
+    (results(True, False, True), 'openai', False),
+    ([], 'openai', False),
+    (results(True, True), 'local', False),
+])
+def test_media_transcript_is_stored_only_when_complete(audio_lambda, cache, chunk_results, backend_name, stored):
+    transcript = {'text': 'hello world', 'segments': []}
+
+    assert audio_lambda.cache_media_transcript(cache, 'etag-abc123-1024', chunk_results, transcript, backend_name) is stored
+    assert (cache.get('etag-abc123-1024', 'media') is not None) is stored
@@ -0,0 +1,110 @@
+"""
+Choosing the speech-to-text backend: the TRANSCRIPTION_BACKEND setting, the 'auto' latency estimate,
+the back-off after a failed local model load, and job checkpoints that never mix two models' chunks.
+"""
+import pytest
+
+FILE_INFO = {'ETag': '"abc123"', 'ContentLength': 1024}
+
+
+@pytest.fixture
+def local_capable(audio_lambda, monkeypatch, tmp_path):
+    """Settings under which the local backend is allowed: ffmpeg present, ffmpeg chunking."""
+    ffmpeg = tmp_path / 'ffmpeg'
+    ffmpeg.write_bytes(b'')
+    monkeypatch.setattr(audio_lambda, 'FFMPEG_PATH', str(ffmpeg))
+    monkeypatch.setattr(audio_lambda, 'CHUNKING_MODE', 'ffmpeg')
+    monkeypatch.setattr(audio_lambda, 'LOCAL_WHISPER_SPEED', 3.0)
+    monkeypatch.setattr(audio_lambda, 'LOCAL_WHISPER_WORKERS', 2)
+    monkeypatch.setattr(audio_lambda, 'TRANSCRIPTION_LATENCY_TARGET_SECONDS', 300.0)
+    return audio_lambda
+
+
+@pytest.mark.parametrize('setting, duration, expected', [
+    ('openai', 60, 'openai'),
+    ('local', None, 'local'),
+    ('local', 36000, 'local'),
+    ('auto', None, 'openai'),
+    ('auto', 1800, 'local'),   # 1800 s / (3 x 2 workers) = 300 s, exactly the target
+    ('auto', 1801, 'openai'),
+])
+def test_backend_follows_the_setting_and_the_latency_estimate(local_capable, monkeypatch, setting, duration, expected):
+    monkeypatch.setattr(local_capable, 'TRANSCRIPTION_BACKEND', setting)
+
+    assert local_capable.choose_transcription_backend(duration) == expected
+
+
+@pytest.mark.parametrize('override', [{'CHUNKING_MODE': 'pydub'}, {'FFMPEG_PATH': '/nonexistent/ffmpeg'}])
+def test_local_needs_ffmpeg_chunking(local_capable, monkeypatch, override):
+    monkeypatch.setattr(local_capable, 'TRANSCRIPTION_BACKEND', 'local')
+    for name, value in override.items():
+        monkeypatch.setattr(local_capable, name, value)
+
+    assert local_capable.choose_transcription_backend(60) == 'openai'
+
+
+@pytest.fixture
+def failing_model_load(audio_lambda, monkeypatch):
+    """create_local_whisper_model raising, with no model or failure cached yet; returns the call log."""
+    calls = []
+
+    def create_local_whisper_model():
+        calls.append(1)
+        raise OSError("model download failed")
+
+    monkeypatch.setattr(audio_lambda, 'create_local_whisper_model', create_local_whisper_model)
+    monkeypatch.setattr(audio_lambda, '_local_whisper_model_failure', None)
+    monkeypatch.delitem(audio_lambda._clients, 'local_whisper_model', raising=False)
+    return calls
+
+
+def test_failed_model_load_is_not_retried_within_the_window(audio_lambda, failing_model_load):
+    with pytest.raises(OSError):
+        audio_lambda.get_local_whisper_model()
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="model download failed"):
+            audio_lambda.get_local_whisper_model()
+
+    assert len(failing_model_load) == 1
+
+
+def test_failed_model_load_is_retried_after_the_window(audio_lambda, failing_model_load, monkeypatch):
+    with pytest.raises(OSError):
+        audio_lambda.get_local_whisper_model()
+    failed_at, error = audio_lambda._local_whisper_model_failure
+    monkeypatch.setattr(audio_lambda, '_local_whisper_model_failure', (failed_at - audio_lambda.LOCAL_WHISPER_RETRY_SECONDS - 1, error))
+
+    with pytest.raises(OSError):
+        audio_lambda.get_local_whisper_model()
+
+    assert len(failing_model_load) == 2
+
+
+def test_backend_falls_back_to_the_api_while_the_model_is_unavailable(audio_lambda, failing_model_load):
+    backend = audio_lambda.get_transcription_backend('local', openai_client=object())
+
+    assert backend.name == 'openai'
+
+
+def test_fingerprint_depends_on_the_model(audio_lambda):
+    assert audio_lambda.build_job_fingerprint(FILE_INFO, 'openai') != audio_lambda.build_job_fingerprint(FILE_INFO, 'local')
+
+
+def test_checkpoint_for_another_backend_resumes_none_of_its_chunks(audio_lambda, tmp_path):
+    store = audio_lambda.SQLiteJobCheckpointStore(str(tmp_path / 'checkpoints.sqlite3'))
+    local = audio_lambda.JobCheckpoint(store, 'video-1', audio_lambda.build_job_fingerprint(FILE_INFO, 'local'), 'request-1')
+    local.start([{'index': 0, 'start_seconds': 0.0}, {'index': 1, 'start_seconds': 600.0}])
+    local.save_result({'index': 0, 'success': True, 'text': 'local words', 'segments': []})
+
+    api = local.for_backend(FILE_INFO, 'openai')
+    assert api is not local
+    assert api.results == {}
+
+    # The API run re-plans and finishes one chunk; the local chunk left in the store is still not resumed
+    api.start(local.windows)
+    api.save_result({'index': 1, 'success': True, 'text': 'api words', 'segments': []})
+    resumed = audio_lambda.JobCheckpoint(store, 'video-1', api.fingerprint, 'request-2')
+    resumed.load()
+
+    assert sorted(resumed.results) == [1]
+    assert local.for_backend(FILE_INFO, 'local') is local